@@ -1,57 +1,39 @@
 from vrp.io.result import read_solution, save_result
 from vrp.util.info import generate_seq_info
-from vrp.io.reader import read_data, get_node_info
-from vrp.improvement.intra_route import two_opt
+from vrp.io.reader import read_data, get_node_id
+from vrp.improvement.vnd import parallel_intra_route_descent
 from vrp.common.model import Param
+from vrp.common.constant import *
 
 data_set_num = 5
+operators = ("two_opt",)  # ("two_opt", "or_opt") for both
+processes = 4
 route_dict = read_solution(data_set_num)
 
-ds, tm, delivery, pickup, charge, position, ntj = read_data(data_set_num)
-delivery = get_node_info(delivery)
-pickup = get_node_info(pickup)
-charge = get_node_info(charge, is_charge=True)
-node_id_d, volume_d, weight_d, first_d, last_d = delivery
-node_id_p, volume_p, weight_p, first_p, last_p = pickup
-node_id_c, _, _, first_c, last_c = charge
+ds, tm, node = read_data(data_set_num)
+node_id_c = get_node_id(node, CHARGE)
+param = Param(ds, tm, node)
 
-volume = {**volume_d, **volume_p}
-del volume_d, volume_p
-weight = {**weight_d, **weight_p}
-del weight_d, weight_p
-first = {**first_d, **first_p, **first_c}
-del first_d, first_p, first_c
-last = {**last_d, **last_p, **last_c}
-del last_d, last_p, last_c
+route_dict = {seq: generate_seq_info(seq, param) for seq in route_dict}
+improved = parallel_intra_route_descent(
+    route_dict, param, node_id_c,
+    operators=operators,
+    processes=processes
+)
 
-first[(0,)] = 0
-last[(0,)] = 960
-
-param = Param(ds, tm, volume, weight, first, last, ntj, position)
-
-
-cost = 0
 final_route_dict = dict()
-for seq in route_dict:
-    info = generate_seq_info(
-        seq, param
-    )
-    if len(seq) == 1:
-        continue
-    new_seq, new_info = two_opt(
-        seq, info, param, best_accept=True
-    )
-    if new_info:
+for seq, info in route_dict.items():
+    if seq in improved:
+        new_seq, new_info = improved[seq]
         print("-"*20)
         print(seq)
         print(info)
         print(new_seq)
         print(new_info)
         final_route_dict[new_seq] = new_info
-        cost += new_info.cost
     else:
         final_route_dict[seq] = info
-        cost += info.cost
+cost = sum(v.cost for v in final_route_dict.values())
 
 print("final cost: " + str(cost))
 save_result(final_route_dict, data_set_num)
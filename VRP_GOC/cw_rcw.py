@@ -1,126 +1,81 @@
-from vrp.io.reader import read_data, get_node_info
+from vrp.io.reader import read_data, get_node_id
 from vrp.io.result import save_result
-from vrp.construction import saving_value_construct
-from vrp.common.model import SeqInfo
-from vrp.improvement import two_opt
-from vrp.util.info import get_neighborhood_dict
+from vrp.construction.saving_value import saving_value_construct, \
+    generate_init_route_dict
+from vrp.common.model import Param
+from vrp.improvement.vnd import parallel_intra_route_descent
+from vrp.util.info import enable_route_pool, disable_route_pool
+from vrp.util.route_pool import RoutePool
+from vrp.improvement.alns import adaptive_large_neighborhood_search
+from vrp.improvement.set_partitioning import recombine_routes
+from vrp.util.charge import get_charge_table
+from vrp.util.compat import get_arc_compat
 from vrp.common.constant import *
 
-from random import choice
-from functools import reduce
-
 # =========================== parameters ============================
 data_set_num = 5
 merge_seq_each_time = 300
 time_sorted_limit = False  # False for greedy matching
-local_reconstruct_times = 1000
-neighborhood_number = 10
+time_limit = 600  # seconds of alns
+seed = 0
+recombine_rounds = 10  # alns is stopped for a set covering recombination
+recombine_time_limit = 30  # seconds of each recombination
+route_pool_size = 20000
+processes = 4  # worker processes for the final intra-route descent
 
 # =========================== read data =============================
-# ntj = node_type_judgement
-ds, tm, delivery, pickup, charge, position, ntj = read_data(data_set_num)
-delivery = get_node_info(delivery)
-pickup = get_node_info(pickup)
-charge = get_node_info(charge, is_charge=True)
-node_id_d, volume_d, weight_d, first_d, last_d = delivery
-node_id_p, volume_p, weight_p, first_p, last_p = pickup
-node_id_c, _, _, first_c, last_c = charge
-
-volume = {**volume_d, **volume_p}
-del volume_d, volume_p
-weight = {**weight_d, **weight_p}
-del weight_d, weight_p
-first = {**first_d, **first_p, **first_c}
-del first_d, first_p, first_c
-last = {**last_d, **last_p, **last_c}
-del last_d, last_p, last_c
-
-first[(0,)] = 0
-last[(0,)] = 960
+ds, tm, node = read_data(data_set_num)
+node_id_d = get_node_id(node, DELIVERY)
+node_id_p = get_node_id(node, PICKUP)
+node_id_c = get_node_id(node, CHARGE)
 
 candidate_seqs = {*node_id_d, *node_id_p}
+param = Param(
+    ds, tm, node, get_charge_table(ds, node), get_arc_compat(tm, node)
+)
+route_pool = RoutePool(node, max_size=route_pool_size)
+enable_route_pool(route_pool)
 
 # ======================== init route list ==========================
-init_route_dict = {
-    seq: SeqInfo(
-        2, volume[seq], weight[seq], ds[(0,), seq] + ds[seq, (0,)],
-        tm[(0,), seq] + SERVE_TIME + tm[seq, (0,)],
-        0 if first[seq] - tm[(0,), seq] < 0 else first[seq] - tm[(0,), seq],
-        last[seq] - tm[(0,), seq],
-        first[seq] + SERVE_TIME + tm[seq, (0,)],
-        last[seq] + SERVE_TIME + tm[seq, (0,)],
-        0, 0, (ds[(0,), seq] + ds[seq, (0,)]) * TRANS_COST_2 + FIXED_COST_2 if
-        ds[(0,), seq] + ds[seq, (0,)] <= DISTANCE_2 else M
-    )
-    for seq in candidate_seqs
-}
+init_route_dict, unavailable_seqs = generate_init_route_dict(
+    candidate_seqs, param
+)
+if unavailable_seqs:
+    print("unavailable customers: " + str(sorted(unavailable_seqs)))
+candidate_seqs -= unavailable_seqs
 
 # ============================== vrp ================================
 route_dict = saving_value_construct(
-    candidate_seqs, init_route_dict, ds, tm, volume, weight,
-    first, last, ntj, node_id_c,
+    candidate_seqs, init_route_dict, param, node_id_c,
     time_sorted_limit=time_sorted_limit,
     merge_seq_each_time=merge_seq_each_time
 )
 del candidate_seqs
 
-is_charge = ntj[-1]
-have_updated = False
-neighborhood_dict = get_neighborhood_dict(
-    route_dict, position, neighborhood_number=neighborhood_number
-)
-
-for _ in range(local_reconstruct_times):
-    old_cost, new_cost = 0, 0
-    if have_updated:
-        neighborhood_dict = get_neighborhood_dict(
-            route_dict, position, neighborhood_number=neighborhood_number
-        )
-        have_updated = False
-    print("="*100)
-    seq = choice(list(route_dict.keys()))
-    old_cost += route_dict[seq].cost
-    neighborhood = neighborhood_dict[seq]
-    old_cost += sum([route_dict[x].cost for x in neighborhood])
-
-    candidate_seqs = [
-        (x,) for x in
-        seq + reduce(lambda x, y: x + y, neighborhood)
-        if not is_charge(x)
-    ]
-    local_route_dict = {
-        seq: init_route_dict[seq]
-        for seq in candidate_seqs
-    }
-    local_route_dict = saving_value_construct(
-        candidate_seqs, local_route_dict,
-        ds, tm, volume, weight, first, last,
-        ntj, node_id_c,
-        time_sorted_limit=time_sorted_limit,
-        merge_seq_each_time=merge_seq_each_time
+for i in range(recombine_rounds):
+    route_dict = adaptive_large_neighborhood_search(
+        route_dict, param, node_id_c,
+        time_limit=time_limit / recombine_rounds,
+        seed=seed + i
     )
-    new_cost += sum([v.cost for v in local_route_dict.values()])
-    if new_cost < old_cost:
-        route_dict.pop(seq)
-        print(seq)
-        for seq_neighborhood in neighborhood:
-            route_dict.pop(seq_neighborhood)
-            print(seq_neighborhood)
-        print("-" * 10)
-        print("new routes: " + str(len(local_route_dict.keys())))
-        route_dict.update(local_route_dict)
-        have_updated = True
-
-
-cost = 0
-for k, v in route_dict.items():
-    new_seq, new_info = two_opt(
-        k, v, ds, tm, volume, weight, first, last, ntj,
-        iter_num=15
+    route_dict = recombine_routes(
+        route_dict, route_pool, param, node_id_c,
+        time_limit=recombine_time_limit
     )
-    cost += new_info.cost
-    # print(new_seq)
-    # print(new_info)
+disable_route_pool()
+
+for seq, (new_seq, new_info) in parallel_intra_route_descent(
+        route_dict, param, node_id_c, processes=processes
+).items():
+    route_dict.pop(seq)
+    route_dict[new_seq] = new_info
+# customers that can not be served are left in routes whose info is None
+unavailable_routes = [k for k, v in route_dict.items() if v is None]
+if unavailable_routes:
+    print("unavailable routes: " + str(sorted(unavailable_routes)))
+    for seq in unavailable_routes:
+        route_dict.pop(seq)
+cost = sum(v.cost for v in route_dict.values())
 
 # ============================== save ===============================
 print("final cost: " + str(cost))
@@ -1,7 +1,11 @@
-from vrp.io.reader import read_data, get_node_info
-from vrp.construction import saving_value_construct
-from vrp.common.model import SeqInfo, Param
+from vrp.io.reader import read_data, get_node_id
+from vrp.construction.saving_value import saving_value_construct, \
+    generate_init_route_dict
+from vrp.construction.greedy_insertion import greedy_insertion_construct
+from vrp.common.model import Param
 from vrp.util.neighborhhod import get_neighborhood_dict
+from vrp.util.charge import get_charge_table
+from vrp.util.compat import get_arc_compat
 from vrp.common.constant import *
 
 from random import choice
@@ -11,59 +15,27 @@ from functools import reduce
 data_set_num = 5
 merge_seq_each_time = 300
 time_sorted_limit = False  # False for greedy matching
-local_reconstruct_times = 1000
 neighborhood_number = 10
+regret_k = 3
 
 # =========================== read data =============================
-# ntj: node_type_judgement
-ds, tm, delivery, pickup, charge, position, ntj = read_data(data_set_num)
-delivery = get_node_info(delivery)
-pickup = get_node_info(pickup)
-charge = get_node_info(charge, is_charge=True)
-node_id_d, volume_d, weight_d, first_d, last_d = delivery
-node_id_p, volume_p, weight_p, first_p, last_p = pickup
-node_id_c, _, _, first_c, last_c = charge
-
-volume = {**volume_d, **volume_p}
-del volume_d, volume_p
-weight = {**weight_d, **weight_p}
-del weight_d, weight_p
-first = {**first_d, **first_p, **first_c}
-del first_d, first_p, first_c
-last = {**last_d, **last_p, **last_c}
-del last_d, last_p, last_c
-
-first[(0,)] = 0
-last[(0,)] = 960
+ds, tm, node = read_data(data_set_num)
+node_id_d = get_node_id(node, DELIVERY)
+node_id_p = get_node_id(node, PICKUP)
+node_id_c = get_node_id(node, CHARGE)
 
 candidate_seqs = {*node_id_d, *node_id_p}
-param = Param(ds, tm, volume, weight, first, last, ntj, position)
+param = Param(
+    ds, tm, node, get_charge_table(ds, node), get_arc_compat(tm, node)
+)
 
 # ======================== init route list ==========================
-init_route_dict = dict()
-for seq in candidate_seqs:
-    # 0 if first[seq] - tm[(0,), seq] < 0 else first[seq] - tm[(0,), seq],
-    # last[seq] - tm[(0,), seq],
-    eps_list = [
-        0,
-        tm[(0,), seq],
-        tm[(0,), seq] + SERVE_TIME + tm[seq, (0,)]
-    ]
-    lps_list = [
-        last[seq] - tm[(0,), seq],
-        last[seq],
-        last[seq] + SERVE_TIME + tm[seq, (0,)]
-    ]
-    cost = (ds[(0,), seq] + ds[seq, (0,)]) * TRANS_COST_2 + FIXED_COST_2 if \
-        ds[(0,), seq] + ds[seq, (0,)] <= DISTANCE_2 else M
-
-    init_route_dict[seq] = SeqInfo(
-        2, volume[seq], weight[seq], ds[(0,), seq] + ds[seq, (0,)],
-        eps_list, lps_list,
-        first[seq] + SERVE_TIME + tm[seq, (0,)],
-        last[seq] + SERVE_TIME + tm[seq, (0,)],
-        0, 0, cost
-    )
+init_route_dict, unavailable_seqs = generate_init_route_dict(
+    candidate_seqs, param
+)
+if unavailable_seqs:
+    print("unavailable customers: " + str(sorted(unavailable_seqs)))
+candidate_seqs -= unavailable_seqs
 
 # ============================== vrp ================================
 route_dict = saving_value_construct(
@@ -75,7 +47,7 @@ del candidate_seqs
 
 # ======================= greedy insert ==============================
 neighborhood_dict = get_neighborhood_dict(
-    route_dict, position, neighborhood_number=neighborhood_number
+    route_dict, node, neighborhood_number=neighborhood_number
 )
 
 for _ in range(1):
@@ -90,21 +62,16 @@ for _ in range(1):
         lambda x: (x,),
         reduce(lambda x, y: x + y, [seed_route, *seed_neighborhood])
     ))
-    # re_route_dict = saving_value_construct(
-    #     re_nodes, init_route_dict, param, node_id_c,
-    #     time_sorted_limit=time_sorted_limit,
-    #     merge_seq_each_time=merge_seq_each_time
-    # )
-    update = False
-    re_route_dict = dict()
-    while True:
-        seed = re_nodes.pop()
-
-        if not update:
-            break
+    re_nodes -= node_id_c  # charging stations are put back on insertion
+    re_route_dict = greedy_insertion_construct(
+        re_nodes, dict(), param, node_id_c, regret_k=regret_k
+    )
 
     cost = 0
     for k, v in re_route_dict.items():
+        if v is None:
+            print("unavailable route: " + str(k))
+            continue
         cost += v.cost
     print("new cost: " + str(cost))
 
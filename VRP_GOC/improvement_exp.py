@@ -1,7 +1,8 @@
 from vrp.io.result import read_solution, save_result
-from vrp.io.reader import read_data, get_node_info
-from vrp.util.info import generate_seq_info
-from vrp.util.neighborhhod import get_neighborhood_dict
+from vrp.io.reader import read_data
+from vrp.util.info import generate_seq_info, enable_seq_info_cache, \
+    get_seq_info_cache_stats
+from vrp.util.neighborhhod import RouteNeighborhood
 from vrp.improvement import two_opt, two_opt_star
 from vrp.common.model import Param
 
@@ -12,27 +13,9 @@ iter_number = 100000
 
 route_dict = read_solution(data_set_num)
 
-ds, tm, delivery, pickup, charge, position, ntj = read_data(data_set_num)
-delivery = get_node_info(delivery)
-pickup = get_node_info(pickup)
-charge = get_node_info(charge, is_charge=True)
-node_id_d, volume_d, weight_d, first_d, last_d = delivery
-node_id_p, volume_p, weight_p, first_p, last_p = pickup
-node_id_c, _, _, first_c, last_c = charge
-
-volume = {**volume_d, **volume_p}
-del volume_d, volume_p
-weight = {**weight_d, **weight_p}
-del weight_d, weight_p
-first = {**first_d, **first_p, **first_c}
-del first_d, first_p, first_c
-last = {**last_d, **last_p, **last_c}
-del last_d, last_p, last_c
-
-first[(0,)] = 0
-last[(0,)] = 960
-
-param = Param(ds, tm, volume, weight, first, last, ntj, position)
+ds, tm, node = read_data(data_set_num)
+param = Param(ds, tm, node)
+enable_seq_info_cache()
 
 new_cost = 0
 old_cost = 0
@@ -41,8 +24,8 @@ final_route_dict = dict()
 for seq in route_dict:
     info = generate_seq_info(seq, param)
     route_dict[seq] = info
-neighborhood_dict = get_neighborhood_dict(
-    route_dict, position, neighborhood_number=10
+neighborhood_dict = RouteNeighborhood(
+    route_dict, node, neighborhood_number=10
 )
 
 # ===================================================================
@@ -52,23 +35,27 @@ for _ in range(iter_number):
 
     if have_updated:
         candidate_seqs = list(route_dict)
-        neighborhood_dict = get_neighborhood_dict(
-            route_dict, position, neighborhood_number=10
-        )
+        have_updated = False
     seq = choice(candidate_seqs)
     neighborhood = choice(neighborhood_dict[seq])
     (new_seq1, new_info1), (new_seq2, new_info2) = two_opt_star(
         seq, route_dict[seq],
         neighborhood, route_dict[neighborhood],
-        param, iter_num=15
+        param
     )
-    if new_seq1 != seq and new_seq2 != neighborhood:
+    if new_seq1 is not None:
         print("="*30)
         have_updated = True
         i1 = route_dict.pop(seq)
-        route_dict[new_seq1] = new_info1
         i2 = route_dict.pop(neighborhood)
-        route_dict[new_seq2] = new_info2
+        # a route left without customers is ()
+        new_routes = [
+            x for x in ((new_seq1, new_info1), (new_seq2, new_info2)) if x[0]
+        ]
+        route_dict.update(new_routes)
+        neighborhood_dict.update(
+            (seq, neighborhood), [x[0] for x in new_routes]
+        )
         print(seq)
         print(i1)
         print(neighborhood)
@@ -88,10 +75,13 @@ for k, v in route_dict.items():
     print(k)
     print(v)
     new_seq, new_info = two_opt(k, v, param, best_accept=True)
+    if new_seq is None:
+        new_seq, new_info = k, v
     print(new_seq)
     print(new_info)
     final_route_dict[new_seq] = new_info
     cost += new_info.cost
 
 print("-"*20+"\nnew cost: " + str(cost))
+print(get_seq_info_cache_stats())
 save_result(final_route_dict, data_set_num)
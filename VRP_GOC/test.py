@@ -1,14 +1,12 @@
-from vrp.common.model import *
+import numpy as np
 
 from itertools import *
 from functools import reduce
 
 
 seq = (1, 2, 3)
-tm = SeqDict({
-    x: y
-    for x, y in zip(zip(zip((0, 1, 2, 3)), zip((1, 2, 3, 0))), (40, 20, 20, 10))
-})
+tm = np.zeros((4, 4), dtype=np.int32)
+tm[(0, 1, 2, 3), (1, 2, 3, 0)] = (40, 20, 20, 10)
 first = {
     x: y
     for x, y in zip(zip(range(4)), (0, 60, 150, 180))
@@ -20,8 +18,8 @@ last = {
 
 tuple_seq = tuple(zip((0, *seq, 0)))
 tm_edge = tuple(map(
-    lambda x, y: tm[x] + y,
-    zip(tuple_seq[:-1], tuple_seq[1:]),
+    lambda x, y: x + y,
+    tm[(0, *seq), (*seq, 0)].tolist(),
     chain((0,), repeat(30))
 ))
 
@@ -0,0 +1,70 @@
+from vrp.construction.split import split_construct
+from vrp.common.model import Param, NodeTable, SeqInfo
+from vrp.io.reader import get_node_id
+from vrp.common.constant import *
+
+import numpy as np
+import pytest
+from typing import Dict, Set, Tuple
+
+
+@pytest.fixture(scope="session")
+def param() -> Param:
+    """
+    a small random instance: depot 0, deliveries 1-30,
+    pickups 31-50 and charging stations 51-59
+    :return:
+    """
+    rng = np.random.RandomState(0)
+    node_num = 60
+    node_type = np.full(node_num, DELIVERY, dtype=np.int32)
+    node_type[0] = DEPOT
+    node_type[31:51] = PICKUP
+    node_type[51:] = CHARGE
+
+    xy = rng.uniform(-30000, 30000, (node_num, 2))
+    xy[0] = 0
+    ds = np.rint(1.2 * np.hypot(
+        *(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1)
+    )).astype(np.int32)
+    tm = (ds // 500).astype(np.int32)
+
+    is_customer = (node_type == DELIVERY) | (node_type == PICKUP)
+    first = np.where(
+        is_customer, rng.choice([0, 240, 480], node_num), START_TIME
+    ).astype(np.int32)
+    last = np.where(
+        is_customer, first + rng.choice([120, 240, 480], node_num), END_TIME
+    ).astype(np.int32)
+    last = np.minimum(last, END_TIME)
+    volume = np.where(is_customer, rng.uniform(0.5, 3, node_num), 0)
+    weight = np.where(is_customer, rng.uniform(0.1, 0.6, node_num), 0)
+
+    node = NodeTable(
+        node_type, volume, weight, first, last, xy[:, 0], xy[:, 1]
+    )
+    return Param(ds, tm, node)
+
+
+@pytest.fixture(scope="session")
+def node_id_c(param) -> Set[Tuple[int]]:
+    """
+    the charging stations of param
+    :param param:
+    :return:
+    """
+    return get_node_id(param.node, CHARGE)
+
+
+@pytest.fixture(scope="session")
+def route_dict(param, node_id_c) -> Dict[Tuple, SeqInfo]:
+    """
+    split_construct of customers 1-50, shared by the tests,
+    so it must not be changed
+    :param param:
+    :param node_id_c:
+    :return:
+    """
+    return split_construct(
+        {(x,) for x in range(1, 51)}, param, node_id_c, tour_method="time"
+    )
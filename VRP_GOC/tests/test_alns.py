@@ -0,0 +1,38 @@
+from vrp.improvement.alns import adaptive_large_neighborhood_search, \
+    remove_customers, DESTROY_OPERATORS
+from vrp.util.info import generate_seq_info
+from vrp.common.constant import *
+
+import random
+
+
+def test_destroy_operators(param, node_id_c, route_dict):
+    route_dict = {k: v for k, v in route_dict.items() if v is not None}
+    customers = {x for seq in route_dict for x in seq if (x,) not in node_id_c}
+    for name, operator in DESTROY_OPERATORS.items():
+        removed = operator(route_dict, 7, param, random.Random(0))
+        assert len(removed) >= 7 if name == "route" else len(removed) == 7
+        assert len(set(removed)) == len(removed)
+        assert customers.issuperset(removed)
+
+        partial, removed_seqs = remove_customers(route_dict, removed, param)
+        nodes = [x for seq in partial for x in seq if (x,) not in node_id_c]
+        assert sorted(nodes + [x[0] for x in removed_seqs]) == \
+            sorted(customers)
+        for seq, info in partial.items():
+            assert info == generate_seq_info(seq, param)
+
+
+def test_adaptive_large_neighborhood_search(param, node_id_c, route_dict):
+    cost = sum(M if v is None else v.cost for v in route_dict.values())
+    new_route_dict = adaptive_large_neighborhood_search(
+        route_dict, param, node_id_c, max_iter=30, seed=0
+    )
+    assert new_route_dict == adaptive_large_neighborhood_search(
+        route_dict, param, node_id_c, max_iter=30, seed=0
+    )
+    assert sum(
+        M if v is None else v.cost for v in new_route_dict.values()
+    ) < cost
+    nodes = [x for seq in new_route_dict for x in seq if (x,) not in node_id_c]
+    assert sorted(nodes) == list(range(1, 51))
@@ -0,0 +1,70 @@
+from vrp.io.cache import load_instance
+from vrp.io.reader import parse_data
+
+import numpy as np
+
+import os
+
+NODE_HEAD = "ID\ttype\tlng\tlat\tpack_total_weight\tpack_total_volume\t" \
+    "first_receive_tm\tlast_receive_tm\n"
+NODE_ROWS = "0\t1\t116.5\t39.9\t-\t-\t-\t-\n" \
+    "1\t2\t116.6\t39.8\t0.5\t2.1\t09:00\t12:00\n" \
+    "2\t4\t116.4\t39.7\t-\t-\t-\t-\n"
+
+
+def _write_dt(dt_file, distance):
+    rows = [
+        (i * 3 + j, i, j, 0 if i == j else distance * (i + j), 10 * (i + j))
+        for i in range(3) for j in range(3)
+    ]
+    dt_file.write_text("ID,from_node,to_node,distance,spend_tm\n" + "".join(
+        ",".join(str(x) for x in row) + "\n" for row in rows
+    ))
+
+
+def test_load_instance(tmp_path):
+    dt_file = tmp_path / "inputdistancetime_9_3.txt"
+    node_file = tmp_path / "inputnode_9_3.csv"
+    cache_dir = str(tmp_path / "cache")
+    _write_dt(dt_file, 1000)
+    node_file.write_text(NODE_HEAD + NODE_ROWS)
+    calls = []
+
+    def parse(*args):
+        calls.append(args)
+        return parse_data(*args)
+
+    def load():
+        return load_instance(str(dt_file), str(node_file), parse, cache_dir)
+
+    ds, tm, node = load()
+    assert len(calls) == 1
+    assert isinstance(ds, np.memmap) and not ds.flags.writeable
+    assert ds[1, 2] == 3000 and tm[2, 1] == 30
+    assert node["type"].tolist() == [1, 2, 4]
+    assert node["first"][1] == 60 and node["last"][0] == 960
+
+    # the compiled cache is used
+    ds, _, _ = load()
+    assert len(calls) == 1 and ds[1, 2] == 3000
+
+    # touched but the same content, the hash matches
+    st = os.stat(dt_file)
+    os.utime(dt_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    ds, _, _ = load()
+    assert len(calls) == 1
+
+    # size changed
+    _write_dt(dt_file, 10000)
+    ds, _, _ = load()
+    assert len(calls) == 2 and ds[1, 2] == 30000
+
+    # same size, new mtime and content
+    _write_dt(dt_file, 20000)
+    st = os.stat(dt_file)
+    os.utime(dt_file, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10 ** 9))
+    ds, _, _ = load()
+    assert len(calls) == 3 and ds[1, 2] == 60000
+
+    # the old directory is swapped out, nothing is left behind
+    assert os.listdir(cache_dir) == ["inputdistancetime_9_3"]
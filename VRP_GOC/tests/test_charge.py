@@ -0,0 +1,43 @@
+from vrp.common.model import Param
+from vrp.common.constant import *
+from vrp.util.charge import get_charge_table, get_charge_candidates
+
+import numpy as np
+
+
+def test_charge_table(param):
+    ds, tm, node, *_ = param
+    charge_table = get_charge_table(ds, node, k=3, block_size=7)
+    charge_id = np.flatnonzero(node.type == CHARGE)
+    for i in range(0, len(ds), 3):
+        for j in range(0, len(ds), 5):
+            expected = sorted(
+                ds[i, c] + ds[c, j] for c in charge_id if c != i and c != j
+            )[:3]
+            assert [
+                ds[i, c] + ds[c, j] for c in charge_table[i, j]
+            ] == expected
+
+
+def test_charge_candidates(param, node_id_c):
+    ds, tm, node, *_ = param
+    with_table = Param(ds, tm, node, get_charge_table(ds, node, k=2))
+    assert get_charge_candidates(3, 40, with_table, node_id_c) == \
+        get_charge_candidates(3, 40, param, node_id_c)[:2]
+
+
+def test_charge_candidates_station_end(param, node_id_c):
+    ds, tm, node, *_ = param
+    with_table = Param(ds, tm, node, get_charge_table(ds, node, k=3))
+    for from_node, to_node in ((56, 12), (3, 53), (53, 56), (53, 53)):
+        candidates = get_charge_candidates(
+            from_node, to_node, param, node_id_c
+        )
+        assert (from_node,) not in candidates
+        assert (to_node,) not in candidates
+        assert [
+            ds[from_node, c] + ds[c, to_node] for (c,) in candidates[:3]
+        ] == [
+            ds[from_node, c] + ds[c, to_node] for (c,) in
+            get_charge_candidates(from_node, to_node, with_table, node_id_c)
+        ]
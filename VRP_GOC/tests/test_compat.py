@@ -0,0 +1,35 @@
+from vrp.util.info import generate_seq_info
+from vrp.util.compat import get_arc_compat, check_compat
+from vrp.improvement.intra_route import two_opt
+
+import random
+
+
+def test_compat_never_rejects_feasible_seq(param):
+    compat_param = param._replace(compat=get_arc_compat(param.tm, param.node))
+    rng = random.Random(2)
+    pruned = 0
+    for _ in range(3000):
+        seq = tuple(rng.sample(range(1, 60), rng.randint(2, 8)))
+        is_compat = check_compat(seq, range(len(seq)), compat_param)
+        if generate_seq_info(seq, param) is not None:
+            assert is_compat
+        pruned += not is_compat
+    assert pruned > 0
+
+
+def test_compat_two_opt(param):
+    # the reversals rejected by compat are not priced, the result is
+    # the same as without compat
+    compat_param = param._replace(compat=get_arc_compat(param.tm, param.node))
+    rng = random.Random(3)
+    improved = 0
+    for _ in range(200):
+        seq = tuple(rng.sample(range(1, 51), rng.randint(2, 6)))
+        info = generate_seq_info(seq, param)
+        if info is None:
+            continue
+        new_seq, new_info = two_opt(seq, info, compat_param)
+        assert (new_seq, new_info) == two_opt(seq, info, param)
+        improved += new_seq is not None
+    assert improved > 0
@@ -0,0 +1,105 @@
+from vrp.util.granular import get_nearest_nodes, get_granular_neighbors, \
+    get_candidate_lists, calculate_arc_metric
+from vrp.util.info import generate_seq_info
+from vrp.improvement.inter_route import two_opt_star, granular_two_opt_star, \
+    granular_relocate, granular_cross_exchange
+from vrp.common.constant import *
+
+import numpy as np
+
+
+def test_nearest_nodes(param):
+    ds, _, node, *_ = param
+    nearest = get_nearest_nodes(param, 5)
+    assert nearest.shape == (len(ds), 5)
+    customers = np.flatnonzero((node.type == DELIVERY) | (node.type == PICKUP))
+    for i in (0, 7, 40, 55):
+        others = customers[customers != i]
+        expected = others[np.argsort(ds[i, others], kind="stable")][:5]
+        assert list(ds[i, nearest[i]]) == list(ds[i, expected])
+
+
+def test_granular_neighbors_symmetric(param):
+    neighbors = get_granular_neighbors(param, 3, "time_window")
+    for i, x in enumerate(neighbors):
+        for j in x:
+            assert i in neighbors[j]
+
+
+def test_candidate_lists(param):
+    candidate_lists = get_candidate_lists(param, 5, "time")
+    arc_metric = calculate_arc_metric(param, "time_window")
+    for i, x in enumerate(candidate_lists):
+        assert len(x) <= 5
+        assert all(arc_metric[i, j] < M for j in x)
+
+
+def test_granular_operators(param, node_id_c):
+    _, _, node, *_ = param
+    full_lists = get_candidate_lists(param, len(node.type))
+    candidate_lists = get_candidate_lists(param, 8)
+    rng = np.random.RandomState(1)
+    routes = []
+    while len(routes) < 20:
+        seq = tuple(
+            rng.choice(np.arange(1, 51), rng.randint(3, 7), False).tolist()
+        )
+        info = generate_seq_info(seq, param)
+        if info is not None:
+            routes.append((seq, info))
+    for (seq1, info1), (seq2, info2) in zip(routes[::2], routes[1::2]):
+        # every available cut is a candidate with the full lists
+        (new_seq1, _), (new_seq2, _) = granular_two_opt_star(
+            seq1, info1, seq2, info2, param, full_lists
+        )
+        assert (new_seq1, new_seq2) == tuple(
+            x[0] for x in two_opt_star(seq1, info1, seq2, info2, param)
+        )
+        for (new_seq1, new_info1), (new_seq2, new_info2) in [
+            granular_two_opt_star(
+                seq1, info1, seq2, info2, param, candidate_lists
+            ),
+            granular_relocate(
+                seq1, info1, seq2, info2, param, node_id_c, candidate_lists
+            ),
+            granular_cross_exchange(
+                seq1, info1, seq2, info2, param, candidate_lists
+            )
+        ]:
+            if new_seq1 is None:
+                continue
+            assert new_info1.cost + new_info2.cost < info1.cost + info2.cost
+            customers = [
+                x for x in new_seq1 + new_seq2 if (x,) not in node_id_c
+            ]
+            assert sorted(customers) == sorted(seq1 + seq2)
+
+
+def test_granular_empty_route(param, node_id_c, route_dict):
+    # a single customer route is emptied if that is cheaper
+    full_lists = get_candidate_lists(param, len(param.node.type))
+    routes = [(k, v) for k, v in route_dict.items() if v is not None]
+    emptied = set()
+    for seq1, info1 in routes:
+        if len(seq1) > 1:
+            continue
+        for seq2, info2 in routes:
+            if seq2 == seq1:
+                continue
+            for (new_seq1, new_info1), (new_seq2, new_info2) in [
+                granular_relocate(
+                    seq1, info1, seq2, info2, param, node_id_c, full_lists
+                ),
+                granular_cross_exchange(
+                    seq1, info1, seq2, info2, param, full_lists
+                )
+            ]:
+                if new_seq1 != ():
+                    continue
+                emptied.add(seq1)
+                assert new_info1.cost == 0
+                assert new_info2.cost < info1.cost + info2.cost
+                assert sorted(
+                    x for x in new_seq2 if (x,) not in node_id_c
+                ) == sorted(x for x in seq1 + seq2 if (x,) not in node_id_c)
+    assert emptied
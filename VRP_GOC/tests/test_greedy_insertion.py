@@ -0,0 +1,28 @@
+from vrp.construction.greedy_insertion import greedy_insertion_construct
+from vrp.util.info import generate_seq_info
+
+
+def test_greedy_insertion_construct(param, node_id_c):
+    candidate_seqs = {(x,) for x in range(1, 51)}
+    for regret_k, granular_k in ((1, 0), (2, 10), (3, 0)):
+        route_dict = greedy_insertion_construct(
+            candidate_seqs, dict(), param, node_id_c,
+            regret_k=regret_k, granular_k=granular_k
+        )
+        nodes = [x for seq in route_dict for x in seq if (x,) not in node_id_c]
+        assert sorted(nodes) == list(range(1, 51))
+        for seq, info in route_dict.items():
+            assert info == generate_seq_info(seq, param, info.vehicle_type)
+
+
+def test_greedy_insertion_into_routes(param, node_id_c):
+    route_dict = greedy_insertion_construct(
+        {(x,) for x in range(1, 21)}, dict(), param, node_id_c
+    )
+    cost = sum(info.cost for info in route_dict.values())
+    new_route_dict = greedy_insertion_construct(
+        {(x,) for x in range(21, 51)}, route_dict, param, node_id_c
+    )
+    assert sum(info.cost for info in route_dict.values()) == cost
+    nodes = [x for seq in new_route_dict for x in seq if (x,) not in node_id_c]
+    assert sorted(nodes) == list(range(1, 51))
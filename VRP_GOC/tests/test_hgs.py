@@ -0,0 +1,38 @@
+from vrp.improvement.hgs import hybrid_genetic_search, order_crossover, \
+    get_broken_pairs_distance
+
+import random
+
+
+def test_order_crossover():
+    rng = random.Random(0)
+    tour1 = list(range(1, 21))
+    tour2 = rng.sample(tour1, len(tour1))
+    for _ in range(20):
+        assert sorted(order_crossover(tour1, tour2, rng)) == tour1
+
+
+def test_broken_pairs_distance(param):
+    route_dict1 = dict.fromkeys([(1, 2, 3), (4, 5)])
+    assert get_broken_pairs_distance(route_dict1, route_dict1, param) == 0
+    # a reversed route has no broken pairs
+    route_dict2 = dict.fromkeys([(3, 2, 1), (4, 5)])
+    assert get_broken_pairs_distance(route_dict1, route_dict2, param) == 0
+    route_dict3 = dict.fromkeys([(1, 2), (3, 4, 5)])
+    assert get_broken_pairs_distance(route_dict1, route_dict3, param) == 0.2
+
+
+def test_hybrid_genetic_search(param, node_id_c):
+    candidate_seqs = {(x,) for x in range(1, 31)}
+    kwargs = dict(
+        max_iter=4, seed=0, min_population=3, generation_size=2,
+        neighborhood_number=3, candidate_k=5, batch_size=2
+    )
+    route_dict = hybrid_genetic_search(
+        candidate_seqs, param, node_id_c, **kwargs
+    )
+    assert route_dict == hybrid_genetic_search(
+        candidate_seqs, param, node_id_c, processes=2, **kwargs
+    )
+    nodes = [x for seq in route_dict for x in seq if (x,) not in node_id_c]
+    assert sorted(nodes) == list(range(1, 31))
@@ -0,0 +1,128 @@
+from vrp.util.info import generate_seq_info, evaluate_seq, \
+    evaluate_seq_batch, enable_seq_info_cache, disable_seq_info_cache, \
+    get_seq_info_cache_stats, optimize_seq
+
+from vrp.common.constant import *
+
+import numpy as np
+
+import time
+import random
+from itertools import permutations
+
+
+def test_evaluate_seq(param):
+    rng = random.Random(4)
+    for _ in range(3000):
+        seq = tuple(rng.sample(range(1, 60), rng.randint(1, 10)))
+        vehicle_type = rng.choice([-1, 1, 2])
+        info = generate_seq_info(seq, param, vehicle_type=vehicle_type)
+        result = evaluate_seq(seq, param, vehicle_type=vehicle_type)
+        if info is None:
+            assert result is None
+        else:
+            assert result == (info.vehicle_type, info.cost)
+
+
+def test_evaluate_seq_batch(param):
+    rng = random.Random(5)
+    seqs = [
+        tuple(rng.sample(range(1, 60), rng.randint(1, 10)))
+        for _ in range(2000)
+    ]
+    for vehicle_type in (-1, 1, 2):
+        types, costs = evaluate_seq_batch(seqs, param, vehicle_type)
+        for seq, t, c in zip(seqs, types.tolist(), costs.tolist()):
+            result = evaluate_seq(seq, param, vehicle_type=vehicle_type)
+            if result is None:
+                assert t == 0
+            else:
+                assert (t, c) == result
+
+
+def test_seq_info_cache(param):
+    seqs = [(1, 2), (3, 4, 5), (31, 6), (51,)]
+    expected = [generate_seq_info(seq, param) for seq in seqs]
+    enable_seq_info_cache(max_size=3)
+    try:
+        for _ in range(2):
+            for seq, info in zip(seqs, expected):
+                assert generate_seq_info(seq, param) == info
+        stats = get_seq_info_cache_stats()
+        # every lookup misses, the oldest entry is always evicted first
+        assert stats.hits == 0 and stats.misses == 8
+        assert stats.evictions == 5 and stats.size == 3
+
+        assert generate_seq_info(seqs[-1], param) == expected[-1]
+        assert get_seq_info_cache_stats().hits == 1
+    finally:
+        disable_seq_info_cache()
+
+
+def test_optimize_seq(param):
+    rng = random.Random(6)
+    for _ in range(100):
+        nodes = rng.sample(range(1, 51), rng.randint(1, 6))
+        vehicle_type = rng.choice([-1, 1, 2])
+        costs = [
+            result[1] for result in (
+                evaluate_seq(x, param, vehicle_type=vehicle_type)
+                for x in permutations(nodes)
+            ) if result is not None
+        ]
+        seq, info = optimize_seq(nodes, param, vehicle_type=vehicle_type)
+        if not costs:
+            continue  # it may still be feasible through a station
+        assert sorted(x for x in seq if x in nodes) == sorted(nodes)
+        assert info == generate_seq_info(seq, param, vehicle_type)
+        assert info.cost <= min(costs) + 1e-6
+
+
+def test_optimize_seq_charge(param):
+    # every direct order is over the distance limit, the best order with
+    # one of the stations anywhere is the lower bound
+    ds, _, node, *_ = param
+    stations = list(range(51, 60))
+    rng = random.Random(7)
+    checked = 0
+    while checked < 3:
+        nodes = rng.sample(range(1, 51), 3)
+        if min(
+            ds[0, x[0]] + ds[x[0], x[1]] + ds[x[1], x[2]] + ds[x[2], 0]
+            for x in permutations(nodes)
+        ) <= DISTANCE_2:
+            continue
+        costs = [
+            result[1] for result in (
+                evaluate_seq(x[:i] + (c,) + x[i:], param)
+                for x in permutations(nodes)
+                for i in range(len(x) + 1) for c in stations
+            ) if result is not None
+        ]
+        if not costs:
+            continue
+        seq, info = optimize_seq(nodes + stations, param)
+        assert any(node.type[x] == CHARGE for x in seq)
+        assert info == generate_seq_info(seq, param)
+        assert info.cost <= min(costs) + 1e-6
+        checked += 1
+
+
+def test_optimize_seq_large(param):
+    # loose time windows and loads so that 25 customers fit in a route,
+    # over max_exact_size it must stay polynomial
+    ds, tm, node, *_ = param
+    ds, tm = ds // 10, tm // 10
+    node = node._replace(
+        first=np.zeros_like(node.first),
+        last=np.full_like(node.last, END_TIME) - SERVE_TIME - tm[:, 0],
+        volume=node.volume / 10, weight=node.weight / 10
+    )
+    param = param._replace(ds=ds, tm=tm, node=node)
+    nodes = list(range(1, 26))
+    start_time = time.perf_counter()
+    seq, info = optimize_seq(nodes, param)
+    assert time.perf_counter() - start_time < 30
+    assert sorted(seq) == nodes
+    assert info == generate_seq_info(seq, param)
+    assert info.cost <= evaluate_seq(tuple(nodes), param)[1]
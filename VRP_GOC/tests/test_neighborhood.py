@@ -0,0 +1,40 @@
+from vrp.util.neighborhhod import RouteNeighborhood, calculate_seq_position
+
+import random
+
+
+def _brute_force(seq, routes, node, k):
+    p = calculate_seq_position(seq, node)
+    return sorted(
+        (x for x in routes if x != seq),
+        key=lambda x: (
+            (calculate_seq_position(x, node)[0] - p[0]) ** 2 +
+            (calculate_seq_position(x, node)[1] - p[1]) ** 2, x
+        )
+    )[:k]
+
+
+def test_seq_position_centroid(param):
+    _, _, node, *_ = param
+    lng, lat = calculate_seq_position((3, 4), node)
+    assert abs(lng - (node.lng[3] + node.lng[4]) / 2) < 1e-6
+    assert abs(lat - (node.lat[3] + node.lat[4]) / 2) < 1e-6
+
+
+def test_route_neighborhood(param):
+    _, _, node, *_ = param
+    rng = random.Random(0)
+    routes = {tuple(rng.sample(range(1, 51), rng.randint(1, 4)))
+              for _ in range(40)}
+    neighborhood = RouteNeighborhood(dict.fromkeys(routes), node, 5)
+    for seq in routes:
+        assert neighborhood[seq] == _brute_force(seq, routes, node, 5)
+
+    # replace some routes, as after a move
+    old_seqs = rng.sample(sorted(routes), 6)
+    new_seqs = [tuple(rng.sample(range(1, 51), 3)) for _ in range(4)]
+    neighborhood.update(old_seqs, new_seqs)
+    routes = routes.difference(old_seqs).union(new_seqs)
+    assert len(neighborhood) == len(routes)
+    for seq in routes:
+        assert neighborhood[seq] == _brute_force(seq, routes, node, 5)
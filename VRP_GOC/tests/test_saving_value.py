@@ -0,0 +1,98 @@
+from vrp.construction.saving_value import generate_init_route_dict, \
+    saving_value_construct, heap_saving_value_construct, \
+    generate_saving_value_pair_candidates
+from vrp.util.granular import get_granular_neighbors
+from vrp.io.reader import get_node_id
+from vrp.common.constant import *
+
+
+def test_unavailable_customers(param, node_id_c):
+    # the start of main.py, (16,), (18,) and (33,) can not be served alone
+    _, _, node, *_ = param
+    candidate_seqs = {*get_node_id(node, DELIVERY), *get_node_id(node, PICKUP)}
+    init_route_dict, unavailable_seqs = generate_init_route_dict(
+        candidate_seqs, param
+    )
+    assert unavailable_seqs == {(16,), (18,), (33,)}
+    assert not unavailable_seqs & set(init_route_dict)
+    candidate_seqs -= unavailable_seqs
+    route_dict = heap_saving_value_construct(
+        candidate_seqs, init_route_dict, param, node_id_c
+    )
+    assert all(v is not None for v in route_dict.values())
+    assert sorted(
+        x for seq in route_dict for x in seq if (x,) not in node_id_c
+    ) == sorted(x for seq in candidate_seqs for x in seq)
+
+    # routes whose info is None are returned unchanged
+    init_route_dict.update(dict.fromkeys(unavailable_seqs))
+    candidate_seqs |= unavailable_seqs
+    for route_dict in (
+        heap_saving_value_construct(
+            candidate_seqs, init_route_dict, param, node_id_c
+        ),
+        saving_value_construct(
+            candidate_seqs, init_route_dict, param, node_id_c
+        )
+    ):
+        assert {k for k, v in route_dict.items() if v is None} == \
+            unavailable_seqs
+
+
+def _get_init_route_dict(param):
+    _, _, node, *_ = param
+    candidate_seqs = {*get_node_id(node, DELIVERY), *get_node_id(node, PICKUP)}
+    init_route_dict, unavailable_seqs = generate_init_route_dict(
+        candidate_seqs, param
+    )
+    return candidate_seqs - unavailable_seqs, init_route_dict
+
+
+def test_heap_saving_value_construct(param, node_id_c):
+    candidate_seqs, init_route_dict = _get_init_route_dict(param)
+    route_dict = heap_saving_value_construct(
+        candidate_seqs, init_route_dict, param, node_id_c
+    )
+    assert list(route_dict.items()) == list(saving_value_construct(
+        candidate_seqs, init_route_dict, param, node_id_c,
+        merge_seq_each_time=1
+    ).items())
+    assert len(route_dict) < len(candidate_seqs)
+
+
+def test_granular_saving_value_construct(param, node_id_c):
+    # every route starts alone, so two customers next to each other
+    # (a station may be between them) are the ends of a merge
+    candidate_seqs, init_route_dict = _get_init_route_dict(param)
+    granular_neighbors = get_granular_neighbors(param, 3, "distance")
+    for construct, kwargs in (
+            (heap_saving_value_construct, dict()),
+            (saving_value_construct, dict(merge_seq_each_time=5))
+    ):
+        route_dict = construct(
+            candidate_seqs, init_route_dict, param, node_id_c,
+            granular_k=3, **kwargs
+        )
+        assert len(route_dict) < len(candidate_seqs)
+        for seq in route_dict:
+            customers = [x for x in seq if (x,) not in node_id_c]
+            for a, b in zip(customers, customers[1:]):
+                assert b in granular_neighbors[a]
+
+
+def test_saving_value_processes(param, node_id_c):
+    candidate_seqs, init_route_dict = _get_init_route_dict(param)
+    pairs = generate_saving_value_pair_candidates(
+        list(init_route_dict), init_route_dict, param, node_id_c
+    )
+    assert list(pairs.items()) == list(generate_saving_value_pair_candidates(
+        list(init_route_dict), init_route_dict, param, node_id_c,
+        processes=2
+    ).items())
+    for construct in (heap_saving_value_construct, saving_value_construct):
+        route_dict = construct(
+            candidate_seqs, init_route_dict, param, node_id_c
+        )
+        assert list(route_dict.items()) == list(construct(
+            candidate_seqs, init_route_dict, param, node_id_c, processes=2
+        ).items())
@@ -0,0 +1,77 @@
+from vrp.util.info import generate_seq_info
+from vrp.util.schedule import schedule_time
+from vrp.common.constant import *
+
+import random
+
+
+def _quadratic_schedule_time(seq, param):
+    """
+    schedule_time before the lazy offsets,
+    eps_list and lps_list are rewritten on every wait or shift
+    """
+    _, tm, node, *_ = param
+    serve_time = 0
+    eps = 0
+    lps = 960
+    total_shift = 0
+    time_len = 0
+    total_wait = 0
+    total_delta = 0
+    eps_list = [0]
+    lps_list = [960]
+
+    full_seq = (0, *seq, 0)
+    tm_edge = tm[full_seq[:-1], full_seq[1:]].tolist()
+    first = node.first[list(seq)].tolist()
+    last = node.last[list(seq)].tolist()
+
+    for i in range(len(seq)):
+        tm12 = tm_edge[i]
+        shift = max(0, lps + tm12 + serve_time - last[i])
+        if shift > 0:
+            lps = last[i]
+            total_shift += shift
+        else:
+            lps += tm12 + serve_time
+        if lps - tm12 - serve_time < eps:
+            return None, None, None, None, None
+        wait = max(0, first[i] - lps)
+        if wait > 0:
+            total_wait += wait
+            lps = first[i]
+        delta = max(0, first[i] - eps - serve_time - tm12)
+        total_delta += delta
+        eps = max(eps + serve_time + tm12, first[i])
+        if delta > 0 or wait > 0:
+            eps_list = [x + delta - wait for x in eps_list]
+        if shift > 0:
+            lps_list = [x - shift for x in lps_list]
+        eps_list.append(eps)
+        lps_list.append(lps)
+        time_len += tm12 + serve_time + wait
+        serve_time = SERVE_TIME
+
+    time_len += SERVE_TIME + tm_edge[-1]
+    eps_list.append(0 + total_delta - total_wait + time_len)
+    lps_list.append(960 - total_shift + time_len)
+    buffer = lps_list[0] - eps_list[0]
+    return eps_list, lps_list, time_len, total_wait, buffer
+
+
+def test_schedule_time_differential(param):
+    rng = random.Random(3)
+    scheduled = 0
+    for _ in range(3000):
+        seq = tuple(rng.sample(range(1, 60), rng.randint(1, 12)))
+        expected = _quadratic_schedule_time(seq, param)
+        assert schedule_time(seq, param) == expected
+
+        info = generate_seq_info(seq, param)
+        if info is not None:
+            scheduled += 1
+            assert (
+                list(info.eps_list), list(info.lps_list), info.time_len,
+                info.wait, info.buffer
+            ) == expected
+    assert scheduled > 100
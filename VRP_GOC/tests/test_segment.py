@@ -0,0 +1,52 @@
+from vrp.util.info import generate_seq_info
+from vrp.util.segment import concat_segment, evaluate_segment, \
+    generate_segment, generate_prefix_segments, generate_suffix_segments
+
+import random
+
+
+def _random_seq(rng: random.Random):
+    customers = rng.sample(range(1, 51), rng.randint(1, 9))
+    if rng.random() < 0.3:
+        customers.insert(
+            rng.randrange(len(customers) + 1), rng.randint(51, 59)
+        )
+    return tuple(customers)
+
+
+def test_segment_equals_seq_info(param):
+    rng = random.Random(0)
+    feasible = 0
+    for _ in range(3000):
+        seq = _random_seq(rng)
+        vehicle_type = rng.choice([-1, 1, 2])
+        info = generate_seq_info(seq, param, vehicle_type=vehicle_type)
+        result = evaluate_segment(
+            generate_segment(seq, param), param, vehicle_type=vehicle_type
+        )
+        if info is None:
+            assert result is None
+        else:
+            feasible += 1
+            assert result[0] == info.vehicle_type
+            assert abs(result[1] - info.cost) < 1e-6
+    assert feasible > 100
+
+
+def test_prefix_suffix_concatenation(param):
+    rng = random.Random(1)
+    for _ in range(300):
+        seq1, seq2 = _random_seq(rng), _random_seq(rng)
+        prefix = generate_prefix_segments(seq1, param)
+        suffix = generate_suffix_segments(seq2, param)
+        for i in range(len(seq1) + 1):
+            for j in range(len(seq2) + 1):
+                seq = seq1[:i] + seq2[j:]
+                info = generate_seq_info(seq, param)
+                result = evaluate_segment(
+                    concat_segment(prefix[i], suffix[j], param), param
+                )
+                if info is None:
+                    assert result is None
+                else:
+                    assert abs(result[1] - info.cost) < 1e-6
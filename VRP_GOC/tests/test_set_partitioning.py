@@ -0,0 +1,101 @@
+from vrp.improvement.set_partitioning import recombine_routes, \
+    solve_set_covering, get_available_backends
+from vrp.improvement.vnd import variable_neighborhood_descent
+from vrp.construction.split import split_construct
+from vrp.improvement.inter_route import two_opt_star
+from vrp.util.info import generate_seq_info, evaluate_seq, \
+    evaluate_seq_batch, enable_route_pool, disable_route_pool
+from vrp.util.route_pool import RoutePool
+from vrp.common.constant import *
+
+
+def test_route_pool(param):
+    _, _, node, *_ = param
+    pool = RoutePool(node, max_size=4, shrink_ratio=0.5)
+    info = generate_seq_info((1, 2), param)
+    assert pool.add((1, 2), info)
+    other_info = generate_seq_info((2, 1), param)
+    assert pool.add((2, 1), other_info) == \
+        (other_info is not None and other_info.cost < info.cost)
+    assert not pool.add((3,), None)
+    assert (1, 2) in pool or (2, 1) in pool
+    for x in range(3, 8):
+        pool.add((x,), generate_seq_info((x,), param))
+    assert len(pool) <= 4
+
+    enable_route_pool(pool)
+    try:
+        info = generate_seq_info((9,), param)
+    finally:
+        disable_route_pool()
+    assert pool.route_dict.get(frozenset((9,)), (None, info))[1] == info
+
+
+def test_route_pool_candidates(param, route_dict):
+    # priced candidates are added even if they are not accepted
+    _, _, node, *_ = param
+    seq1, seq2 = sorted((k for k, v in route_dict.items() if v), key=len)[-2:]
+    seqs = [(1, x) for x in range(2, 31)]
+    pool = RoutePool(node)
+    enable_route_pool(pool)
+    try:
+        new_eval = evaluate_seq((31, 32), param)
+        _, costs = evaluate_seq_batch(seqs, param)
+        two_opt_star(seq1, route_dict[seq1], seq2, route_dict[seq2], param)
+    finally:
+        disable_route_pool()
+
+    if new_eval is not None:
+        assert pool.route_dict[frozenset((31, 32))][1].cost == new_eval[1]
+    for seq, cost in zip(seqs, costs.tolist()):
+        if cost < M:
+            assert pool.route_dict[frozenset(seq)][1].cost <= cost
+    candidates = [
+        seq1[:i] + seq2[j:] for i in range(1, len(seq1) - 1)
+        for j in range(1, len(seq2) - 1)
+    ]
+    assert any(
+        pool.get_customers(x) in pool.route_dict and
+        generate_seq_info(x, param) is not None for x in candidates
+    )
+    for seq, info in pool:
+        assert info == generate_seq_info(seq, param, info.vehicle_type)
+
+
+def test_solve_set_covering():
+    costs = [3., 3., 3., 5., 1., 1.]
+    columns = [[0, 1], [2, 3], [4], [0, 1, 2, 3, 4], [0], [4]]
+    for backend in get_available_backends():
+        selected = solve_set_covering(
+            costs, columns, 5, incumbent=[0, 1, 2], backend=backend
+        )
+        assert {i for j in selected for i in columns[j]} == set(range(5))
+        assert sum(costs[j] for j in selected) == 5.
+
+
+def test_recombine_routes(param, node_id_c):
+    _, _, node, *_ = param
+    pool = RoutePool(node)
+    enable_route_pool(pool)
+    try:
+        route_dict = split_construct(
+            {(x,) for x in range(1, 51)}, param, node_id_c
+        )
+        route_dict = variable_neighborhood_descent(
+            route_dict, param, node_id_c, neighborhood_number=3
+        )
+    finally:
+        disable_route_pool()
+    assert len(pool) > len(route_dict)
+
+    cost = sum(M if v is None else v.cost for v in route_dict.values())
+    new_route_dict = recombine_routes(route_dict, pool, param, node_id_c)
+    assert sum(
+        M if v is None else v.cost for v in new_route_dict.values()
+    ) <= cost
+    customers = sorted(
+        x for seq in new_route_dict for x in seq if (x,) not in node_id_c
+    )
+    assert customers == list(range(1, 51))
+    for seq, info in new_route_dict.items():
+        assert info == generate_seq_info(seq, param, info.vehicle_type)
@@ -0,0 +1,31 @@
+from vrp.io.shared import SharedParam, attach_shared
+from vrp.common.model import Param
+
+import numpy as np
+
+import pickle
+import multiprocessing
+from operator import attrgetter
+
+
+def test_shared_param(param):
+    param = Param(param.ds, param.tm, param.node, compat=param.ds > 0)
+    with SharedParam(param) as shared_param:
+        handle = pickle.loads(pickle.dumps(shared_param))
+        assert not handle.is_owner
+        new_param, x = attach_shared((handle, 1))
+        assert x == 1 and new_param.charge is None
+        for a, b in zip(
+                (param.ds, param.tm, param.compat, *param.node),
+                (new_param.ds, new_param.tm, new_param.compat,
+                 *new_param.node)
+        ):
+            assert a.dtype == b.dtype and np.array_equal(a, b)
+            assert not b.flags.writeable
+        del new_param
+        handle.close()
+
+        # a spawned worker only gets the handle
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            ds = pool.apply(attrgetter("param.ds"), (shared_param,))
+        assert np.array_equal(ds, param.ds)
@@ -0,0 +1,34 @@
+from vrp.construction.split import generate_giant_tour, \
+    evaluate_split_route, split_tour, split_construct
+from vrp.common.constant import *
+
+from itertools import combinations
+
+
+def test_split_tour_optimal(param, node_id_c):
+    tour = generate_giant_tour(list(range(1, 9)), param)
+    routes = split_tour(tour, param, node_id_c)
+    cost = sum(evaluate_split_route(
+        tuple(x for x in route if (x,) not in node_id_c), param, node_id_c
+    )[1] for route in routes)
+
+    # every way to cut the tour
+    best = M * len(tour)
+    for cut_num in range(len(tour)):
+        for cuts in combinations(range(1, len(tour)), cut_num):
+            bounds = (0,) + cuts + (len(tour),)
+            best = min(best, sum(
+                evaluate_split_route(tuple(tour[i:j]), param, node_id_c)[1]
+                for i, j in zip(bounds, bounds[1:])
+            ))
+    assert abs(cost - best) < 1e-6
+
+
+def test_split_construct(param, node_id_c):
+    candidate_seqs = {(x,) for x in range(1, 51)}
+    for method in ("nearest", "time"):
+        route_dict = split_construct(
+            candidate_seqs, param, node_id_c, tour_method=method
+        )
+        nodes = [x for seq in route_dict for x in seq if (x,) not in node_id_c]
+        assert sorted(nodes) == list(range(1, 51))
@@ -0,0 +1,71 @@
+from vrp.improvement import variable_neighborhood_descent, two_opt, \
+    parallel_intra_route_descent
+from vrp.util.info import generate_seq_info
+from vrp.util.insertion import efficient_insertion
+from vrp.common.constant import *
+
+
+def test_variable_neighborhood_descent(param, node_id_c, route_dict):
+    cost = sum(info.cost for info in route_dict.values() if info)
+    for candidate_k in (0, 8):
+        new_route_dict = variable_neighborhood_descent(
+            route_dict, param, node_id_c, neighborhood_number=5,
+            candidate_k=candidate_k
+        )
+        assert new_route_dict == variable_neighborhood_descent(
+            route_dict, param, node_id_c, neighborhood_number=5,
+            candidate_k=candidate_k
+        )
+        assert sum(
+            info.cost for info in new_route_dict.values() if info
+        ) < cost
+        nodes = [
+            x for seq in new_route_dict for x in seq if (x,) not in node_id_c
+        ]
+        assert sorted(nodes) == list(range(1, 51))
+        for seq, info in new_route_dict.items():
+            if info is None:
+                assert route_dict[seq] is None
+                continue
+            assert info == generate_seq_info(seq, param)
+            assert two_opt(seq, info, param)[0] is None
+
+
+def test_variable_neighborhood_descent_vehicles(param, node_id_c, route_dict):
+    # no single customer route is left that relocate could empty at a
+    # lower cost, and no route keeps a station it does not need
+    new_route_dict = variable_neighborhood_descent(
+        route_dict, param, node_id_c, neighborhood_number=20
+    )
+    new_route_dict = {k: v for k, v in new_route_dict.items() if v}
+    assert len(new_route_dict) < sum(1 for v in route_dict.values() if v)
+    for seq, info in new_route_dict.items():
+        assert all(a != b for a, b in zip(seq, seq[1:]))
+        customers = tuple(x for x in seq if (x,) not in node_id_c)
+        if customers != seq:
+            no_charge_info = generate_seq_info(customers, param)
+            assert no_charge_info is None or no_charge_info.cost >= info.cost
+        if len(customers) > 1:
+            continue
+        for other_seq, other_info in new_route_dict.items():
+            if other_seq == seq:
+                continue
+            _, new_info = efficient_insertion(
+                customers, other_seq, other_info, param, node_id_c
+            )
+            assert new_info is None or \
+                new_info.cost >= info.cost + other_info.cost
+
+
+def test_parallel_intra_route_descent(param, node_id_c, route_dict):
+    improved = parallel_intra_route_descent(route_dict, param, node_id_c)
+    for processes in (2, 3):
+        parallel_improved = parallel_intra_route_descent(
+            route_dict, param, node_id_c, processes=processes, chunk_size=2
+        )
+        assert list(parallel_improved.items()) == list(improved.items())
+    for seq, (new_seq, new_info) in improved.items():
+        assert new_info.cost < route_dict[seq].cost
+        assert sorted(x for x in new_seq if (x,) not in node_id_c) == \
+            sorted(x for x in seq if (x,) not in node_id_c)
+        assert new_info == generate_seq_info(new_seq, param)
@@ -18,3 +18,9 @@ M = 1e15
 
 START_TIME = 0
 END_TIME = 960
+
+# node type
+DEPOT = 1
+DELIVERY = 2
+PICKUP = 3
+CHARGE = 4
@@ -1,23 +1,13 @@
+from array import array
 from collections import namedtuple
 
 
-class SeqDict(dict):
-
-    def __getitem__(self, item):
-
-        if len(item) != 2:
-            return dict.__getitem__(self, item)
-        else:
-            a, b = item
-            try:
-                return dict.__getitem__(self, (a[-1:], b[:1]))
-            except TypeError:
-                raise BaseException("SeqDict TypeError in: " + str(item))
-
-
-SeqInfo = namedtuple(
-    "SeqInfo",
-    [
+class SeqInfo(object):
+    """
+    route record, scalar fields are plain numbers and the time window
+    profiles are typed arrays, created for every accepted sequence
+    """
+    __slots__ = (
         "vehicle_type",
         "volume",
         "weight",
@@ -29,19 +19,104 @@ SeqInfo = namedtuple(
         "buffer",  # buffer time
         "charge_index",
         "cost"
+    )
+    _fields = __slots__
+
+    def __init__(
+            self, vehicle_type, volume, weight, total_distance,
+            eps_list, lps_list, time_len, wait, buffer, charge_index, cost
+    ):
+        self.vehicle_type = vehicle_type
+        self.volume = volume
+        self.weight = weight
+        self.total_distance = total_distance
+        self.eps_list = array("i", eps_list)
+        self.lps_list = array("i", lps_list)
+        self.time_len = time_len
+        self.wait = wait
+        self.buffer = buffer
+        self.charge_index = tuple(charge_index)
+        self.cost = cost
+
+    def __iter__(self):
+        return (getattr(self, x) for x in self._fields)
+
+    def __eq__(self, other):
+        return isinstance(other, SeqInfo) and tuple(self) == tuple(other)
+
+    def __reduce__(self):
+        return SeqInfo, tuple(self)
+
+    def __repr__(self):
+        return "SeqInfo(" + ", ".join(
+            x + "=" + repr(
+                getattr(self, x).tolist()
+                if isinstance(getattr(self, x), array) else getattr(self, x)
+            )
+            for x in self._fields
+        ) + ")"
+
+
+CacheStats = namedtuple(
+    "CacheStats",
+    ["hits", "misses", "evictions", "size", "max_size"]
+)
+
+# summary of a consecutive part of a route, see vrp.util.segment
+Segment = namedtuple(
+    "Segment",
+    [
+        "first_node",
+        "last_node",
+        "distance",  # distance inside the segment
+        "duration",  # travel and service time inside the segment
+        # latest possible start: lps_out = clamp(x + duration, lps_lo, lps_hi)
+        # for x = latest possible arrival at first_node
+        "lps_lo",
+        "lps_hi",
+        "wait_c",  # total wait: wait_c + max(0, wait_e - x)
+        "wait_e",
+        "shift_c",  # total shift: shift_c + max(0, x - shift_e)
+        "shift_e",
+        # earliest possible start: eps_out = max(y + duration, eps_b),
+        # feasible only if y <= eps_c for y = earliest arrival at first_node
+        "eps_b",
+        "eps_c",
+        "volume_d",  # delivery load, net load change, max prefix net change
+        "volume_n",
+        "volume_m",
+        "weight_d",
+        "weight_n",
+        "weight_m",
+        "charge_cnt",
+        # max of (distance to node - limit * charges before node)
+        # for DISTANCE_1 and DISTANCE_2
+        "distance_excess_1",
+        "distance_excess_2"
     ]
 )
 
-Param = namedtuple(
-    "Param",
+NodeTable = namedtuple(
+    "NodeTable",
     [
-        "ds",
-        "tm",
+        "type",  # DEPOT, DELIVERY, PICKUP or CHARGE
         "volume",
         "weight",
-        "first",
+        "first",  # time window
         "last",
-        "ntj",  # For node_type_judgement
-        "position"
+        "lng",
+        "lat"
     ]
+)  # every field is an array indexed by node id
+
+Param = namedtuple(
+    "Param",
+    [
+        "ds",  # distance matrix, ds[from_node, to_node]
+        "tm",  # time matrix, tm[from_node, to_node]
+        "node",  # NodeTable
+        "charge",  # best charging stations, see vrp.util.charge, optional
+        "compat"  # arc compatibility, see vrp.util.compat, optional
+    ],
+    defaults=(None, None)
 )
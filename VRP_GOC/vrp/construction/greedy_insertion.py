@@ -1,2 +1,187 @@
-def greedy_insertion_construct():
-    pass
+from vrp.common.model import SeqInfo, Param
+from vrp.common.constant import *
+from vrp.util.info import generate_seq_info
+from vrp.util.granular import get_granular_neighbors
+from vrp.util.insertion import price_insertion
+from vrp.util.segment import generate_segment, generate_prefix_segments, \
+    generate_suffix_segments
+
+import heapq
+from itertools import count
+from typing import Dict, Tuple, Set, List
+
+
+def calculate_insertion_costs(
+        seq: Tuple,
+        route: Tuple,
+        info: SeqInfo,
+        prefix: List,
+        suffix: List,
+        param: Param,
+        node_id_c: Set,
+        granular_neighbors: List[Set[int]] = None
+) -> (float, Tuple, int):
+    """
+    the cheapest insertion of seq into route, with granular_neighbors
+    only next to a neighbor of seq[0] or seq[-1]
+    :param seq:
+    :param route:
+    :param info: info of route
+    :param prefix: see generate_prefix_segments
+    :param suffix: see generate_suffix_segments
+    :param param:
+    :param node_id_c:
+    :param granular_neighbors:
+    :return: cost increase, new route and vehicle type, or None
+    """
+    if granular_neighbors is None:
+        positions = range(len(route) + 1)
+    else:
+        before, after = granular_neighbors[seq[0]], granular_neighbors[seq[-1]]
+        positions = [
+            i for i in range(len(route) + 1)
+            if (i > 0 and route[i - 1] in before) or
+            (i < len(route) and route[i] in after)
+        ]
+    seq_seg = generate_segment(seq, param)
+    best = None
+    for i in positions:
+        new_eval = price_insertion(
+            seq, seq_seg, route, prefix, suffix, i, param, node_id_c
+        )
+        if new_eval is not None and (best is None or new_eval[2] < best[2]):
+            best = new_eval
+    if best is None:
+        return None
+    return best[2] - info.cost, best[0], best[1]
+
+
+def greedy_insertion_construct(
+        candidate_seqs: Set,
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        regret_k: int = 2,
+        granular_k: int = 30,
+        granular_metric: str = "distance",
+        granular_neighbors: List[Set[int]] = None
+) -> Dict[Tuple, SeqInfo]:
+    """
+    regret-k insertion:
+        the seq with the largest regret, sum of (h-th best - best)
+        insertion cost for h < regret_k, is inserted at its best place,
+        opening a new route is one of the places. the insertion costs
+        of every seq into every route are cached, and only the entries
+        of the changed route are priced again after an insertion.
+        regret_k=1 is the plain cheapest insertion
+    :param candidate_seqs: seqs to insert
+    :param route_dict: routes to insert into, may be empty, not changed
+    :param param:
+    :param node_id_c:
+    :param regret_k:
+    :param granular_k: if > 0, a seq is only priced for the routes with
+        one of its k nearest, next to that node
+    :param granular_metric: distance, time or time_window
+    :param granular_neighbors: used instead of granular_k if given,
+        see get_granular_neighbors
+    :return: routes, a seq that can not be served at all is a route of
+        its own whose info is None
+    """
+    route_dict = dict(route_dict)
+    if granular_neighbors is None and granular_k > 0:
+        granular_neighbors = get_granular_neighbors(
+            param, granular_k, granular_metric
+        )
+    unrouted = set(candidate_seqs)
+    end_dict = dict()  # node -> unrouted seqs that start or end with it
+    for seq in unrouted:
+        end_dict.setdefault(seq[0], set()).add(seq)
+        end_dict.setdefault(seq[-1], set()).add(seq)
+
+    # seq -> route -> (cost increase, new route, vehicle type)
+    cost_dict = {seq: dict() for seq in unrouted}
+    route_seqs = dict()  # route -> seqs with a cached cost for it
+    new_route_cost = dict()
+    for seq in unrouted:
+        info = generate_seq_info(seq, param)
+        new_route_cost[seq] = M if info is None else info.cost
+
+    heap = []
+    version = {seq: 0 for seq in unrouted}
+    counter = count()
+
+    def push(seq):
+        """
+        regret of seq from the cached costs
+        """
+        version[seq] += 1
+        k = max(1, regret_k)
+        costs = heapq.nsmallest(
+            k, [x[0] for x in cost_dict[seq].values()] + [new_route_cost[seq]]
+        )
+        costs += [M] * (k - len(costs))
+        regret = sum(x - costs[0] for x in costs[1:])
+        heapq.heappush(
+            heap, (-regret, costs[0], next(counter), seq, version[seq])
+        )
+
+    def price(route):
+        """
+        price the unrouted seqs for route
+        """
+        info = route_dict[route]
+        if info is None:
+            return
+        prefix = generate_prefix_segments(route, param)
+        suffix = generate_suffix_segments(route, param)
+        if granular_neighbors is None:
+            seqs = unrouted
+        else:
+            seqs = set()
+            for x in route:
+                for y in granular_neighbors[x]:
+                    seqs.update(end_dict.get(y, ()))
+        route_seqs[route] = set()
+        for seq in seqs:
+            new_eval = calculate_insertion_costs(
+                seq, route, info, prefix, suffix, param, node_id_c,
+                granular_neighbors
+            )
+            if new_eval is not None:
+                cost_dict[seq][route] = new_eval
+                route_seqs[route].add(seq)
+                push(seq)
+
+    for route in route_dict:
+        price(route)
+    for seq in unrouted:
+        push(seq)
+
+    while heap:
+        _, _, _, seq, seq_version = heapq.heappop(heap)
+        if seq not in unrouted or seq_version != version[seq]:
+            continue  # stale
+        unrouted.remove(seq)
+        for x in (seq[0], seq[-1]):
+            end_dict[x].discard(seq)
+        costs = cost_dict.pop(seq)
+        for route in costs:
+            route_seqs[route].discard(seq)
+
+        route = min(costs, key=lambda x: costs[x][0]) if costs else None
+        if route is not None and costs[route][0] < new_route_cost[seq]:
+            _, new_route, vehicle_type = costs[route]
+            route_dict.pop(route)
+            route_dict[new_route] = generate_seq_info(
+                new_route, param, vehicle_type=vehicle_type
+            )
+            affected = route_seqs.pop(route)
+            for x in affected:
+                cost_dict[x].pop(route)
+        else:
+            new_route, affected = seq, ()
+            route_dict[new_route] = generate_seq_info(seq, param)
+        price(new_route)
+        for x in affected:
+            push(x)
+    return route_dict
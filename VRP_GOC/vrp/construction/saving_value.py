@@ -1,8 +1,129 @@
-from vrp.util.info import generate_seq_info
+from vrp.util.info import generate_seq_info, evaluate_seq
 from vrp.common.model import SeqInfo, Param
+from vrp.io.shared import SharedParam, attach_shared
 from vrp.evaluator.check import check_concat_seqs_available
+from vrp.util.granular import get_granular_neighbors
+from vrp.util.charge import get_charge_candidates
+from vrp.util.compat import check_compat
 
-from typing import Dict, Tuple, Set
+import heapq
+from itertools import count
+from multiprocessing import Pool
+from typing import Dict, Tuple, Set, List, Iterator
+
+
+def calculate_saving_value(
+        seq1: Tuple,
+        seq2: Tuple,
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        time_sorted_limit: bool = False
+) -> (Tuple, SeqInfo, float):
+    """
+    merge seq2 after seq1, a charging station is put between them
+    if the merged route is over the distance limit
+    :param seq1:
+    :param seq2:
+    :param route_dict:
+    :param param:
+    :param node_id_c:
+    :param time_sorted_limit:
+    :return: charging station put between seq1 and seq2 (() if none)
+        and saving value, or None if not available
+    """
+    info1, info2 = route_dict[seq1], route_dict[seq2]
+
+    if time_sorted_limit:
+        if not (
+            (info1.eps_list[0], info1.lps_list[0]) <=
+            (info2.eps_list[0], info2.lps_list[0])
+        ):
+            return None
+
+    is_available, err = check_concat_seqs_available(
+        seq1, info1, seq2, info2, param
+    )
+
+    if is_available:
+        cid = ()
+    elif err == 4:  # over distance limit
+        cid = get_charge_candidates(seq1[-1], seq2[0], param, node_id_c)[0]
+    else:
+        return None
+    new_seq = seq1 + cid + seq2
+    # arcs between seq1 and seq2
+    if not check_compat(
+            new_seq, range(len(seq1), len(new_seq) - len(seq2) + 1), param
+    ):
+        return None
+
+    # only the cost is needed here, the info is generated on merge
+    new_eval = evaluate_seq(new_seq, param, vehicle_type=2)
+    if new_eval is None:
+        return None
+    return cid, info1.cost + info2.cost - new_eval[1]
+
+
+def generate_candidate_pairs(
+        candidate_seqs: Set,
+        granular_neighbors: List[Set[int]] = None,
+        seq1_list: List[Tuple] = None
+) -> Iterator[Tuple[Tuple, Tuple]]:
+    """
+    ordered pairs (seq1, seq2) to merge, with granular_neighbors only
+    the pairs where seq2[0] is a neighbor of seq1[-1]
+    :param candidate_seqs:
+    :param granular_neighbors: see get_granular_neighbors
+    :param seq1_list: seq1 is taken from seq1_list instead of candidate_seqs
+    :return:
+    """
+    seq1_list = candidate_seqs if seq1_list is None else seq1_list
+    if granular_neighbors is None:
+        for seq1 in seq1_list:
+            for seq2 in candidate_seqs:
+                if seq1 != seq2:
+                    yield seq1, seq2
+        return
+
+    first_node_dict = dict()
+    for seq in candidate_seqs:
+        first_node_dict.setdefault(seq[0], []).append(seq)
+    for seq1 in seq1_list:
+        for nid in sorted(granular_neighbors[seq1[-1]]):
+            for seq2 in first_node_dict.get(nid, ()):
+                if seq1 != seq2:
+                    yield seq1, seq2
+
+
+# shared by the worker processes of generate_saving_value_pair_candidates
+_pool_data = None
+
+
+def _init_pool(*data):
+    global _pool_data
+    _pool_data = attach_shared(data)
+
+
+def _generate_saving_value_shard(seq1_list: List[Tuple]) -> List[Tuple]:
+    """
+    positive savings of the pairs whose seq1 is in seq1_list
+    :param seq1_list:
+    :return:
+    """
+    candidate_seqs, route_dict, param, node_id_c, \
+        time_sorted_limit, granular_neighbors = _pool_data
+    shard = []
+    for seq1, seq2 in generate_candidate_pairs(
+            candidate_seqs, granular_neighbors, seq1_list
+    ):
+        saving = calculate_saving_value(
+            seq1, seq2, route_dict, param, node_id_c,
+            time_sorted_limit=time_sorted_limit
+        )
+        if saving is not None and saving[-1] > 0:
+            shard.append(((seq1, seq2), saving))
+    return shard
 
 
 def generate_saving_value_pair_candidates(
@@ -10,7 +131,9 @@ def generate_saving_value_pair_candidates(
         route_dict: Dict[Tuple, SeqInfo],
         param: Param,
         node_id_c: Set,
-        time_sorted_limit: bool = False
+        time_sorted_limit: bool = False,
+        granular_neighbors: List[Set[int]] = None,
+        processes: int = 1
 ) -> Dict[Tuple, Tuple]:
     """
     :param candidate_seqs: candidate nodes or seqs
@@ -18,48 +141,40 @@ def generate_saving_value_pair_candidates(
     :param param:
     :param node_id_c:
     :param time_sorted_limit:
-    :return:
+    :param granular_neighbors: only evaluate granular pairs if given
+    :param processes: if > 1, the seq1 loop is split into contiguous shards
+        evaluated by a process pool, in the same order for any number
+        of processes
+    :return: (seq1, seq2) -> (charging station between them, saving value),
+        only for positive savings, the merged sequences are not kept
     """
-    ds, tm, volume, weight, first, last, ntj, position = param
     saving_value_pair_candidate_dict = dict()
-    for seq1 in candidate_seqs:
-        for seq2 in candidate_seqs:
-            if seq1 == seq2:
-                continue
-            info1, info2 = route_dict[seq1], route_dict[seq2]
-
-            if time_sorted_limit:
-                if not (
-                    (info1.eps_list[0], info1.lps_list[0]) <=
-                    (info2.eps_list[0], info2.lps_list[0])
-                ):
-                    continue
-
-            is_available, err = check_concat_seqs_available(
-                seq1, route_dict[seq1], seq2, route_dict[seq2], param
-            )
-
-            if is_available:
-                new_seq = seq1 + seq2
-            elif err == 4:  # over distance limit
-                charge_nodes = [
-                    (cid, ds[seq1, cid] + ds[cid, seq2])
-                    for cid in node_id_c
-                ]
-                charge_nodes.sort(key=lambda x: x[-1])
-                new_seq = seq1 + charge_nodes[0][0] + seq2
-                del charge_nodes
-            else:
-                continue
-
-            old_cost = route_dict[seq1].cost + route_dict[seq2].cost
-            new_info = generate_seq_info(
-                new_seq, param, vehicle_type=2
-            )
-            if new_info is not None:
-                saving_value_pair_candidate_dict[(seq1, seq2)] = (
-                    new_seq, new_info, old_cost - new_info.cost
+    if processes > 1:
+        candidate_seqs = list(candidate_seqs)
+        shard_size = max(1, -(-len(candidate_seqs) // (processes * 4)))
+        shards = [
+            candidate_seqs[i:i + shard_size]
+            for i in range(0, len(candidate_seqs), shard_size)
+        ]
+        with SharedParam(param) as shared_param, Pool(
+                processes, initializer=_init_pool, initargs=(
+                    candidate_seqs, route_dict, shared_param, node_id_c,
+                    time_sorted_limit, granular_neighbors
                 )
+        ) as pool:
+            for shard in pool.imap(_generate_saving_value_shard, shards):
+                saving_value_pair_candidate_dict.update(shard)
+        return saving_value_pair_candidate_dict
+
+    for seq1, seq2 in generate_candidate_pairs(
+            candidate_seqs, granular_neighbors
+    ):
+        saving = calculate_saving_value(
+            seq1, seq2, route_dict, param, node_id_c,
+            time_sorted_limit=time_sorted_limit
+        )
+        if saving is not None and saving[-1] > 0:
+            saving_value_pair_candidate_dict[(seq1, seq2)] = saving
 
     return saving_value_pair_candidate_dict
 
@@ -70,30 +185,33 @@ def merge_saving_value_pairs(
         param: Param,
         node_id_c: Set,
         time_sorted_limit: bool = False,
-        merge_seq_each_time: int = 100
+        merge_seq_each_time: int = 100,
+        granular_neighbors: List[Set[int]] = None,
+        processes: int = 1
 ) -> (Dict[Tuple, SeqInfo], int):
     saving_value_pair_candidate_dict = generate_saving_value_pair_candidates(
         candidate_seqs, route_dict, param, node_id_c,
-        time_sorted_limit=time_sorted_limit
+        time_sorted_limit=time_sorted_limit,
+        granular_neighbors=granular_neighbors,
+        processes=processes
     )
     print(len(saving_value_pair_candidate_dict))
 
     saving_value_rank_list = []
-    for (seq1, seq2), (new_seq, new_info, saving_value) in \
+    for (seq1, seq2), (cid, saving_value) in \
             saving_value_pair_candidate_dict.items():
         if saving_value > 0:
             saving_value_rank_list.append(
-                (seq1, seq2, new_seq, new_info, saving_value)
+                (seq1, seq2, cid, saving_value)
             )
     del saving_value_pair_candidate_dict
     saving_value_rank_list.sort(key=lambda x: x[-1], reverse=True)
 
     new_seq_count = 0
     pop_route_set = set()
-    for seq1, seq2, new_seq, new_info, _ in saving_value_rank_list:
+    for seq1, seq2, cid, _ in saving_value_rank_list:
         if seq1 not in pop_route_set and \
-                seq2 not in pop_route_set \
-                and new_info is not None:
+                seq2 not in pop_route_set:
 
             if new_seq_count >= merge_seq_each_time:
                 break
@@ -105,19 +223,46 @@ def merge_saving_value_pairs(
                 route_dict.pop(seq2)
                 pop_route_set.add(seq2)
 
-            route_dict[new_seq] = new_info
+            new_seq = seq1 + cid + seq2
+            route_dict[new_seq] = generate_seq_info(
+                new_seq, param, vehicle_type=2
+            )
             new_seq_count += 1
 
     return route_dict, new_seq_count
 
 
+def generate_init_route_dict(
+        candidate_seqs: Set,
+        param: Param
+) -> (Dict[Tuple, SeqInfo], Set):
+    """
+    routes of a single seq with vehicle type 2 to start the savings from
+    :param candidate_seqs:
+    :param param:
+    :return: routes, and the seqs that can not be served alone, they are
+        left out of the routes as no merge can make them available
+    """
+    init_route_dict, unavailable_seqs = dict(), set()
+    for seq in candidate_seqs:
+        info = generate_seq_info(seq, param, vehicle_type=2)
+        if info is None:
+            unavailable_seqs.add(seq)
+        else:
+            init_route_dict[seq] = info
+    return init_route_dict, unavailable_seqs
+
+
 def saving_value_construct(
         candidate_seqs: Set,
         init_route_dict: Dict[Tuple, SeqInfo],
         param: Param,
         node_id_c: Set,
         time_sorted_limit: bool = False,
-        merge_seq_each_time: int = 100
+        merge_seq_each_time: int = 100,
+        granular_k: int = 0,
+        granular_metric: str = "distance",
+        processes: int = 1
 ) -> Dict[Tuple, SeqInfo]:
     """
 
@@ -127,6 +272,10 @@ def saving_value_construct(
     :param node_id_c:
     :param time_sorted_limit:
     :param merge_seq_each_time:
+    :param granular_k: if > 0, only merge seq1 and seq2 when
+        seq1[-1] and seq2[0] are within each other's k nearest
+    :param granular_metric: distance, time or time_window
+    :param processes: number of processes to generate the saving pairs
     :return:
     """
     # candidate_seqs = set(*candidate_seqs)
@@ -134,14 +283,111 @@ def saving_value_construct(
         k: v for k, v in init_route_dict.items()
         if k in candidate_seqs or k in node_id_c
     }
+    # routes whose info is None are not merged and returned unchanged
+    unavailable_dict = {k: v for k, v in route_dict.items() if v is None}
+    for k in unavailable_dict:
+        route_dict.pop(k)
+    candidate_seqs = [x for x in candidate_seqs if x not in unavailable_dict]
+    granular_neighbors = get_granular_neighbors(
+        param, granular_k, granular_metric
+    ) if granular_k > 0 else None
     while True:
         route_dict, new_seq_count = merge_saving_value_pairs(
             candidate_seqs, route_dict, param, node_id_c,
             time_sorted_limit=time_sorted_limit,
-            merge_seq_each_time=merge_seq_each_time
+            merge_seq_each_time=merge_seq_each_time,
+            granular_neighbors=granular_neighbors,
+            processes=processes
         )
         # update candidate seqs
         candidate_seqs = list(route_dict)
         if new_seq_count < 1:
             break
+    route_dict.update(unavailable_dict)
+    return route_dict
+
+
+def heap_saving_value_construct(
+        candidate_seqs: Set,
+        init_route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        time_sorted_limit: bool = False,
+        granular_k: int = 0,
+        granular_metric: str = "distance",
+        processes: int = 1
+) -> Dict[Tuple, SeqInfo]:
+    """
+    incremental savings construction:
+        all positive savings are kept in a max heap, the best one is
+        merged, and only the pairs with the new route are evaluated.
+        entries of merged routes are skipped when they are popped.
+        same as saving_value_construct with merge_seq_each_time=1,
+        but O(R) evaluations per merge instead of O(R^2)
+    :param candidate_seqs:
+    :param init_route_dict:
+    :param param:
+    :param node_id_c:
+    :param time_sorted_limit:
+    :param granular_k: see saving_value_construct
+    :param granular_metric:
+    :param processes: number of processes to generate the initial savings
+    :return:
+    """
+    route_dict = {
+        k: v for k, v in init_route_dict.items()
+        if k in candidate_seqs or k in node_id_c
+    }
+    # routes whose info is None are not merged and returned unchanged
+    unavailable_dict = {k: v for k, v in route_dict.items() if v is None}
+    for k in unavailable_dict:
+        route_dict.pop(k)
+    granular_neighbors = get_granular_neighbors(
+        param, granular_k, granular_metric
+    ) if granular_k > 0 else None
+    saving_heap = []
+    counter = count()  # ties are popped in the order they are pushed
+
+    def push(seq1, seq2):
+        if granular_neighbors is not None and \
+                seq2[0] not in granular_neighbors[seq1[-1]]:
+            return
+        saving = calculate_saving_value(
+            seq1, seq2, route_dict, param, node_id_c,
+            time_sorted_limit=time_sorted_limit
+        )
+        if saving is not None and saving[-1] > 0:
+            cid, saving_value = saving
+            heapq.heappush(
+                saving_heap, (-saving_value, next(counter), seq1, seq2, cid)
+            )
+
+    for (seq1, seq2), (cid, saving_value) in \
+            generate_saving_value_pair_candidates(
+                list(route_dict), route_dict, param, node_id_c,
+                time_sorted_limit=time_sorted_limit,
+                granular_neighbors=granular_neighbors,
+                processes=processes
+            ).items():
+        if saving_value > 0:
+            heapq.heappush(
+                saving_heap, (-saving_value, next(counter), seq1, seq2, cid)
+            )
+
+    while saving_heap:
+        _, _, seq1, seq2, cid = heapq.heappop(saving_heap)
+        if seq1 not in route_dict or seq2 not in route_dict:
+            continue  # stale, one of the routes has been merged
+        if seq1 not in node_id_c:
+            route_dict.pop(seq1)
+        if seq2 not in node_id_c:
+            route_dict.pop(seq2)
+        new_seq = seq1 + cid + seq2
+        route_dict[new_seq] = generate_seq_info(new_seq, param, vehicle_type=2)
+
+        for seq in route_dict:
+            if seq != new_seq:
+                push(new_seq, seq)
+                push(seq, new_seq)
+    route_dict.update(unavailable_dict)
     return route_dict
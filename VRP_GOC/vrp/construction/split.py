@@ -0,0 +1,181 @@
+from vrp.common.model import SeqInfo, Param
+from vrp.common.constant import *
+from vrp.util.info import generate_seq_info
+from vrp.util.charge import get_charge_candidates
+from vrp.util.segment import single_segment, concat_segment, \
+    concat_segments, evaluate_segment, generate_segment, \
+    generate_suffix_segments, check_segment_chargeable
+
+import numpy as np
+
+from typing import Dict, Tuple, Set, List
+
+
+def generate_giant_tour(
+        nodes: List[int],
+        param: Param,
+        method: str = "nearest"
+) -> List[int]:
+    """
+    a tour over all nodes without capacity, distance or time limits
+        nearest: nearest neighbor from the depot
+        time: sorted by time window
+    :param nodes:
+    :param param:
+    :param method: nearest or time
+    :return:
+    """
+    ds, _, node, *_ = param
+    if method == "time":
+        return sorted(nodes, key=lambda x: (
+            node.first.item(x), node.last.item(x), ds.item(0, x)
+        ))
+    if method != "nearest":
+        raise ValueError("unknown method: " + str(method))
+
+    nodes = np.array(nodes, dtype=np.int64)
+    dist = np.asarray(ds[np.ix_(nodes, nodes)], dtype=np.float64)
+    visited = np.zeros(len(nodes), dtype=bool)
+    current_dist = np.asarray(ds[0, nodes], dtype=np.float64)
+    tour = []
+    for _ in range(len(nodes)):
+        i = int(np.argmin(np.where(visited, np.inf, current_dist)))
+        visited[i] = True
+        tour.append(int(nodes[i]))
+        current_dist = dist[i]
+    return tour
+
+
+def _charge_route(
+        route: Tuple,
+        param: Param,
+        node_id_c: Set
+) -> (Tuple, float):
+    """
+    the cheapest way to put one charging station into route
+    :param route:
+    :param param:
+    :param node_id_c:
+    :return: new route and cost, or None, M
+    """
+    suffix = generate_suffix_segments(route, param)
+    tmp_route, tmp_cost = None, M
+    prefix_seg = None
+    for k in range(len(route) + 1):
+        node1 = route[k - 1] if k > 0 else 0
+        node2 = route[k] if k < len(route) else 0
+        cid = get_charge_candidates(node1, node2, param, node_id_c)[0]
+        new_eval = evaluate_segment(concat_segments(
+            prefix_seg, single_segment(cid[0], param), suffix[k], param=param
+        ), param)
+        if new_eval is not None and new_eval[1] < tmp_cost:
+            tmp_route, tmp_cost = route[:k] + cid + route[k:], new_eval[1]
+        if k < len(route):
+            prefix_seg = concat_segment(
+                prefix_seg, single_segment(route[k], param), param
+            )
+    return tmp_route, tmp_cost
+
+
+def evaluate_split_route(
+        route: Tuple,
+        param: Param,
+        node_id_c: Set
+) -> (Tuple, float):
+    """
+    cost of serving route by one vehicle, with one charging station
+    put in if the route is not available without
+    :param route:
+    :param param:
+    :param node_id_c:
+    :return: route (with charging station) and cost, or None, M
+    """
+    new_eval = evaluate_segment(generate_segment(route, param), param)
+    if new_eval is not None:
+        return route, new_eval[1]
+    if not node_id_c:
+        return None, M
+    return _charge_route(route, param, node_id_c)
+
+
+def split_tour(
+        tour: List[int],
+        param: Param,
+        node_id_c: Set,
+        max_route_len: int = 50
+) -> List[Tuple]:
+    """
+    split a giant tour into routes of consecutive nodes with the least
+    total cost (Bellman shortest path over the tour positions).
+    every route is extended one node at a time with segment concatenation,
+    so a route is evaluated in O(1) unless a charging station is needed,
+    and it stops growing once no vehicle can serve it
+    :param tour:
+    :param param:
+    :param node_id_c:
+    :param max_route_len:
+    :return: routes
+    """
+    n = len(tour)
+    # (number of nodes served alone without being available, cost)
+    value = [(0, 0.)] + [None] * n
+    pred = [(-1, None)] * (n + 1)
+    for i in range(n + 1):
+        if value[i] is None:
+            # tour[i - 1] can not be served at all, serve it alone
+            value[i] = (value[i - 1][0] + 1, value[i - 1][1])
+            pred[i] = (i - 1, (tour[i - 1],))
+        seg = None
+        for j in range(i, min(n, i + max_route_len)):
+            seg = concat_segment(seg, single_segment(tour[j], param), param)
+            if not check_segment_chargeable(seg, param) or \
+                    seg.distance > 2 * DISTANCE_2:
+                break  # no vehicle can serve a longer route either
+            route = tuple(tour[i:j + 1])
+            new_eval = evaluate_segment(seg, param)
+            if new_eval is not None:
+                cost = new_eval[1]
+            elif node_id_c:
+                route, cost = _charge_route(route, param, node_id_c)
+                if route is None:
+                    continue
+            else:
+                continue
+            new_value = (value[i][0], value[i][1] + cost)
+            if value[j + 1] is None or new_value < value[j + 1]:
+                value[j + 1] = new_value
+                pred[j + 1] = (i, route)
+
+    routes = []
+    j = n
+    while j > 0:
+        j, route = pred[j]
+        routes.append(route)
+    return routes[::-1]
+
+
+def split_construct(
+        candidate_seqs: Set,
+        param: Param,
+        node_id_c: Set,
+        tour_method: str = "nearest",
+        max_route_len: int = 50
+) -> Dict[Tuple, SeqInfo]:
+    """
+    route first, cluster second:
+        a giant tour over all nodes of candidate_seqs is split
+        into the best routes by split_tour
+    :param candidate_seqs:
+    :param param:
+    :param node_id_c:
+    :param tour_method: see generate_giant_tour
+    :param max_route_len:
+    :return: routes, a customer that can not be served at all is a
+        route of its own whose info is None
+    """
+    nodes = [x for seq in candidate_seqs for x in seq]
+    tour = generate_giant_tour(nodes, param, method=tour_method)
+    return {
+        route: generate_seq_info(route, param)
+        for route in split_tour(tour, param, node_id_c, max_route_len)
+    }
@@ -3,7 +3,7 @@ from vrp.common.constant import *
 
 from functools import reduce
 from typing import Tuple
-from vrp.model import SeqInfo, Param
+from vrp.common.model import SeqInfo, Param
 
 
 def check_concat_seqs_available(
@@ -37,10 +37,11 @@ def check_concat_seqs_available(
     _, (*_, dist1) = calculate_seq_distance(seq1, param)
     _, (dist2, *_) = calculate_seq_distance(seq2, param)
     ds_limit = DISTANCE_1 if is_type_1 else DISTANCE_2
-    if dist1 + dist2 - ds[seq1, (0,)] - ds[(0,), seq2] + ds[seq1, seq2] \
-            > ds_limit:
+    if dist1 + dist2 - ds[seq1[-1], 0] - ds[0, seq2[0]] + \
+            ds[seq1[-1], seq2[0]] > ds_limit:
         return False, 4
-    if info1.eps_list[-2] + SERVE_TIME + tm[seq1, seq2] > info2.lps_list[1]:
+    if info1.eps_list[-2] + SERVE_TIME + tm[seq1[-1], seq2[0]] > \
+            info2.lps_list[1]:
         return False, 5
     return True, 0
 
@@ -50,7 +51,7 @@ def check_seq_available(
         info: SeqInfo,
         param: Param
 ) -> (bool, int):
-    ds, tm, volume, weight, first, last, _, _ = param
+    ds, tm, node, *_ = param
 
     is_type2 = True if info.vehicle_type == 2 else False
     volume_limit = VOLUME_2 if is_type2 else VOLUME_1
@@ -58,11 +59,11 @@ def check_seq_available(
     distance_limit = DISTANCE_2 if is_type2 else DISTANCE_1
 
     # volume check
-    if sum((volume[x] for x in ((x,) for x in seq))) > volume_limit:
+    if node.volume[list(seq)].sum() > volume_limit:
         return False, 2
 
     # weight check
-    if sum((weight[x] for x in ((x,) for x in seq))) > weight_limit:
+    if node.weight[list(seq)].sum() > weight_limit:
         return False, 3
 
     # distance check
@@ -74,8 +75,8 @@ def check_seq_available(
     #   1. check eps and lps
     #   2. check eps <= lps <= ls
     if not all((
-        x[0] <= x[1] <= last[(x[2],)]
-        for x in zip(info.eps_list, info.lps_list, seq)
+        x[0] <= x[1] <= x[2]
+        for x in zip(info.eps_list, info.lps_list, node.last[list(seq)])
     )):
         return False, 5
 
@@ -83,12 +84,13 @@ def check_seq_available(
 
 
 # TODO
-def check_output(route_dict, is_charge):
+def check_output(route_dict, param):
+    node = param.node
     all_nodes = [
         x
         for x in
         reduce(lambda x, y: x + y, [x for x in route_dict])
-        if not is_charge(x)
+        if node.type[x] != CHARGE
     ]
     if len(all_nodes) == len(set(all_nodes)):
         return True
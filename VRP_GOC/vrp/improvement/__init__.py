@@ -0,0 +1,10 @@
+from vrp.improvement.intra_route import two_opt, or_opt
+from vrp.improvement.inter_route import two_opt_star, relocate, \
+    cross_exchange, granular_two_opt_star, granular_relocate, \
+    granular_cross_exchange
+from vrp.improvement.vnd import variable_neighborhood_descent, \
+    parallel_intra_route_descent, VND_OPERATORS
+from vrp.improvement.alns import adaptive_large_neighborhood_search, \
+    DESTROY_OPERATORS, REPAIR_OPERATORS
+from vrp.improvement.hgs import hybrid_genetic_search
+from vrp.improvement.set_partitioning import recombine_routes
@@ -0,0 +1,411 @@
+"""
+adaptive large neighborhood search
+
+every iteration a destroy operator removes some customers from the
+current solution and a repair operator puts them back, the operators
+are chosen by roulette wheel with weights adapted to their success,
+and the new solution is accepted by simulated annealing.
+"""
+from vrp.common.model import SeqInfo, Param
+from vrp.common.constant import *
+from vrp.util.info import generate_seq_info
+from vrp.util.granular import get_granular_neighbors
+from vrp.util.segment import concat_segment, evaluate_segment, \
+    generate_prefix_segments, generate_suffix_segments
+from vrp.construction.greedy_insertion import greedy_insertion_construct
+from vrp.construction.saving_value import heap_saving_value_construct
+
+import math
+import time
+import random
+from typing import Dict, Tuple, Set, List
+
+
+def _get_customers(route_dict: Dict[Tuple, SeqInfo], param: Param) -> List:
+    _, _, node, *_ = param
+    return [
+        x for seq in route_dict for x in seq if node.type.item(x) != CHARGE
+    ]
+
+
+def random_removal(
+        route_dict: Dict[Tuple, SeqInfo],
+        remove_number: int,
+        param: Param,
+        rng: random.Random
+) -> List[int]:
+    """
+    :param route_dict:
+    :param remove_number:
+    :param param:
+    :param rng:
+    :return: customers to remove
+    """
+    customers = _get_customers(route_dict, param)
+    return rng.sample(customers, min(remove_number, len(customers)))
+
+
+def related_removal(
+        route_dict: Dict[Tuple, SeqInfo],
+        remove_number: int,
+        param: Param,
+        rng: random.Random,
+        determinism: float = 6.
+) -> List[int]:
+    """
+    Shaw removal, customers close in distance and time window
+    to one already removed are removed
+    :param route_dict:
+    :param remove_number:
+    :param param:
+    :param rng:
+    :param determinism: larger for less randomness
+    :return: customers to remove
+    """
+    ds, _, node, *_ = param
+    customers = _get_customers(route_dict, param)
+    remove_number = min(remove_number, len(customers))
+    if remove_number == 0:
+        return []
+    max_ds = max(1, ds.max().item())
+    removed = [customers.pop(rng.randrange(len(customers)))]
+    while len(removed) < remove_number:
+        r = rng.choice(removed)
+        customers.sort(key=lambda x: (
+            ds.item(r, x) / max_ds +
+            abs(node.first.item(r) - node.first.item(x)) / END_TIME +
+            abs(node.last.item(r) - node.last.item(x)) / END_TIME
+        ))
+        removed.append(customers.pop(
+            int(rng.random() ** determinism * len(customers))
+        ))
+    return removed
+
+
+def worst_removal(
+        route_dict: Dict[Tuple, SeqInfo],
+        remove_number: int,
+        param: Param,
+        rng: random.Random,
+        determinism: float = 3.
+) -> List[int]:
+    """
+    customers whose removal saves the most cost are removed
+    :param route_dict:
+    :param remove_number:
+    :param param:
+    :param rng:
+    :param determinism: larger for less randomness
+    :return: customers to remove
+    """
+    _, _, node, *_ = param
+    saving_list = []
+    for seq, info in route_dict.items():
+        if info is None:
+            continue
+        prefix = generate_prefix_segments(seq, param)
+        suffix = generate_suffix_segments(seq, param)
+        for i, x in enumerate(seq):
+            if node.type.item(x) == CHARGE:
+                continue
+            new_eval = evaluate_segment(
+                concat_segment(prefix[i], suffix[i + 1], param), param
+            )
+            # the whole route is saved if it is left empty
+            saving_list.append(
+                (info.cost - (0 if new_eval is None else new_eval[1]), x)
+            )
+    saving_list.sort(reverse=True)
+    removed = []
+    while saving_list and len(removed) < remove_number:
+        removed.append(saving_list.pop(
+            int(rng.random() ** determinism * len(saving_list))
+        )[1])
+    return removed
+
+
+def route_removal(
+        route_dict: Dict[Tuple, SeqInfo],
+        remove_number: int,
+        param: Param,
+        rng: random.Random
+) -> List[int]:
+    """
+    whole routes are removed, the smallest first with some randomness,
+    until remove_number customers are removed
+    :param route_dict:
+    :param remove_number:
+    :param param:
+    :param rng:
+    :return: customers to remove
+    """
+    _, _, node, *_ = param
+    seqs = sorted(route_dict, key=lambda x: (len(x) * rng.random(), x))
+    removed = []
+    for seq in seqs:
+        if len(removed) >= remove_number:
+            break
+        removed.extend(x for x in seq if node.type.item(x) != CHARGE)
+    return removed
+
+
+DESTROY_OPERATORS = {
+    "random": random_removal,
+    "related": related_removal,
+    "worst": worst_removal,
+    "route": route_removal,
+}
+
+
+def remove_customers(
+        route_dict: Dict[Tuple, SeqInfo],
+        customers: List[int],
+        param: Param
+) -> (Dict[Tuple, SeqInfo], Set[Tuple]):
+    """
+    remove customers from their routes, charging stations that are
+    no longer needed are removed too
+    :param route_dict:
+    :param customers:
+    :param param:
+    :return: partial solution and removed seqs [(customer,), ...]
+    """
+    _, _, node, *_ = param
+    customers = set(customers)
+    partial_route_dict = dict()
+    removed = {(x,) for x in customers}
+    for seq, info in route_dict.items():
+        if customers.isdisjoint(seq):
+            partial_route_dict[seq] = info
+            continue
+        new_seq = tuple(x for x in seq if x not in customers)
+        no_charge_seq = tuple(
+            x for x in new_seq if node.type.item(x) != CHARGE
+        )
+        if not no_charge_seq:
+            continue
+        new_info = generate_seq_info(no_charge_seq, param)
+        if new_info is not None:
+            partial_route_dict[no_charge_seq] = new_info
+            continue
+        new_info = generate_seq_info(new_seq, param)
+        if new_info is not None:
+            partial_route_dict[new_seq] = new_info
+        else:
+            removed.update((x,) for x in no_charge_seq)
+    return partial_route_dict, removed
+
+
+def regret_repair(
+        route_dict: Dict[Tuple, SeqInfo],
+        removed: Set[Tuple],
+        param: Param,
+        node_id_c: Set,
+        regret_k: int = 2,
+        granular_neighbors: List[Set[int]] = None
+) -> Dict[Tuple, SeqInfo]:
+    """
+    regret-k insertion into the partial solution
+    :param route_dict:
+    :param removed:
+    :param param:
+    :param node_id_c:
+    :param regret_k:
+    :param granular_neighbors:
+    :return:
+    """
+    return greedy_insertion_construct(
+        removed, route_dict, param, node_id_c, regret_k=regret_k,
+        granular_k=0, granular_neighbors=granular_neighbors
+    )
+
+
+def saving_repair(
+        route_dict: Dict[Tuple, SeqInfo],
+        removed: Set[Tuple],
+        param: Param,
+        node_id_c: Set,
+        granular_neighbors: List[Set[int]] = None
+) -> Dict[Tuple, SeqInfo]:
+    """
+    new routes for the removed customers by the savings construction
+    :param route_dict:
+    :param removed:
+    :param param:
+    :param node_id_c:
+    :param granular_neighbors: not used
+    :return:
+    """
+    init_route_dict = {
+        seq: generate_seq_info(seq, param, vehicle_type=2) for seq in removed
+    }
+    candidate_seqs = {k for k, v in init_route_dict.items() if v is not None}
+    new_route_dict = dict(route_dict)
+    new_route_dict.update(
+        (k, generate_seq_info(k, param))
+        for k, v in init_route_dict.items() if v is None
+    )
+    new_route_dict.update(heap_saving_value_construct(
+        candidate_seqs, init_route_dict, param, node_id_c
+    ))
+    return new_route_dict
+
+
+REPAIR_OPERATORS = {
+    "greedy": lambda *args, **kwargs: regret_repair(
+        *args, regret_k=1, **kwargs
+    ),
+    "regret_2": lambda *args, **kwargs: regret_repair(
+        *args, regret_k=2, **kwargs
+    ),
+    "regret_3": lambda *args, **kwargs: regret_repair(
+        *args, regret_k=3, **kwargs
+    ),
+    "saving": saving_repair,
+}
+
+
+def _calculate_cost(route_dict: Dict[Tuple, SeqInfo]) -> float:
+    return sum(M if v is None else v.cost for v in route_dict.values())
+
+
+def _roulette(weights: Dict[str, float], rng: random.Random) -> str:
+    x = rng.random() * sum(weights.values())
+    for name, weight in weights.items():
+        x -= weight
+        if x < 0:
+            return name
+    return name
+
+
+def adaptive_large_neighborhood_search(
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        time_limit: float = 60.,
+        max_iter: int = None,
+        destroy_operators: Tuple[str, ...] = tuple(DESTROY_OPERATORS),
+        repair_operators: Tuple[str, ...] = tuple(REPAIR_OPERATORS),
+        remove_range: Tuple[float, float] = (0.05, 0.2),
+        max_remove_number: int = 60,
+        scores: Tuple[float, float, float] = (33., 9., 13.),
+        reaction: float = 0.1,
+        segment_length: int = 100,
+        start_worse: float = 0.05,
+        end_worse: float = 0.001,
+        granular_k: int = 30,
+        seed: int = None
+) -> Dict[Tuple, SeqInfo]:
+    """
+    adaptive large neighborhood search (Ropke and Pisinger):
+        1. destroy: remove q customers, q is drawn from remove_range
+           (fractions of the customers) and at most max_remove_number
+        2. repair: put them back
+        3. accept by simulated annealing, the temperature falls
+           geometrically from start to end over the time limit
+        4. the operators get scores[0] for a new best solution,
+           scores[1] for a better one and scores[2] for an accepted
+           worse one, weights are updated every segment_length iterations
+    :param route_dict: start solution, routes whose info is None
+        are returned unchanged
+    :param param:
+    :param node_id_c:
+    :param time_limit: seconds
+    :param max_iter: iteration limit, for reproducible runs
+    :param destroy_operators: see DESTROY_OPERATORS
+    :param repair_operators: see REPAIR_OPERATORS
+    :param remove_range:
+    :param max_remove_number:
+    :param scores:
+    :param reaction: weight of the last segment in the operator weights
+    :param segment_length:
+    :param start_worse: a solution this much worse (fraction of the
+        start cost) is accepted with probability 0.5 at the start
+    :param end_worse: the same at the end
+    :param granular_k: neighbors for regret insertion
+    :param seed:
+    :return: best solution
+    """
+    for name in destroy_operators:
+        if name not in DESTROY_OPERATORS:
+            raise ValueError("unknown destroy operator: " + str(name))
+    for name in repair_operators:
+        if name not in REPAIR_OPERATORS:
+            raise ValueError("unknown repair operator: " + str(name))
+    rng = random.Random(seed)
+    granular_neighbors = get_granular_neighbors(param, granular_k) \
+        if granular_k > 0 else None
+
+    # routes that are not available are kept as they are
+    unavailable_dict = {k: v for k, v in route_dict.items() if v is None}
+    current = {k: v for k, v in route_dict.items() if v is not None}
+    current_cost = _calculate_cost(current)
+    best, best_cost = current, current_cost
+    customer_number = len(_get_customers(current, param))
+    min_remove = max(1, int(remove_range[0] * customer_number))
+    max_remove = max(min_remove, min(
+        max_remove_number, int(remove_range[1] * customer_number)
+    ))
+
+    start_temperature = start_worse * current_cost / math.log(2)
+    end_temperature = end_worse * current_cost / math.log(2)
+    weights = {
+        "destroy": {name: 1. for name in destroy_operators},
+        "repair": {name: 1. for name in repair_operators}
+    }
+    segment_score = {k: dict.fromkeys(v, 0.) for k, v in weights.items()}
+    segment_count = {k: dict.fromkeys(v, 0) for k, v in weights.items()}
+
+    start_time = time.perf_counter()
+    iteration = 0
+    while max_iter is None or iteration < max_iter:
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= time_limit:
+            break
+        temperature = start_temperature * (
+            end_temperature / start_temperature
+        ) ** (elapsed / time_limit) if start_temperature > 0 else 0
+
+        destroy = _roulette(weights["destroy"], rng)
+        repair = _roulette(weights["repair"], rng)
+        customers = DESTROY_OPERATORS[destroy](
+            current, rng.randint(min_remove, max_remove), param, rng
+        )
+        partial, removed = remove_customers(current, customers, param)
+        new = REPAIR_OPERATORS[repair](
+            partial, removed, param, node_id_c,
+            granular_neighbors=granular_neighbors
+        )
+        new_cost = _calculate_cost(new)
+
+        score = 0.
+        if new_cost < best_cost - 1e-6:
+            best, best_cost = new, new_cost
+            score = scores[0]
+        if new_cost < current_cost - 1e-6:
+            score = score or scores[1]
+            current, current_cost = new, new_cost
+        elif temperature > 0 and rng.random() < math.exp(
+                (current_cost - new_cost) / temperature
+        ):
+            score = score or scores[2]
+            current, current_cost = new, new_cost
+        for kind, name in (("destroy", destroy), ("repair", repair)):
+            segment_score[kind][name] += score
+            segment_count[kind][name] += 1
+
+        iteration += 1
+        if iteration % segment_length == 0:
+            for kind in weights:
+                for name in weights[kind]:
+                    if segment_count[kind][name]:
+                        weights[kind][name] = \
+                            weights[kind][name] * (1 - reaction) + \
+                            reaction * segment_score[kind][name] / \
+                            segment_count[kind][name]
+                    segment_score[kind][name] = 0.
+                    segment_count[kind][name] = 0
+                    weights[kind][name] = max(weights[kind][name], 1e-3)
+    best = dict(best)
+    best.update(unavailable_dict)
+    return best
@@ -0,0 +1,363 @@
+"""
+hybrid genetic search
+
+individuals are giant tours over all customers, decoded into routes by
+split_tour and educated by variable_neighborhood_descent, offspring come
+from order crossover of two parents chosen by binary tournament on the
+biased fitness (cost rank and diversity rank, diversity by broken pairs
+distance), and the population is cut back to its minimum size when it
+grows over the maximum.
+"""
+from vrp.common.model import SeqInfo, Param
+from vrp.io.shared import SharedParam, attach_shared
+from vrp.common.constant import *
+from vrp.util.info import generate_seq_info
+from vrp.construction.split import generate_giant_tour, split_tour
+from vrp.improvement.vnd import variable_neighborhood_descent, VND_OPERATORS
+
+import math
+import time
+import random
+from collections import namedtuple
+from multiprocessing import Pool
+from typing import Dict, Tuple, Set, List
+
+Individual = namedtuple("Individual", ["tour", "route_dict", "cost"])
+
+
+def order_crossover(
+        tour1: List[int],
+        tour2: List[int],
+        rng: random.Random
+) -> List[int]:
+    """
+    OX: a random slice of tour1 is kept in place, the other positions
+    are filled with the rest of the nodes in the order of tour2,
+    starting after the slice
+    :param tour1:
+    :param tour2:
+    :param rng:
+    :return:
+    """
+    n = len(tour1)
+    if n < 2:
+        return list(tour1)
+    i, j = sorted(rng.sample(range(n + 1), 2))
+    kept = set(tour1[i:j])
+    rest = [x for x in tour2[j:] + tour2[:j] if x not in kept]
+    child = [None] * n
+    child[i:j] = tour1[i:j]
+    for k, x in zip(list(range(j, n)) + list(range(i)), rest):
+        child[k] = x
+    return child
+
+
+def get_route_tour(
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param
+) -> List[int]:
+    """
+    giant tour of a solution, routes are sorted by the polar angle
+    of their centroid around the depot, charging stations are left out
+    :param route_dict:
+    :param param:
+    :return:
+    """
+    _, _, node, *_ = param
+    lng0, lat0 = node.lng.item(0), node.lat.item(0)
+
+    def angle(seq):
+        return math.atan2(
+            node.lat[list(seq)].mean() - lat0,
+            node.lng[list(seq)].mean() - lng0
+        )
+    return [
+        x for seq in sorted(route_dict, key=lambda x: (angle(x), x))
+        for x in seq if node.type.item(x) != CHARGE
+    ]
+
+
+def get_broken_pairs_distance(
+        route_dict1: Dict[Tuple, SeqInfo],
+        route_dict2: Dict[Tuple, SeqInfo],
+        param: Param
+) -> float:
+    """
+    fraction of customers whose successor in route_dict1 is neither its
+    successor nor its predecessor in route_dict2 (the depot is 0),
+    charging stations are skipped
+    :param route_dict1:
+    :param route_dict2:
+    :param param:
+    :return: in [0, 1]
+    """
+    _, _, node, *_ = param
+
+    def neighbors(route_dict):
+        successor, predecessor = dict(), dict()
+        for seq in route_dict:
+            customers = [x for x in seq if node.type.item(x) != CHARGE]
+            for a, b in zip([0] + customers, customers + [0]):
+                if a:
+                    successor[a] = b
+                if b:
+                    predecessor[b] = a
+        return successor, predecessor
+
+    successor1, _ = neighbors(route_dict1)
+    successor2, predecessor2 = neighbors(route_dict2)
+    if not successor1:
+        return 0.
+    broken = sum(
+        1 for x, y in successor1.items()
+        if y != successor2.get(x) and y != predecessor2.get(x)
+    )
+    return broken / len(successor1)
+
+
+# shared by the worker processes of hybrid_genetic_search
+_pool_data = None
+
+
+def _init_pool(*data):
+    global _pool_data
+    _pool_data = attach_shared(data)
+
+
+def _educate(tour: List[int]) -> Individual:
+    return educate(tour, *_pool_data)
+
+
+def educate(
+        tour: List[int],
+        param: Param,
+        node_id_c: Set,
+        operators: Tuple[str, ...] = VND_OPERATORS,
+        neighborhood_number: int = 5,
+        candidate_k: int = 10
+) -> Individual:
+    """
+    decode tour by split_tour and improve it by
+    variable_neighborhood_descent
+    :param tour:
+    :param param:
+    :param node_id_c:
+    :param operators:
+    :param neighborhood_number:
+    :param candidate_k:
+    :return: individual with the tour of the educated routes
+    """
+    route_dict = {
+        seq: generate_seq_info(seq, param)
+        for seq in split_tour(tour, param, node_id_c)
+    }
+    route_dict = variable_neighborhood_descent(
+        route_dict, param, node_id_c, operators=operators,
+        neighborhood_number=neighborhood_number, candidate_k=candidate_k
+    )
+    return Individual(
+        get_route_tour(route_dict, param), route_dict,
+        sum(M if v is None else v.cost for v in route_dict.values())
+    )
+
+
+def _get_distance_matrix(
+        population: List[Individual],
+        param: Param
+) -> List[List[float]]:
+    size = len(population)
+    distance = [[0.] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            distance[i][j] = distance[j][i] = get_broken_pairs_distance(
+                population[i].route_dict, population[j].route_dict, param
+            )
+    return distance
+
+
+def _get_biased_fitness(
+        population: List[Individual],
+        distance: List[List[float]],
+        elite_number: int,
+        close_number: int
+) -> List[float]:
+    """
+    biased fitness, smaller is better:
+        cost rank + (1 - elite_number / size) * diversity rank,
+        diversity is the mean broken pairs distance to the
+        close_number closest individuals
+    """
+    size = len(population)
+    if size <= 1:
+        return [0.] * size
+    diversity = []
+    for i in range(size):
+        close = sorted(distance[i][j] for j in range(size) if j != i)
+        close = close[:close_number]
+        diversity.append(sum(close) / len(close))
+    cost_rank = {
+        i: r for r, i in enumerate(
+            sorted(range(size), key=lambda x: population[x].cost)
+        )
+    }
+    diversity_rank = {
+        i: r for r, i in enumerate(
+            sorted(range(size), key=lambda x: -diversity[x])
+        )
+    }
+    weight = 1 - min(elite_number, size) / size
+    return [
+        (cost_rank[i] + weight * diversity_rank[i]) / (size - 1)
+        for i in range(size)
+    ]
+
+
+def _select_survivors(
+        population: List[Individual],
+        param: Param,
+        min_population: int,
+        elite_number: int,
+        close_number: int
+) -> List[Individual]:
+    """
+    clones first, then the worst biased fitness are removed
+    one at a time until min_population are left
+    """
+    population = list(population)
+    distance = _get_distance_matrix(population, param)
+    while len(population) > min_population:
+        seen, worst = set(), None
+        for i, x in enumerate(population):
+            key = frozenset(x.route_dict)
+            if key in seen:
+                worst = i  # a clone
+                break
+            seen.add(key)
+        if worst is None:
+            fitness = _get_biased_fitness(
+                population, distance, elite_number, close_number
+            )
+            worst = max(range(len(population)), key=fitness.__getitem__)
+        population.pop(worst)
+        distance.pop(worst)
+        for row in distance:
+            row.pop(worst)
+    return population
+
+
+def hybrid_genetic_search(
+        candidate_seqs: Set,
+        param: Param,
+        node_id_c: Set,
+        time_limit: float = 60.,
+        max_iter: int = None,
+        seed: int = None,
+        min_population: int = 10,
+        generation_size: int = 20,
+        elite_number: int = 4,
+        close_number: int = 3,
+        operators: Tuple[str, ...] = VND_OPERATORS,
+        neighborhood_number: int = 5,
+        candidate_k: int = 10,
+        batch_size: int = 4,
+        processes: int = 1
+) -> Dict[Tuple, SeqInfo]:
+    """
+    hybrid genetic search (Vidal et al.) with giant tour chromosomes:
+        1. the initial population is the nearest neighbor and time window
+           tours and random tours, all educated
+        2. a batch of offspring is made by order crossover of parents
+           chosen by binary tournament, they are educated (in parallel
+           with processes > 1) and added to the population
+        3. when the population is over min_population + generation_size,
+           survivors are selected by biased fitness
+    the offspring of a batch are made in the main process and educated
+    in order, so a run with a seed and max_iter gives the same result
+    for any number of processes
+    :param candidate_seqs: customers [(x,), ...]
+    :param param:
+    :param node_id_c:
+    :param time_limit: seconds
+    :param max_iter: number of offspring, for reproducible runs
+    :param seed:
+    :param min_population:
+    :param generation_size:
+    :param elite_number: the best individuals that are kept by
+        the biased fitness whatever their diversity
+    :param close_number: individuals for the diversity
+    :param operators: education, see VND_OPERATORS
+    :param neighborhood_number: education, see variable_neighborhood_descent
+    :param candidate_k: education, see variable_neighborhood_descent
+    :param batch_size: offspring made from the same population
+    :param processes: worker processes to educate the offspring
+    :return: routes of the best individual, validated by generate_seq_info
+    """
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+    customers = sorted(x for seq in candidate_seqs for x in seq)
+    education_data = (
+        param, node_id_c, operators, neighborhood_number, candidate_k
+    )
+    shared_param = SharedParam(param) if processes > 1 else None
+    pool = Pool(
+        processes, initializer=_init_pool,
+        initargs=(shared_param, *education_data[1:])
+    ) if processes > 1 else None
+
+    def educate_all(tours):
+        if pool is None:
+            return [educate(x, *education_data) for x in tours]
+        return list(pool.imap(_educate, tours))
+
+    def tournament(fitness):
+        i, j = rng.randrange(len(fitness)), rng.randrange(len(fitness))
+        return i if fitness[i] <= fitness[j] else j
+
+    try:
+        tours = [
+            generate_giant_tour(customers, param, method="nearest"),
+            generate_giant_tour(customers, param, method="time")
+        ]
+        while len(tours) < min_population:
+            tours.append(rng.sample(customers, len(customers)))
+        population = educate_all(tours)
+        best = min(population, key=lambda x: x.cost)
+
+        iteration = 0
+        while max_iter is None or iteration < max_iter:
+            if time.perf_counter() - start_time >= time_limit:
+                break
+            fitness = _get_biased_fitness(
+                population, _get_distance_matrix(population, param),
+                elite_number, close_number
+            )
+            batch_number = batch_size if max_iter is None else \
+                min(batch_size, max_iter - iteration)
+            tours = []
+            for _ in range(batch_number):
+                parent1 = population[tournament(fitness)]
+                parent2 = population[tournament(fitness)]
+                tours.append(order_crossover(parent1.tour, parent2.tour, rng))
+            offspring = educate_all(tours)
+            iteration += len(offspring)
+
+            population.extend(offspring)
+            best = min([best] + offspring, key=lambda x: x.cost)
+            if len(population) >= min_population + generation_size:
+                population = _select_survivors(
+                    population, param, min_population,
+                    elite_number, close_number
+                )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+            shared_param.unlink()
+
+    route_dict = {
+        seq: generate_seq_info(seq, param) for seq in best.route_dict
+    }
+    for seq, info in route_dict.items():
+        if info is None and len(seq) > 1:
+            raise ValueError("route is not available: " + str(seq))
+    return route_dict
@@ -1,10 +1,65 @@
 from vrp.common.model import SeqInfo, Param
-from vrp.common.constant import M
-from vrp.util.info import generate_seq_info
-from vrp.util.insertion import insertion
+from vrp.common.constant import M, CHARGE
+from vrp.util.info import generate_seq_info, add_to_route_pool
+from vrp.util.insertion import efficient_insertion, price_insertion
+from vrp.util.compat import check_compat
+from vrp.util.segment import single_segment, concat_segment, \
+    concat_segments, evaluate_segment, generate_segment, \
+    generate_prefix_segments, generate_suffix_segments
 
 import random
-from typing import Tuple, Set
+from typing import Tuple, Set, List
+
+# a route left without customers, its vehicle is saved
+_EMPTY_ROUTE = (), SeqInfo(0, 0, 0, 0, [], [], 0, 0, 0, [], 0)
+
+
+def _is_empty(seq: Tuple, param: Param) -> bool:
+    return all(param.node.type.item(x) == CHARGE for x in seq)
+
+
+def _evaluate_route(seq: Tuple, segs: List, param: Param) -> (int, float):
+    """
+    evaluate seq from the segments it is made of, a route without
+    customers costs 0, the others are added to the route pool
+    :param seq:
+    :param segs: segments whose concatenation is seq
+    :param param:
+    :return: vehicle type and cost, or None if it is not available
+    """
+    if _is_empty(seq, param):
+        return 0, 0
+    new_eval = evaluate_segment(concat_segments(*segs, param=param), param)
+    add_to_route_pool(seq, param, new_eval)
+    return new_eval
+
+
+def _generate_route_info(
+        seq: Tuple,
+        param: Param,
+        info: SeqInfo = None
+) -> (Tuple, SeqInfo):
+    """
+    the route returned for seq, its charging stations are removed if it
+    is available and cheaper without them, as in alns.remove_customers,
+    and a route without customers is () with cost 0
+    :param seq:
+    :param param:
+    :param info: of seq, generated if not given
+    :return:
+    """
+    if _is_empty(seq, param):
+        return _EMPTY_ROUTE
+    if info is None:
+        info = generate_seq_info(seq, param)
+    node_type = param.node.type
+    no_charge_seq = tuple(x for x in seq if node_type.item(x) != CHARGE)
+    if len(no_charge_seq) < len(seq):
+        no_charge_info = generate_seq_info(no_charge_seq, param)
+        if no_charge_info is not None and \
+                (info is None or no_charge_info.cost < info.cost):
+            return no_charge_seq, no_charge_info
+    return seq, info
 
 
 def two_opt_star(
@@ -26,6 +81,7 @@ def two_opt_star(
         on the upper route after customer i.
         This is performed by replacing edges (i, i+1) and (j, j+1)
         with edges (i, j+1) and (j, i+1).
+    the charging stations a new route does not need are removed
     :param seq1:
     :param info1:
     :param seq2:
@@ -48,36 +104,47 @@ def two_opt_star(
         if info1 is not None and info2 is not None else M
     have_update = False
     while True:
+        prefix1 = generate_prefix_segments(tmp_seq1, param)
+        suffix1 = generate_suffix_segments(tmp_seq1, param)
+        prefix2 = generate_prefix_segments(tmp_seq2, param)
+        suffix2 = generate_suffix_segments(tmp_seq2, param)
         for i in range(1, len(tmp_seq1) - 1):
             for j in range(1, len(tmp_seq2) - 1):
 
                 new_seq1 = tmp_seq1[:i] + tmp_seq2[j:]
-                try:
-                    new_info1 = generate_seq_info(new_seq1, param)
-                except KeyError:
-                    continue
-
                 new_seq2 = tmp_seq2[:j] + tmp_seq1[i:]
-                try:
-                    new_info2 = generate_seq_info(new_seq2, param)
-                except KeyError:
-                    continue
+                if check_compat(new_seq1, (i,), param) and \
+                        check_compat(new_seq2, (j,), param):
+                    new_eval1 = evaluate_segment(
+                        concat_segment(prefix1[i], suffix2[j], param), param
+                    )
+                    new_eval2 = evaluate_segment(
+                        concat_segment(prefix2[j], suffix1[i], param), param
+                    )
+                    add_to_route_pool(new_seq1, param, new_eval1)
+                    add_to_route_pool(new_seq2, param, new_eval2)
+                else:
+                    new_eval1 = new_eval2 = None
 
-                if new_info1 is None or new_info2 is None:
+                if new_eval1 is None or new_eval2 is None:
                     if infeasible and random.random() < probability:
-                        return (new_seq1, new_info1), (new_seq2, new_info2)
+                        return (new_seq1, None), (new_seq2, None)
                     continue
-                if new_info1.cost + new_info2.cost < tmp_cost:
+                if new_eval1[1] + new_eval2[1] < tmp_cost:
                     if best_accept:
-                        tmp_seq1, tmp_info1 = new_seq1, new_info1
-                        tmp_seq2, tmp_info2 = new_seq2, new_info2
-                        tmp_cost = new_info1.cost + new_info2.cost
+                        tmp_seq1 = new_seq1
+                        tmp_info1 = generate_seq_info(new_seq1, param)
+                        tmp_seq2 = new_seq2
+                        tmp_info2 = generate_seq_info(new_seq2, param)
+                        tmp_cost = tmp_info1.cost + tmp_info2.cost
                         have_update = True
                         break
                     if better_accept:
-                        return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
+                        return _generate_route_info(new_seq1, param), \
+                            _generate_route_info(new_seq2, param)
                 if probability and random.random() < probability:
-                    return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
+                    return _generate_route_info(new_seq1, param), \
+                        _generate_route_info(new_seq2, param)
             if have_update:
                 break
         if not have_update:
@@ -88,7 +155,8 @@ def two_opt_star(
             return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
         return (None, None), (None, None)
     else:
-        return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
+        return _generate_route_info(tmp_seq1, param, tmp_info1), \
+            _generate_route_info(tmp_seq2, param, tmp_info2)
 
 
 def relocate(
@@ -108,6 +176,8 @@ def relocate(
         The edges (i−1, i), (i, i+1), and (j, j+1) are replaced
         by (i−1, i+1), (j, i), and (i, j+1), i.e.,
         customer i from the origin route is placed into the destination route.
+    charging stations are not moved, an origin route left without customers
+    costs 0 and is returned as ()
     :param seq1:
     :param info1:
     :param seq2:
@@ -130,29 +200,41 @@ def relocate(
     tmp_info1 = None
     tmp_info2 = None
     for seq_1, seq_2 in [[seq1, seq2], [seq2, seq1]]:
-        for i in range(len(seq1)):
+        prefix = generate_prefix_segments(seq_1, param)
+        suffix = generate_suffix_segments(seq_1, param)
+        for i in range(len(seq_1)):
             node = seq_1[i:i + 1]
-            new_seq1, new_info1 = generate_seq_info(
-                seq_1[:i] + seq_1[i + 1:], param
-            )
+            if node in node_id_c:
+                continue
+            new_seq1 = seq_1[:i] + seq_1[i + 1:]
+            new_eval1 = _evaluate_route(
+                new_seq1, [prefix[i], suffix[i + 1]], param
+            ) if check_compat(new_seq1, (i,), param) else None
 
-            new_seq2, new_info2 = insertion(
-                node, seq_2, param, node_id_c, best_accept=True
+            new_seq2, new_info2 = efficient_insertion(
+                node, seq_2, None, param, node_id_c, best_accept=True
             )
 
-            if new_info1 is None or new_info2 is None:
+            if new_eval1 is None or new_info2 is None:
                 if infeasible and random.random() < probability:
-                    return (new_seq1, new_info1), (new_seq2, new_info2)
+                    return (new_seq1, None), (new_seq2, new_info2)
                 continue
             else:
-                if new_info1.cost + new_info2.cost < tmp_cost:
+                if new_eval1[1] + new_info2.cost < tmp_cost:
                     if best_accept:
-                        tmp_seq1, tmp_info1 = new_seq1, new_info1
-                        tmp_seq2, tmp_info2 = new_seq2, new_info2
+                        tmp_seq1, tmp_info1 = _generate_route_info(
+                            new_seq1, param
+                        )
+                        tmp_seq2, tmp_info2 = _generate_route_info(
+                            new_seq2, param, new_info2
+                        )
+                        tmp_cost = tmp_info1.cost + tmp_info2.cost
                     if better_accept:
-                        return (new_seq1, new_info1), (new_seq2, new_info2)
+                        return _generate_route_info(new_seq1, param), \
+                            _generate_route_info(new_seq2, param, new_info2)
                 if probability and random.random() < probability:
-                    return (new_seq1, new_info1), (new_seq2, new_info2)
+                    return _generate_route_info(new_seq1, param), \
+                        _generate_route_info(new_seq2, param, new_info2)
     if tmp_seq1 is None or tmp_seq2 is None:
         if infeasible and random.random() < probability:
             return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
@@ -179,6 +261,8 @@ def cross_exchange(
         This is performed by replacing edges (i-1, i), (k, k+1), (j−1, j),
         and (l, l+1) by edges (i−1, j), (l, k+1), (j−1, i),and (k, l+1).
         Note that the orientation of both routes is preserved.
+    a segment does not start or end at a charging station, a route left
+    without customers costs 0 and is returned as ()
     :param seq1:
     :param info1:
     :param seq2:
@@ -197,30 +281,337 @@ def cross_exchange(
     tmp_info2 = None
     better_accept = False if best_accept else better_accept
     probability = 0 if better_accept or best_accept else probability
+    infeasible = False if better_accept or best_accept else infeasible
+    prefix1 = generate_prefix_segments(seq1, param)
+    suffix1 = generate_suffix_segments(seq1, param)
+    prefix2 = generate_prefix_segments(seq2, param)
+    suffix2 = generate_suffix_segments(seq2, param)
+    node_type = param.node.type
+    is_charge1 = [node_type.item(x) == CHARGE for x in seq1]
+    is_charge2 = [node_type.item(x) == CHARGE for x in seq2]
     for i in range(len(seq1)):
+        middle1 = None  # segment of seq1[i:k]
         for k in range(i, len(seq1)):
+            if k > i:
+                middle1 = concat_segment(
+                    middle1, single_segment(seq1[k - 1], param), param
+                )
+                if is_charge1[i] or is_charge1[k - 1]:
+                    continue
             for j in range(len(seq2)):
+                middle2 = None  # segment of seq2[j:l]
                 for l in range(j, len(seq2)):
+                    if l > j:
+                        middle2 = concat_segment(
+                            middle2, single_segment(seq2[l - 1], param), param
+                        )
+                        if is_charge2[j] or is_charge2[l - 1]:
+                            continue
                     new_seq1 = seq1[:i] + seq2[j:l] + seq1[k:]
                     new_seq2 = seq2[:j] + seq1[i:k] + seq2[l:]
-                    new_info1 = generate_seq_info(new_seq1, param)
-                    new_info2 = generate_seq_info(new_seq2, param)
-                    if new_info1 is None or new_info2 is None:
+                    if check_compat(new_seq1, (i, i + l - j), param) and \
+                            check_compat(new_seq2, (j, j + k - i), param):
+                        new_eval1 = _evaluate_route(
+                            new_seq1, [prefix1[i], middle2, suffix1[k]], param
+                        )
+                        new_eval2 = _evaluate_route(
+                            new_seq2, [prefix2[j], middle1, suffix2[l]], param
+                        )
+                    else:
+                        new_eval1 = new_eval2 = None
+                    if new_eval1 is None or new_eval2 is None:
                         if infeasible and random.random() < probability:
-                            return (new_seq1, new_info1), (new_seq2, new_info2)
+                            return (new_seq1, None), (new_seq2, None)
                         continue
                     else:
-                        if new_info1.cost + new_info2.cost < tmp_cost:
+                        if new_eval1[1] + new_eval2[1] < tmp_cost:
                             if best_accept:
-                                tmp_seq1, tmp_info1 = new_seq1, new_info1
-                                tmp_seq2, tmp_info2 = new_seq2, new_info2
+                                tmp_seq1, tmp_seq2 = new_seq1, new_seq2
+                                tmp_cost = new_eval1[1] + new_eval2[1]
                             if better_accept:
-                                return (new_seq1, new_info1), \
-                                       (new_seq2, new_info2)
+                                return _generate_route_info(
+                                    new_seq1, param
+                                ), _generate_route_info(new_seq2, param)
                         if probability and random.random() < probability:
-                            return (new_seq1, new_info1), (new_seq2, new_info2)
+                            return _generate_route_info(
+                                new_seq1, param
+                            ), _generate_route_info(new_seq2, param)
+    if tmp_seq1 is not None:
+        tmp_seq1, tmp_info1 = _generate_route_info(tmp_seq1, param)
+        tmp_seq2, tmp_info2 = _generate_route_info(tmp_seq2, param)
     if tmp_seq1 is None or tmp_seq2 is None:
         if infeasible and random.random() < probability:
             return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
         return (None, None), (None, None)
     return (tmp_seq1, tmp_info1), (tmp_seq2, tmp_info2)
+
+
+def _get_position_dict(seq: Tuple) -> dict:
+    return {x: i for i, x in enumerate(seq)}
+
+
+def _get_candidate_cuts(
+        seq1: Tuple,
+        seq2: Tuple,
+        candidate_lists: List[Set[int]],
+        range1: range,
+        range2: range
+) -> List[Tuple[int, int]]:
+    """
+    cuts (i, j) with i in range1 and j in range2 such that
+    (seq1[i - 1], seq2[j]) or (seq2[j - 1], seq1[i]) is a candidate arc
+    :param seq1:
+    :param seq2:
+    :param candidate_lists: see get_candidate_lists
+    :param range1:
+    :param range2:
+    :return: sorted
+    """
+    position1, position2 = _get_position_dict(seq1), _get_position_dict(seq2)
+    cuts = set()
+    for seq_a, range_a, position_b, range_b, swap in [
+        (seq1, range1, position2, range2, False),
+        (seq2, range2, position1, range1, True)
+    ]:
+        for a in range_a:
+            if a < 1 or a > len(seq_a):
+                continue
+            for x in candidate_lists[seq_a[a - 1]]:
+                b = position_b.get(x)
+                if b is not None and b in range_b:
+                    cuts.add((b, a) if swap else (a, b))
+    return sorted(cuts)
+
+
+def granular_two_opt_star(
+        seq1: Tuple,
+        info1: SeqInfo,
+        seq2: Tuple,
+        info2: SeqInfo,
+        param: Param,
+        candidate_lists: List[Set[int]],
+        best_accept: bool = True
+) -> ((Tuple, SeqInfo), (Tuple, SeqInfo)):
+    """
+    two_opt_star, only the cuts that create a candidate arc
+    (seq1[i - 1], seq2[j]) or (seq2[j - 1], seq1[i]) are tried.
+    with best_accept the best cut is applied until no cut is better,
+    otherwise the first better cut is returned.
+    the charging stations a new route does not need are removed
+    :param seq1:
+    :param info1:
+    :param seq2:
+    :param info2:
+    :param param:
+    :param candidate_lists: see get_candidate_lists
+    :param best_accept:
+    :return: new routes, or (None, None), (None, None) if none is better
+    """
+    tmp_seq1, tmp_seq2 = seq1, seq2
+    tmp_cost = info1.cost + info2.cost
+    have_update = False
+    while True:
+        prefix1 = generate_prefix_segments(tmp_seq1, param)
+        suffix1 = generate_suffix_segments(tmp_seq1, param)
+        prefix2 = generate_prefix_segments(tmp_seq2, param)
+        suffix2 = generate_suffix_segments(tmp_seq2, param)
+        best = None
+        for i, j in _get_candidate_cuts(
+                tmp_seq1, tmp_seq2, candidate_lists,
+                range(1, len(tmp_seq1) - 1), range(1, len(tmp_seq2) - 1)
+        ):
+            new_seq1 = tmp_seq1[:i] + tmp_seq2[j:]
+            new_seq2 = tmp_seq2[:j] + tmp_seq1[i:]
+            if not check_compat(new_seq1, (i,), param) or \
+                    not check_compat(new_seq2, (j,), param):
+                continue
+            new_eval1 = evaluate_segment(
+                concat_segment(prefix1[i], suffix2[j], param), param
+            )
+            if new_eval1 is None:
+                continue
+            add_to_route_pool(new_seq1, param, new_eval1)
+            new_eval2 = evaluate_segment(
+                concat_segment(prefix2[j], suffix1[i], param), param
+            )
+            if new_eval2 is None:
+                continue
+            add_to_route_pool(new_seq2, param, new_eval2)
+            if new_eval1[1] + new_eval2[1] < tmp_cost:
+                tmp_cost = new_eval1[1] + new_eval2[1]
+                best = new_seq1, new_seq2
+                if not best_accept:
+                    break
+        if best is None:
+            break
+        tmp_seq1, tmp_seq2 = best
+        have_update = True
+        if not best_accept:
+            break
+    if not have_update:
+        return (None, None), (None, None)
+    return _generate_route_info(tmp_seq1, param), \
+        _generate_route_info(tmp_seq2, param)
+
+
+def granular_relocate(
+        seq1: Tuple,
+        info1: SeqInfo,
+        seq2: Tuple,
+        info2: SeqInfo,
+        param: Param,
+        node_id_c: Set,
+        candidate_lists: List[Set[int]],
+        best_accept: bool = True
+) -> ((Tuple, SeqInfo), (Tuple, SeqInfo)):
+    """
+    relocate, a node u is only inserted before seq[p] or after seq[p - 1]
+    of the other route if (u, seq[p]) or (seq[p - 1], u) is a candidate arc.
+    charging stations are not moved, a route left without customers
+    costs 0 and is returned as ()
+    :param seq1:
+    :param info1:
+    :param seq2:
+    :param info2:
+    :param param:
+    :param node_id_c:
+    :param candidate_lists: see get_candidate_lists
+    :param best_accept: the best move, otherwise the first better one
+    :return: new routes, or (None, None), (None, None) if none is better
+    """
+    tmp_cost = info1.cost + info2.cost
+    best = None
+    for seq_1, seq_2, swap in [[seq1, seq2, False], [seq2, seq1, True]]:
+        prefix1 = generate_prefix_segments(seq_1, param)
+        suffix1 = generate_suffix_segments(seq_1, param)
+        prefix2 = generate_prefix_segments(seq_2, param)
+        suffix2 = generate_suffix_segments(seq_2, param)
+        position2 = _get_position_dict(seq_2)
+        after = dict()  # node -> positions p with (seq_2[p - 1], node)
+        for p in range(1, len(seq_2) + 1):
+            for x in candidate_lists[seq_2[p - 1]]:
+                after.setdefault(x, []).append(p)
+        for i in range(len(seq_1)):
+            node = seq_1[i:i + 1]
+            if node in node_id_c:
+                continue
+            positions = set(after.get(node[0], ()))
+            positions.update(
+                position2[x] for x in candidate_lists[node[0]]
+                if x in position2
+            )
+            if not positions:
+                continue
+            new_seq1 = seq_1[:i] + seq_1[i + 1:]
+            if not check_compat(new_seq1, (i,), param):
+                continue
+            new_eval1 = _evaluate_route(
+                new_seq1, [prefix1[i], suffix1[i + 1]], param
+            )
+            if new_eval1 is None:
+                continue
+            node_seg = single_segment(node[0], param)
+            for p in sorted(positions):
+                new_eval2 = price_insertion(
+                    node, node_seg, seq_2, prefix2, suffix2, p,
+                    param, node_id_c
+                )
+                if new_eval2 is None or \
+                        new_eval1[1] + new_eval2[2] >= tmp_cost:
+                    continue
+                tmp_cost = new_eval1[1] + new_eval2[2]
+                best = (new_eval2[0], new_seq1) if swap else \
+                    (new_seq1, new_eval2[0])
+                if not best_accept:
+                    break
+            if best is not None and not best_accept:
+                break
+        if best is not None and not best_accept:
+            break
+    if best is None:
+        return (None, None), (None, None)
+    return _generate_route_info(best[0], param), \
+        _generate_route_info(best[1], param)
+
+
+def granular_cross_exchange(
+        seq1: Tuple,
+        info1: SeqInfo,
+        seq2: Tuple,
+        info2: SeqInfo,
+        param: Param,
+        candidate_lists: List[Set[int]],
+        max_segment_len: int = 3,
+        best_accept: bool = True
+) -> ((Tuple, SeqInfo), (Tuple, SeqInfo)):
+    """
+    cross_exchange of seq1[i:k] and seq2[j:l], both at most
+    max_segment_len long, only if one of the new arcs
+    (seq1[i - 1], seq2[j]), (seq2[j - 1], seq1[i]),
+    (seq2[l - 1], seq1[k]) or (seq1[k - 1], seq2[l]) is a candidate arc.
+    a segment does not start or end at a charging station, a route left
+    without customers costs 0 and is returned as ()
+    :param seq1:
+    :param info1:
+    :param seq2:
+    :param info2:
+    :param param:
+    :param candidate_lists: see get_candidate_lists
+    :param max_segment_len:
+    :param best_accept: the best move, otherwise the first better one
+    :return: new routes, or (None, None), (None, None) if none is better
+    """
+    n1, n2, size = len(seq1), len(seq2), max_segment_len
+    moves = set()
+    for i, j in _get_candidate_cuts(
+            seq1, seq2, candidate_lists, range(n1 + 1), range(n2 + 1)
+    ):
+        for k in range(i, min(n1, i + size) + 1):
+            for l in range(j, min(n2, j + size) + 1):
+                moves.add((i, k, j, l))
+    for l, k in _get_candidate_cuts(
+            seq2, seq1, candidate_lists, range(n2 + 1), range(n1 + 1)
+    ):
+        # (seq2[l - 1], seq1[k]) or (seq1[k - 1], seq2[l])
+        for i in range(max(0, k - size), k + 1):
+            for j in range(max(0, l - size), l + 1):
+                moves.add((i, k, j, l))
+
+    prefix1 = generate_prefix_segments(seq1, param)
+    suffix1 = generate_suffix_segments(seq1, param)
+    prefix2 = generate_prefix_segments(seq2, param)
+    suffix2 = generate_suffix_segments(seq2, param)
+    node_type = param.node.type
+    is_charge1 = [node_type.item(x) == CHARGE for x in seq1]
+    is_charge2 = [node_type.item(x) == CHARGE for x in seq2]
+    tmp_cost = info1.cost + info2.cost
+    best = None
+    for i, k, j, l in sorted(moves):
+        if i == k and j == l or \
+                i < k and (is_charge1[i] or is_charge1[k - 1]) or \
+                j < l and (is_charge2[j] or is_charge2[l - 1]):
+            continue
+        new_seq1 = seq1[:i] + seq2[j:l] + seq1[k:]
+        new_seq2 = seq2[:j] + seq1[i:k] + seq2[l:]
+        if not check_compat(new_seq1, (i, i + l - j), param) or \
+                not check_compat(new_seq2, (j, j + k - i), param):
+            continue
+        new_eval1 = _evaluate_route(new_seq1, [
+            prefix1[i], generate_segment(seq2[j:l], param), suffix1[k]
+        ], param)
+        if new_eval1 is None:
+            continue
+        new_eval2 = _evaluate_route(new_seq2, [
+            prefix2[j], generate_segment(seq1[i:k], param), suffix2[l]
+        ], param)
+        if new_eval2 is None:
+            continue
+        if new_eval1[1] + new_eval2[1] < tmp_cost:
+            tmp_cost = new_eval1[1] + new_eval2[1]
+            best = new_seq1, new_seq2
+            if not best_accept:
+                break
+    if best is None:
+        return (None, None), (None, None)
+    return _generate_route_info(best[0], param), \
+        _generate_route_info(best[1], param)
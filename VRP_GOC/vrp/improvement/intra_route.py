@@ -1,7 +1,8 @@
 from vrp.common.model import SeqInfo, Param
 from vrp.common.constant import M
-from vrp.util.info import generate_seq_info
-from vrp.util.insertion import insertion
+from vrp.util.info import generate_seq_info, evaluate_seq_batch
+from vrp.util.insertion import efficient_insertion
+from vrp.util.compat import check_compat
 
 import random
 from typing import Tuple, Set
@@ -36,35 +37,53 @@ def two_opt(
     tmp_seq = seq[:]
     tmp_info = None
     tmp_cost = info.cost if info is not None else M
-    have_update = False
     while True:
+        have_update = False
         for i in range(len(tmp_seq) - 1):
+            # the reversals from i are priced at once when the loop gets
+            # to i, the ones rejected by compat are not priced: once an
+            # arc inside the reversed part is not compatible, longer ones
+            # are neither
+            new_seqs, priced = [], []
+            reversed_compat = True
             for j in range(i + 1, len(tmp_seq)):
-                new_seq = tmp_seq[:i] + tmp_seq[i:j + 1][::-1] + tmp_seq[j + 1:]
-                try:
-                    new_info = generate_seq_info(new_seq, param)
-                except KeyError:
-                    continue
-                if new_info is None:
+                reversed_compat = reversed_compat and check_compat(
+                    (tmp_seq[j], tmp_seq[j - 1]), (1,), param
+                )
+                new_seq = \
+                    tmp_seq[:i] + tmp_seq[i:j + 1][::-1] + tmp_seq[j + 1:]
+                if reversed_compat and \
+                        check_compat(new_seq, (i, j + 1), param):
+                    priced.append(len(new_seqs))
+                new_seqs.append(new_seq)
+            costs = [M] * len(new_seqs)
+            if priced:
+                _, priced_costs = evaluate_seq_batch(
+                    [new_seqs[k] for k in priced], param
+                )
+                for k, cost in zip(priced, priced_costs.tolist()):
+                    costs[k] = cost
+            for new_seq, new_cost in zip(new_seqs, costs):
+                if new_cost >= M:
                     if infeasible and random.random() < probability:
                         return new_seq, None
                     continue
                 else:
-                    if new_info.cost < tmp_cost:
+                    if new_cost < tmp_cost:
                         if best_accept:
-                            tmp_seq, tmp_info = new_seq, new_info
-                            tmp_cost = new_info.cost
+                            tmp_seq = new_seq
+                            tmp_info = generate_seq_info(new_seq, param)
+                            tmp_cost = tmp_info.cost
                             have_update = True
                             break
                         if better_accept:
-                            return new_seq, new_info
+                            return new_seq, generate_seq_info(new_seq, param)
                     if probability and random.random() < probability:
-                        return new_seq, new_info
+                        return new_seq, generate_seq_info(new_seq, param)
             if have_update:
                 break
         if not have_update:
             break
-        have_update = False
     if tmp_info is None:
         if infeasible and random.random() < probability:
             return tmp_seq, None
@@ -118,12 +137,10 @@ def or_opt(
                     continue
                 sub_seq = tmp_seq[i:i + sub_seq_len]
                 main_seq = tmp_seq[:i] + tmp_seq[i + sub_seq_len:]
-                try:
-                    new_seq, new_info = insertion(
-                        sub_seq, main_seq, param, node_id_c, best_accept=True
-                    )
-                except KeyError:
-                    continue
+                new_seq, new_info = efficient_insertion(
+                    sub_seq, main_seq, None, param, node_id_c,
+                    best_accept=True
+                )
                 if new_info is None:
                     if infeasible and random.random() < probability:
                         return new_seq, None
@@ -0,0 +1,351 @@
+"""
+set covering recombination
+
+the routes that the constructions and the local search generated are
+collected in a RoutePool, and the cheapest combination of pool routes
+covering every customer is found by a set covering model. customers
+that are covered more than once are removed from their routes and put
+back by regret insertion, and the result is only taken if it is cheaper
+than the current solution, whose routes are always columns of the model.
+
+the model is solved by the first available MIP backend of
+scipy (HiGHS), pulp (CBC) and ortools (CBC or SCIP), all of them run
+offline, or by a lagrangian heuristic if none of them is installed.
+"""
+from vrp.common.model import SeqInfo, Param
+from vrp.util.info import generate_seq_info
+from vrp.util.route_pool import RoutePool
+from vrp.improvement.alns import remove_customers, regret_repair
+
+import numpy as np
+
+import heapq
+import time
+from collections import Counter
+from typing import Dict, Tuple, Set, List
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    from scipy.sparse import coo_matrix
+except ImportError:
+    milp = None
+try:
+    import pulp
+except ImportError:
+    pulp = None
+try:
+    from ortools.linear_solver import pywraplp
+except ImportError:
+    pywraplp = None
+
+BACKENDS = ("scipy", "pulp", "ortools", "lagrangian")
+
+
+def get_available_backends() -> List[str]:
+    available = {
+        "scipy": milp is not None,
+        "pulp": pulp is not None,
+        "ortools": pywraplp is not None,
+        "lagrangian": True
+    }
+    return [x for x in BACKENDS if available[x]]
+
+
+def _solve_scipy(
+        costs: List[float],
+        columns: List[List[int]],
+        row_number: int,
+        incumbent: List[int],
+        time_limit: float
+) -> List[int]:
+    rows = [i for column in columns for i in column]
+    cols = [j for j, column in enumerate(columns) for _ in column]
+    a = coo_matrix(
+        (np.ones(len(rows)), (rows, cols)),
+        shape=(row_number, len(columns))
+    ).tocsr()
+    res = milp(
+        np.asarray(costs, dtype=np.float64),
+        constraints=LinearConstraint(a, lb=1, ub=np.inf),
+        integrality=np.ones(len(columns)),
+        bounds=Bounds(0, 1),
+        options={"time_limit": time_limit, "disp": False}
+    )
+    if res.x is None:
+        return None
+    return np.flatnonzero(res.x > 0.5).tolist()
+
+
+def _solve_pulp(
+        costs: List[float],
+        columns: List[List[int]],
+        row_number: int,
+        incumbent: List[int],
+        time_limit: float
+) -> List[int]:
+    prob = pulp.LpProblem("set_covering", pulp.LpMinimize)
+    x = [
+        pulp.LpVariable("x" + str(j), cat="Binary")
+        for j in range(len(columns))
+    ]
+    prob += pulp.lpSum(c * v for c, v in zip(costs, x))
+    cover = [[] for _ in range(row_number)]
+    for j, column in enumerate(columns):
+        for i in column:
+            cover[i].append(x[j])
+    for variables in cover:
+        prob += pulp.lpSum(variables) >= 1
+    incumbent = set(incumbent)
+    for j, v in enumerate(x):
+        v.setInitialValue(1 if j in incumbent else 0)
+    prob.solve(pulp.PULP_CBC_CMD(
+        msg=False, timeLimit=time_limit, warmStart=True
+    ))
+    return [j for j, v in enumerate(x) if (v.value() or 0) > 0.5]
+
+
+def _solve_ortools(
+        costs: List[float],
+        columns: List[List[int]],
+        row_number: int,
+        incumbent: List[int],
+        time_limit: float
+) -> List[int]:
+    solver = pywraplp.Solver.CreateSolver("CBC") or \
+        pywraplp.Solver.CreateSolver("SCIP")
+    if solver is None:
+        return None
+    x = [solver.BoolVar("x" + str(j)) for j in range(len(columns))]
+    cover = [[] for _ in range(row_number)]
+    for j, column in enumerate(columns):
+        for i in column:
+            cover[i].append(x[j])
+    for variables in cover:
+        solver.Add(solver.Sum(variables) >= 1)
+    solver.Minimize(solver.Sum([c * v for c, v in zip(costs, x)]))
+    solver.SetTimeLimit(int(time_limit * 1000))
+    incumbent = set(incumbent)
+    solver.SetHint(x, [1. if j in incumbent else 0. for j in range(len(x))])
+    status = solver.Solve()
+    if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+        return None
+    return [j for j, v in enumerate(x) if v.solution_value() > 0.5]
+
+
+def _greedy_cover(
+        costs: np.ndarray,
+        columns: List[List[int]],
+        row_number: int,
+        fixed: List[int]
+) -> List[int]:
+    """
+    the fixed columns, then the column with the lowest cost per
+    uncovered row until every row is covered (a lazy heap, the cost
+    per uncovered row of a column can only grow), then redundant
+    columns are dropped, the most expensive first
+    """
+    count = np.zeros(row_number, dtype=np.int64)
+    selected = list(fixed)
+    for j in selected:
+        count[columns[j]] += 1
+    uncovered_number = int((count == 0).sum())
+    heap = [(costs[j] / len(x), j) for j, x in enumerate(columns)]
+    heapq.heapify(heap)
+    while uncovered_number and heap:
+        _, j = heapq.heappop(heap)
+        new_number = sum(1 for i in columns[j] if not count[i])
+        if not new_number:
+            continue
+        ratio = costs[j] / new_number
+        if heap and ratio > heap[0][0]:
+            heapq.heappush(heap, (ratio, j))
+            continue
+        selected.append(j)
+        uncovered_number -= new_number
+        count[columns[j]] += 1
+    if uncovered_number:
+        return None
+    kept = []
+    for j in sorted(selected, key=lambda x: -costs[x]):
+        if count[columns[j]].min() > 1:
+            count[columns[j]] -= 1
+        else:
+            kept.append(j)
+    return kept
+
+
+def _solve_lagrangian(
+        costs: List[float],
+        columns: List[List[int]],
+        row_number: int,
+        incumbent: List[int],
+        time_limit: float,
+        max_iter: int = 1000,
+        heuristic_every: int = 10
+) -> List[int]:
+    """
+    lagrangian heuristic (Beasley) for when no MIP backend is installed:
+    the cover constraints are relaxed with multipliers u >= 0 updated by
+    subgradient steps, and every heuristic_every steps a cover is made
+    by _greedy_cover from the columns of negative reduced cost
+    c_j - sum(u_i, i in column j)
+    """
+    start_time = time.perf_counter()
+    costs = np.asarray(costs, dtype=np.float64)
+    column_number = len(columns)
+    rows = np.array([i for x in columns for i in x], dtype=np.int64)
+    cols = np.array(
+        [j for j, x in enumerate(columns) for _ in x], dtype=np.int64
+    )
+    best = list(incumbent) if incumbent else \
+        _greedy_cover(costs, columns, row_number, [])
+    if best is None:
+        return None
+    upper = costs[best].sum()
+
+    # u_i = min cost per row of the columns covering i
+    u = np.full(row_number, np.inf)
+    np.minimum.at(u, rows, (costs / np.bincount(cols))[cols])
+    lower, step_size, stall = -np.inf, 2., 0
+    for iteration in range(max_iter):
+        if time.perf_counter() - start_time >= time_limit:
+            break
+        reduced = costs - np.bincount(
+            cols, weights=u[rows], minlength=column_number
+        )
+        x = reduced < 0
+        bound = u.sum() + reduced[x].sum()
+        if bound > lower + 1e-6:
+            lower, stall = bound, 0
+        else:
+            stall += 1
+            if stall >= 30:
+                step_size, stall = step_size / 2, 0
+        if iteration % heuristic_every == 0:
+            cover = _greedy_cover(
+                costs, columns, row_number, np.flatnonzero(x).tolist()
+            )
+            if cover is not None and costs[cover].sum() < upper - 1e-6:
+                best, upper = cover, costs[cover].sum()
+        if upper - lower < 1e-6 or step_size < 1e-4:
+            break
+        g = 1 - np.bincount(rows, weights=x[cols], minlength=row_number)
+        norm = (g ** 2).sum()
+        if not norm:
+            break
+        u = np.maximum(0, u + step_size * (upper - bound) / norm * g)
+    return [int(j) for j in best]
+
+
+_SOLVERS = {
+    "scipy": _solve_scipy,
+    "pulp": _solve_pulp,
+    "ortools": _solve_ortools,
+    "lagrangian": _solve_lagrangian
+}
+
+
+def solve_set_covering(
+        costs: List[float],
+        columns: List[List[int]],
+        row_number: int,
+        incumbent: List[int] = (),
+        time_limit: float = 10.,
+        backend: str = "auto"
+) -> List[int]:
+    """
+    min sum(costs[j] * x[j]) s.t. every row is in a selected column
+    :param costs:
+    :param columns: rows of every column
+    :param row_number:
+    :param incumbent: columns of a known cover, a warm start for
+        pulp, ortools and lagrangian
+    :param time_limit: seconds
+    :param backend: scipy, pulp, ortools, lagrangian, or auto for the
+        first available one
+    :return: selected columns, or None if no cover was found in time
+    """
+    if backend == "auto":
+        backend = get_available_backends()[0]
+    if backend not in _SOLVERS:
+        raise ValueError("unknown backend: " + str(backend))
+    if backend not in get_available_backends():
+        raise ValueError("backend is not installed: " + str(backend))
+    if not row_number:
+        return []
+    if len({i for x in columns for i in x}) < row_number:
+        return None  # a row that no column covers
+    selected = _SOLVERS[backend](
+        costs, columns, row_number, list(incumbent), time_limit
+    )
+    if selected is None or \
+            len({i for j in selected for i in columns[j]}) < row_number:
+        return None  # stopped by the time limit without a cover
+    return selected
+
+
+def recombine_routes(
+        route_dict: Dict[Tuple, SeqInfo],
+        pool: RoutePool,
+        param: Param,
+        node_id_c: Set,
+        time_limit: float = 10.,
+        backend: str = "auto"
+) -> Dict[Tuple, SeqInfo]:
+    """
+    the cheapest combination of the routes of route_dict and the pool
+    by set covering, customers covered by more than one selected route
+    are removed and put back by regret insertion
+    :param route_dict: current solution, routes whose info is None
+        are returned unchanged
+    :param pool: the routes of route_dict are added to it
+    :param param:
+    :param node_id_c:
+    :param time_limit: seconds for the solver
+    :param backend: see solve_set_covering
+    :return: the new solution if it is cheaper, else route_dict
+    """
+    unavailable_dict = {k: v for k, v in route_dict.items() if v is None}
+    current = {k: v for k, v in route_dict.items() if v is not None}
+    current_cost = sum(v.cost for v in current.values())
+    pool.update(current)
+
+    routes = dict(pool.route_dict)
+    for seq, info in current.items():
+        key = pool.get_customers(seq)
+        if key not in routes or info.cost < routes[key][1].cost:
+            routes[key] = (seq, info)
+    row_dict = dict()  # customer -> row
+    for seq in current:
+        for x in pool.get_customers(seq):
+            row_dict.setdefault(x, len(row_dict))
+    keys = [k for k in routes if all(x in row_dict for x in k)]
+    keys.sort(key=lambda k: routes[k][0])
+    costs = [routes[k][1].cost for k in keys]
+    columns = [sorted(row_dict[x] for x in k) for k in keys]
+    current_keys = {pool.get_customers(seq) for seq in current}
+    incumbent = [j for j, k in enumerate(keys) if k in current_keys]
+
+    selected = solve_set_covering(
+        costs, columns, len(row_dict), incumbent,
+        time_limit=time_limit, backend=backend
+    )
+    if selected is None:
+        return route_dict
+    new = dict()
+    for seq, info in (routes[keys[j]] for j in selected):
+        # pool routes may have a fixed vehicle type
+        default_info = generate_seq_info(seq, param)
+        if default_info is not None and default_info.cost < info.cost:
+            info = default_info
+        new[seq] = info
+    count = Counter(x for k in (keys[j] for j in selected) for x in k)
+    duplicates = [x for x, n in count.items() if n > 1]
+    if duplicates:
+        partial, removed = remove_customers(new, duplicates, param)
+        new = regret_repair(partial, removed, param, node_id_c)
+    if any(v is None for v in new.values()) or \
+            sum(v.cost for v in new.values()) >= current_cost - 1e-6:
+        return route_dict
+    new.update(unavailable_dict)
+    return new
@@ -0,0 +1,308 @@
+from vrp.common.model import SeqInfo, Param
+from vrp.io.shared import SharedParam, attach_shared
+from vrp.improvement.intra_route import two_opt, or_opt
+from vrp.improvement.inter_route import two_opt_star, relocate, \
+    cross_exchange, granular_two_opt_star, granular_relocate, \
+    granular_cross_exchange
+from vrp.util.granular import get_candidate_lists
+from vrp.util.neighborhhod import RouteNeighborhood
+
+from itertools import count
+from multiprocessing import Pool
+from typing import Dict, Tuple, Set, List, Iterable
+
+INTRA_OPERATORS = ("two_opt", "or_opt")
+INTER_OPERATORS = ("relocate", "two_opt_star", "cross_exchange")
+VND_OPERATORS = ("two_opt", "or_opt", "relocate", "two_opt_star",
+                 "cross_exchange")
+
+
+def apply_intra_operator(
+        operator: str,
+        seq: Tuple,
+        info: SeqInfo,
+        param: Param,
+        node_id_c: Set
+) -> (Tuple, SeqInfo):
+    """
+    :param operator: two_opt or or_opt
+    :param seq:
+    :param info:
+    :param param:
+    :param node_id_c:
+    :return: improved route, or None, None
+    """
+    if operator == "two_opt":
+        return two_opt(seq, info, param, best_accept=True)
+    if operator == "or_opt":
+        return or_opt(seq, info, param, node_id_c, best_accept=True)
+    raise ValueError("unknown operator: " + str(operator))
+
+
+def intra_route_descent(
+        seq: Tuple,
+        info: SeqInfo,
+        param: Param,
+        node_id_c: Set,
+        operators: Iterable[str] = INTRA_OPERATORS
+) -> (Tuple, SeqInfo):
+    """
+    the intra operators in order on one route, back to the first one
+    after an improvement, until none of them improves it
+    :param seq:
+    :param info:
+    :param param:
+    :param node_id_c:
+    :param operators: see INTRA_OPERATORS
+    :return: improved route, or seq, info
+    """
+    operators = tuple(operators)
+    k = 0
+    while k < len(operators):
+        new_seq, new_info = apply_intra_operator(
+            operators[k], seq, info, param, node_id_c
+        )
+        if new_seq is None or new_info.cost >= info.cost:
+            k += 1
+        else:
+            seq, info, k = new_seq, new_info, 0
+    return seq, info
+
+
+# shared by the worker processes of parallel_intra_route_descent
+_pool_data = None
+
+
+def _init_pool(*data):
+    global _pool_data
+    _pool_data = attach_shared(data)
+
+
+def _intra_route_descent_task(
+        routes: List[Tuple[Tuple, SeqInfo]]
+) -> List[Tuple[Tuple, Tuple[Tuple, SeqInfo]]]:
+    return _intra_route_descent_chunk(routes, *_pool_data)
+
+
+def _intra_route_descent_chunk(
+        routes: List[Tuple[Tuple, SeqInfo]],
+        param: Param,
+        node_id_c: Set,
+        operators: Tuple[str, ...]
+) -> List[Tuple[Tuple, Tuple[Tuple, SeqInfo]]]:
+    improved = []
+    for seq, info in routes:
+        new_seq, new_info = intra_route_descent(
+            seq, info, param, node_id_c, operators
+        )
+        if new_info is not info:
+            improved.append((seq, (new_seq, new_info)))
+    return improved
+
+
+def parallel_intra_route_descent(
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        operators: Iterable[str] = INTRA_OPERATORS,
+        processes: int = 1,
+        chunk_size: int = 16
+) -> Dict[Tuple, Tuple[Tuple, SeqInfo]]:
+    """
+    intra_route_descent on every route, the routes are independent so
+    they are split into chunks for a process pool, the workers map the
+    instance from shared memory and only the improved routes are sent back
+    :param route_dict: routes whose info is None are skipped
+    :param param:
+    :param node_id_c:
+    :param operators: see INTRA_OPERATORS
+    :param processes:
+    :param chunk_size: routes of a task
+    :return: old seq -> improved route, only for the improved routes
+        and in the order of route_dict, the same for any number of
+        processes
+    """
+    operators = tuple(operators)
+    for operator in operators:
+        if operator not in INTRA_OPERATORS:
+            raise ValueError("unknown operator: " + str(operator))
+    routes = [(k, v) for k, v in route_dict.items() if v is not None]
+    if processes <= 1:
+        return dict(
+            _intra_route_descent_chunk(routes, param, node_id_c, operators)
+        )
+    chunks = [
+        routes[i:i + chunk_size] for i in range(0, len(routes), chunk_size)
+    ]
+    improved = dict()
+    with SharedParam(param) as shared_param, Pool(
+            processes, initializer=_init_pool,
+            initargs=(shared_param, node_id_c, operators)
+    ) as pool:
+        # in order, the routes of the result keep the order of route_dict
+        for chunk in pool.imap(_intra_route_descent_task, chunks):
+            improved.update(chunk)
+    return improved
+
+
+def apply_inter_operator(
+        operator: str,
+        seq1: Tuple,
+        info1: SeqInfo,
+        seq2: Tuple,
+        info2: SeqInfo,
+        param: Param,
+        node_id_c: Set,
+        candidate_lists: List[Set[int]] = None
+) -> ((Tuple, SeqInfo), (Tuple, SeqInfo)):
+    """
+    :param operator: relocate, two_opt_star or cross_exchange
+    :param seq1:
+    :param info1:
+    :param seq2:
+    :param info2:
+    :param param:
+    :param node_id_c:
+    :param candidate_lists: the granular operators are used if given
+    :return: improved routes, or (None, None), (None, None)
+    """
+    if candidate_lists is None:
+        if operator == "relocate":
+            return relocate(
+                seq1, info1, seq2, info2, param, node_id_c, best_accept=True
+            )
+        if operator == "two_opt_star":
+            return two_opt_star(seq1, info1, seq2, info2, param)
+        if operator == "cross_exchange":
+            return cross_exchange(seq1, info1, seq2, info2, param)
+    else:
+        if operator == "relocate":
+            return granular_relocate(
+                seq1, info1, seq2, info2, param, node_id_c, candidate_lists
+            )
+        if operator == "two_opt_star":
+            return granular_two_opt_star(
+                seq1, info1, seq2, info2, param, candidate_lists
+            )
+        if operator == "cross_exchange":
+            return granular_cross_exchange(
+                seq1, info1, seq2, info2, param, candidate_lists
+            )
+    raise ValueError("unknown operator: " + str(operator))
+
+
+def variable_neighborhood_descent(
+        route_dict: Dict[Tuple, SeqInfo],
+        param: Param,
+        node_id_c: Set,
+        operators: Iterable[str] = VND_OPERATORS,
+        neighborhood_number: int = 10,
+        candidate_k: int = 0,
+        candidate_metric: str = "distance"
+) -> Dict[Tuple, SeqInfo]:
+    """
+    variable neighborhood descent:
+        the operators are applied in order over all routes (intra) or
+        all pairs of neighboring routes (inter), every improvement is
+        accepted, and it goes back to the first operator after a pass
+        with an improvement. it stops when a pass of the last operator
+        has no improvement, a local optimum of all the operators.
+        a route that an inter operator leaves without customers is removed.
+    every route gets a stamp when it is created. a route that an intra
+    operator could not improve is not tried again by that operator
+    (don't look bit), and a pair of routes that an inter operator could
+    not improve is not tried again until one of them changes
+    :param route_dict: routes whose info is None are returned unchanged
+    :param param:
+    :param node_id_c:
+    :param operators: see VND_OPERATORS
+    :param neighborhood_number: neighbor routes for the inter operators
+    :param candidate_k: if > 0, the granular inter operators are used
+        with candidate lists of this size
+    :param candidate_metric: see calculate_arc_metric
+    :return:
+    """
+    operators = tuple(operators)
+    for operator in operators:
+        if operator not in INTRA_OPERATORS + INTER_OPERATORS:
+            raise ValueError("unknown operator: " + str(operator))
+    _, _, node, *_ = param
+    candidate_lists = get_candidate_lists(
+        param, candidate_k, candidate_metric
+    ) if candidate_k > 0 else None
+
+    # routes that are not available are kept as they are
+    unavailable_dict = {k: v for k, v in route_dict.items() if v is None}
+    route_dict = {k: v for k, v in route_dict.items() if v is not None}
+    stamp_counter = count()
+    stamp = {seq: next(stamp_counter) for seq in route_dict}
+    neighborhood = RouteNeighborhood(
+        route_dict, node, neighborhood_number=neighborhood_number
+    )
+    failed = {operator: set() for operator in operators}
+
+    def replace(old_seqs, new_routes):
+        # an emptied route is (), its vehicle is removed
+        new_routes = [x for x in new_routes if x[0]]
+        for seq in old_seqs:
+            route_dict.pop(seq)
+            stamp.pop(seq)
+        for seq, info in new_routes:
+            route_dict[seq] = info
+            stamp[seq] = next(stamp_counter)
+        neighborhood.update(old_seqs, [x[0] for x in new_routes])
+
+    def intra_pass(operator):
+        improved = False
+        for seq in sorted(route_dict, key=stamp.get):
+            if stamp[seq] in failed[operator]:
+                continue
+            info = route_dict[seq]
+            new_seq, new_info = apply_intra_operator(
+                operator, seq, info, param, node_id_c
+            )
+            if new_seq is None or new_info.cost >= info.cost:
+                failed[operator].add(stamp[seq])
+                continue
+            replace([seq], [(new_seq, new_info)])
+            improved = True
+        return improved
+
+    def inter_pass(operator):
+        improved = False
+        for seq1 in sorted(route_dict, key=stamp.get):
+            if seq1 not in route_dict:
+                continue  # changed in this pass
+            for seq2 in neighborhood[seq1]:
+                key = tuple(sorted((stamp[seq1], stamp[seq2])))
+                if key in failed[operator]:
+                    continue
+                info1, info2 = route_dict[seq1], route_dict[seq2]
+                (new_seq1, new_info1), (new_seq2, new_info2) = \
+                    apply_inter_operator(
+                        operator, seq1, info1, seq2, info2,
+                        param, node_id_c, candidate_lists
+                    )
+                if new_seq1 is None or new_seq2 is None or \
+                        new_info1.cost + new_info2.cost >= \
+                        info1.cost + info2.cost:
+                    failed[operator].add(key)
+                    continue
+                replace(
+                    [seq1, seq2],
+                    [(new_seq1, new_info1), (new_seq2, new_info2)]
+                )
+                improved = True
+                break
+        return improved
+
+    k = 0
+    while k < len(operators):
+        operator = operators[k]
+        if operator in INTRA_OPERATORS:
+            improved = intra_pass(operator)
+        else:
+            improved = inter_pass(operator)
+        k = 0 if improved else k + 1
+    route_dict.update(unavailable_dict)
+    return route_dict
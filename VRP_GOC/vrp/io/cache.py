@@ -0,0 +1,161 @@
+import numpy as np
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+
+NODE_DTYPE = np.dtype([
+    ("ID", np.int32),
+    ("type", np.int32),
+    ("lng", np.float64),
+    ("lat", np.float64),
+    ("weight", np.float64),
+    ("volume", np.float64),
+    ("first", np.int32),
+    ("last", np.int32)
+])
+
+CACHE_VERSION = 1
+
+
+def file_hash(file_name: str) -> str:
+    h = hashlib.sha1()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_stat(file_name: str) -> Tuple[int, int]:
+    st = os.stat(file_name)
+    return st.st_size, st.st_mtime_ns
+
+
+def _cache_path(dt_file: str, cache_dir: str) -> str:
+    name = os.path.splitext(os.path.basename(dt_file))[0]
+    return os.path.join(cache_dir, name)
+
+
+def _read_meta(path: str):
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path: str, meta):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def _is_fresh(meta, source_files) -> (bool, dict):
+    """
+    check whether a compiled instance matches its source files,
+    size and mtime are compared first, the content hash is only
+    recomputed when they differ (e.g. the file was touched or copied)
+    :param meta:
+    :param source_files:
+    :return: is fresh, and the source info to store
+    """
+    source = dict()
+    for file_name in source_files:
+        size, mtime = _file_stat(file_name)
+        old = meta.get("source", {}).get(file_name) if meta else None
+        if old and old["size"] == size and old["mtime"] == mtime:
+            source[file_name] = old
+        else:
+            source[file_name] = {
+                "size": size, "mtime": mtime, "sha1": file_hash(file_name)
+            }
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return False, source
+    is_fresh = all(
+        meta["source"].get(k, {}).get("sha1") == v["sha1"]
+        for k, v in source.items()
+    )
+    return is_fresh, source
+
+
+def compile_instance(
+        path: str,
+        ds: np.ndarray,
+        tm: np.ndarray,
+        node: np.ndarray,
+        source: dict
+):
+    """
+    write an instance to the binary cache directory `path`.
+    the files are written to a temporary directory of its own, so a broken
+    compile never leaves a half-written cache behind. the old directory is
+    renamed aside and the new one renamed into place, `path` is only
+    missing between the two renames. if a concurrent compile puts its
+    directory into place first, that one is kept
+    :param path:
+    :param ds:
+    :param tm:
+    :param node: node records with NODE_DTYPE
+    :param source: size, mtime and hash of the source files
+    :return:
+    """
+    parent, name = os.path.split(path)
+    tmp = tempfile.mkdtemp(prefix=name + ".tmp.", dir=parent)
+    old = tmp + ".old"
+    try:
+        np.save(os.path.join(tmp, "ds.npy"), ds)
+        np.save(os.path.join(tmp, "tm.npy"), tm)
+        np.save(os.path.join(tmp, "node.npy"), node)
+        _write_meta(tmp, {"version": CACHE_VERSION, "source": source})
+        try:
+            os.replace(path, old)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # another compile of the same sources renamed its directory
+            # into place after ours was renamed aside
+            pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load_instance(
+        dt_file: str,
+        node_file: str,
+        parse,
+        cache_dir: str = "input_B/cache"
+) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    load an instance from the binary cache, compile it with `parse`
+    first if the cache is missing or stale.
+    matrices and node records are opened memory-mapped (read only)
+    :param dt_file: distance-time file
+    :param node_file: node file
+    :param parse: parse(dt_file, node_file) -> ds, tm, node
+    :param cache_dir:
+    :return: ds, tm, node
+    """
+    path = _cache_path(dt_file, cache_dir)
+    meta = _read_meta(path)
+    is_fresh, source = _is_fresh(meta, (dt_file, node_file))
+    if not is_fresh:
+        ds, tm, node = parse(dt_file, node_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        compile_instance(path, ds, tm, node, source)
+    elif source != meta["source"]:
+        # same content but touched, refresh mtime to skip hashing next time
+        meta["source"] = source
+        _write_meta(path, meta)
+
+    return tuple(
+        np.load(os.path.join(path, x), mmap_mode="r")
+        for x in ("ds.npy", "tm.npy", "node.npy")
+    )
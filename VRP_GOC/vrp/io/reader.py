@@ -1,6 +1,10 @@
-import pandas as pd
+from vrp.io.cache import load_instance, NODE_DTYPE
+from vrp.common.model import NodeTable
+from vrp.common.constant import *
 
-from vrp.common.model import SeqDict
+import numpy as np
+import pandas as pd
+from typing import Set, Tuple
 
 
 def time_transformer(s):
@@ -8,39 +12,46 @@ def time_transformer(s):
     return int(a[0]) * 60 + int(a[1]) - 8 * 60
 
 
-def read_data(number):
-    if number == 1:
-        dt = pd.read_csv("input_B/inputdistancetime_1_1601.txt")
-        node = pd.read_csv("input_B/inputnode_1_1601.csv", sep="\t")
-    elif number == 2:
-        dt = pd.read_csv("input_B/inputdistancetime_2_1501.txt")
-        node = pd.read_csv("input_B/inputnode_2_1501.csv", sep="\t")
-    elif number == 3:
-        dt = pd.read_csv("input_B/inputdistancetime_3_1401.txt")
-        node = pd.read_csv("input_B/inputnode_3_1401.csv", sep="\t")
-    elif number == 4:
-        dt = pd.read_csv("input_B/inputdistancetime_4_1301.txt")
-        node = pd.read_csv("input_B/inputnode_4_1301.csv", sep="\t")
-    elif number == 5:
-        dt = pd.read_csv("input_B/inputdistancetime_5_1201.txt")
-        node = pd.read_csv("input_B/inputnode_5_1201.csv", sep="\t")
-    else:
-        return None
+def build_matrix(dt, node_num):
+    """
+    build dense distance and time matrices indexed by node id,
+    ds[i, j] and tm[i, j] are the distance and time from node i to node j
+    :param dt: distance-time data frame
+    :param node_num: number of nodes (max node id + 1)
+    :return:
+    """
+    from_node = dt["from_node"].values
+    to_node = dt["to_node"].values
+    ds = np.zeros((node_num, node_num), dtype=np.int32)
+    tm = np.zeros((node_num, node_num), dtype=np.int32)
+    ds[from_node, to_node] = dt["distance"].values
+    tm[from_node, to_node] = dt["spend_tm"].values
+    return ds, tm
 
-    from_to_node = list(zip(dt["from_node"].values, dt["to_node"].values))
-    ds = SeqDict({
-        ((k1,), (k2,)): v
-        for (k1, k2), v in pd.Series(
-            dt["distance"].values, index=from_to_node
-        ).items()
-    })
-    tm = SeqDict({
-        ((k1,), (k2,)): v
-        for (k1, k2), v in pd.Series(
-            dt["spend_tm"].values, index=from_to_node
-        ).items()
-    })
-    del dt
+
+DATA_FILES = {
+    1: ("input_B/inputdistancetime_1_1601.txt",
+        "input_B/inputnode_1_1601.csv"),
+    2: ("input_B/inputdistancetime_2_1501.txt",
+        "input_B/inputnode_2_1501.csv"),
+    3: ("input_B/inputdistancetime_3_1401.txt",
+        "input_B/inputnode_3_1401.csv"),
+    4: ("input_B/inputdistancetime_4_1301.txt",
+        "input_B/inputnode_4_1301.csv"),
+    5: ("input_B/inputdistancetime_5_1201.txt",
+        "input_B/inputnode_5_1201.csv"),
+}
+
+
+def parse_data(dt_file, node_file):
+    """
+    parse the raw distance-time and node files
+    :param dt_file:
+    :param node_file:
+    :return: ds, tm and node records (NODE_DTYPE)
+    """
+    dt = pd.read_csv(dt_file)
+    node = pd.read_csv(node_file, sep="\t")
 
     node.columns = [
         "ID",
@@ -53,88 +64,64 @@ def read_data(number):
         "last"
     ]
 
+    ds, tm = build_matrix(dt, node["ID"].max() + 1)
+    del dt
+
     node["first"] = node.loc[:, "first"].apply(
         lambda x: time_transformer(x) if x != "-" else 0
     )
     node["last"] = node.loc[:, "last"].apply(
         lambda x: time_transformer(x) if x != "-" else 960
     )
+    # "-" for depot and charging stations
+    node["weight"] = pd.to_numeric(node["weight"], errors="coerce").fillna(0)
+    node["volume"] = pd.to_numeric(node["volume"], errors="coerce").fillna(0)
+
+    records = np.zeros(len(node), dtype=NODE_DTYPE)
+    for name in NODE_DTYPE.names:
+        records[name] = node[name].values
+    return ds, tm, records
+
 
-    delivery = node[node.type == 2]
-    pickup = node[node.type == 3]
-    charge = node[node.type == 4]
-
-    lng_lat = list(zip(node["lng"].values, node["lat"].values))
-    position = pd.Series(lng_lat, index=node["ID"]).to_dict()
-
-    del node
-
-    delivery_range = [delivery["ID"].min(), delivery["ID"].max()]
-    pickup_range = [pickup["ID"].min(), pickup["ID"].max()]
-    charge_range = [charge["ID"].min(), charge["ID"].max()]
-    return ds, tm, delivery, pickup, charge, position, \
-        [
-            lambda x:
-                True if delivery_range[0] <= x <= delivery_range[1] else False,
-            lambda x:
-                True if pickup_range[0] <= x <= pickup_range[1] else False,
-            lambda x:
-                True if charge_range[0] <= x <= charge_range[1] else False
-        ]
-
-
-def get_node_info(node, is_charge=False):
-    node_id = {(x,) for x in node["ID"].values.tolist()}
-    if is_charge:
-        # weight = {
-        #     (k,): 0
-        #     for k, v in pd.Series(
-        #         node["weight"].values, index=node["ID"].values
-        #     ).items()
-        # }
-        # volume = {
-        #     (k,): 0
-        #     for k, v in pd.Series(
-        #         node["volume"].values, index=node["ID"].values
-        #     ).items()
-        # }
-        volume, weight = None, None
-        first = {
-            (k,): 0
-            for k, v in pd.Series(
-                node["first"].values, index=node["ID"].values
-            ).items()
-        }
-        last = {
-            (k,): 960
-            for k, v in pd.Series(
-                node["last"].values, index=node["ID"].values
-            ).items()
-        }
+def read_data(number, use_cache=True):
+    """
+    read a data set, the parsed data set is compiled into a binary cache
+    on the first read and memory-mapped afterwards
+    :param number: data set number
+    :param use_cache:
+    :return: ds, tm and node table
+    """
+    if number not in DATA_FILES:
+        return None
+    dt_file, node_file = DATA_FILES[number]
+    if use_cache:
+        ds, tm, node = load_instance(dt_file, node_file, parse_data)
     else:
-        weight = {
-            (k,): float(v)
-            for k, v in pd.Series(
-                node["weight"].values, index=node["ID"].values
-            ).items()
-        }
-        volume = {
-            (k,): float(v)
-            for k, v in pd.Series(
-                node["volume"].values, index=node["ID"].values
-            ).items()
-        }
-        first = {
-            (k,): int(v)
-            for k, v in pd.Series(
-                node["first"].values, index=node["ID"].values
-            ).items()
-        }
-        last = {
-            (k,): int(v)
-            for k, v in pd.Series(
-                node["last"].values, index=node["ID"].values
-            ).items()
-        }
-    del node
-    return node_id, volume, weight, first, last
+        ds, tm, node = parse_data(dt_file, node_file)
+    return ds, tm, get_node_table(node)
+
+
+def get_node_table(node) -> NodeTable:
+    """
+    build the node table from node records,
+    depot and charging stations carry no goods and are always open
+    :param node: node records (NODE_DTYPE)
+    :return:
+    """
+    node_num = int(node["ID"].max()) + 1
+    columns = dict()
+    for name in NodeTable._fields:
+        columns[name] = np.zeros(node_num, dtype=node.dtype[name])
+        columns[name][node["ID"]] = node[name]
+    table = NodeTable(**columns)
+
+    no_goods = (table.type == DEPOT) | (table.type == CHARGE)
+    table.volume[no_goods] = 0
+    table.weight[no_goods] = 0
+    table.first[no_goods] = START_TIME
+    table.last[no_goods] = END_TIME
+    return table
+
+
+def get_node_id(node: NodeTable, node_type: int) -> Set[Tuple]:
+    return {(x,) for x in np.flatnonzero(node.type == node_type).tolist()}
@@ -0,0 +1,145 @@
+from vrp.common.model import Param, NodeTable
+
+import numpy as np
+
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple
+
+
+class SharedParam(object):
+    """
+    the arrays of a Param (matrices, node table, charge table and arc
+    compatibility) copied once into shared memory. the object is pickled
+    as a handle (segment names, shapes and dtypes), so a worker process
+    only maps the segments, whatever the size of the instance:
+        with SharedParam(param) as shared_param:
+            with Pool(processes, initializer=_init_pool,
+                      initargs=(shared_param, ...)) as pool:
+                ...
+        # in the worker: param = shared_param.param
+    the process that creates it owns the segments, they are unlinked on
+    exit of the with block or by unlink(). workers of a Pool share the
+    resource tracker of the owner, so attaching from them is safe
+    """
+
+    def __init__(self, param: Param):
+        """
+        :param param:
+        """
+        self.is_owner = True
+        self.spec = []  # (path, segment name, shape, dtype) of every array
+        self.segments = []
+        for path, array in _flatten(param):
+            if array is None:
+                self.spec.append((path, None, None, None))
+                continue
+            array = np.ascontiguousarray(array)
+            segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.segments.append(segment)
+            np.ndarray(
+                array.shape, dtype=array.dtype, buffer=segment.buf
+            )[...] = array
+            self.spec.append(
+                (path, segment.name, array.shape, array.dtype.str)
+            )
+        self._param = None
+
+    def __getstate__(self):
+        return self.spec
+
+    def __setstate__(self, spec):
+        self.is_owner = False
+        self.spec = spec
+        self.segments = []
+        self._param = None
+
+    @property
+    def param(self) -> Param:
+        """
+        Param of read only views on the segments, attached on first use
+        """
+        if self._param is None:
+            self._attach()
+            arrays = []
+            segments = iter(self.segments)
+            for path, name, shape, dtype in self.spec:
+                if name is None:
+                    arrays.append((path, None))
+                    continue
+                array = np.ndarray(
+                    shape, dtype=np.dtype(dtype), buffer=next(segments).buf
+                )
+                array.flags.writeable = False
+                arrays.append((path, array))
+            self._param = _unflatten(arrays)
+        return self._param
+
+    def _attach(self):
+        if not self.segments:
+            self.segments = [
+                SharedMemory(name=name)
+                for _, name, _, _ in self.spec if name is not None
+            ]
+
+    def close(self):
+        """
+        unmap the segments of this process, a segment that still has
+        views in use stays mapped until they are gone
+        """
+        self._param = None
+        for segment in self.segments:
+            try:
+                segment.close()
+            except BufferError:
+                pass
+        self.segments = []
+
+    def unlink(self):
+        """
+        free the segments if this process owns them, and close
+        """
+        if self.is_owner:
+            self._attach()
+            for segment in self.segments:
+                segment.unlink()
+            self.is_owner = False
+        self.close()
+
+    def __enter__(self) -> "SharedParam":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.unlink()
+
+
+def _flatten(param: Param):
+    for field, value in zip(Param._fields, param):
+        if isinstance(value, NodeTable):
+            for node_field, array in zip(NodeTable._fields, value):
+                yield (field, node_field), array
+        else:
+            yield (field,), value
+
+
+def _unflatten(arrays) -> Param:
+    values, node = dict(), dict()
+    for path, array in arrays:
+        if len(path) == 2:
+            node[path[1]] = array
+        else:
+            values[path[0]] = array
+    if node:
+        values["node"] = NodeTable(**node)
+    return Param(**values)
+
+
+def attach_shared(data: Tuple) -> Tuple:
+    """
+    replace the SharedParam handles in the data of a pool initializer
+    by their Param
+    :param data:
+    :return:
+    """
+    return tuple(
+        x.param if isinstance(x, SharedParam) else x for x in data
+    )
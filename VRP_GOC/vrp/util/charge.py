@@ -0,0 +1,73 @@
+from vrp.common.model import Param, NodeTable
+from vrp.common.constant import *
+
+import numpy as np
+
+from typing import List, Tuple, Set
+
+
+def get_charge_table(
+        ds: np.ndarray,
+        node: NodeTable,
+        k: int = 3,
+        block_size: int = 64
+) -> np.ndarray:
+    """
+    the k charging stations with the least detour ds[i, c] + ds[c, j]
+    for every pair (i, j), a station is never chosen next to itself.
+    rows are computed in blocks to bound the memory of the detour array
+    :param ds:
+    :param node:
+    :param k:
+    :param block_size: rows per block
+    :return: charge_table[i, j] are station ids sorted by detour, (N, N, k)
+    """
+    charge_id = np.flatnonzero(node.type == CHARGE)
+    node_num = len(ds)
+    k = min(k, len(charge_id))
+    charge_table = np.empty((node_num, node_num, k), dtype=np.int32)
+    if k == 0:
+        return charge_table
+
+    ds_to = np.asarray(ds[:, charge_id], dtype=np.float32)  # (N, C)
+    ds_from = np.asarray(ds[charge_id, :], dtype=np.float32).T  # (N, C)
+    ds_from[charge_id, np.arange(len(charge_id))] = np.inf
+    for i in range(0, node_num, block_size):
+        to = ds_to[i:i + block_size].copy()
+        rows = np.arange(i, min(i + block_size, node_num))
+        is_charge = np.isin(rows, charge_id)
+        to[is_charge, np.searchsorted(charge_id, rows[is_charge])] = np.inf
+        detour = to[:, None, :] + ds_from[None, :, :]  # (b, N, C)
+        best = np.argpartition(detour, k - 1, axis=2)[:, :, :k]
+        order = np.argsort(
+            np.take_along_axis(detour, best, axis=2), axis=2, kind="stable"
+        )
+        charge_table[i:i + block_size] = charge_id[
+            np.take_along_axis(best, order, axis=2)
+        ]
+    return charge_table
+
+
+def get_charge_candidates(
+        from_node: int,
+        to_node: int,
+        param: Param,
+        node_id_c: Set
+) -> List[Tuple]:
+    """
+    charging stations to put between from_node and to_node,
+    sorted by detour, from param.charge if it is given,
+    a station is never chosen next to itself
+    :param from_node:
+    :param to_node:
+    :param param:
+    :param node_id_c:
+    :return: [(cid,), ...]
+    """
+    ds, *_ = param
+    if param.charge is not None:
+        return [(x,) for x in param.charge[from_node, to_node].tolist()]
+    return sorted(
+        (x for x in node_id_c if x[0] not in (from_node, to_node)),
+        key=lambda x: ds[from_node, x[0]] + ds[x[0], to_node]
+    )
@@ -0,0 +1,75 @@
+from vrp.common.model import Param, NodeTable
+from vrp.common.constant import *
+
+import numpy as np
+
+from typing import Tuple, Iterable
+
+
+def tighten_time_window(
+        tm: np.ndarray,
+        node: NodeTable
+) -> (np.ndarray, np.ndarray):
+    """
+    a node can not be served before the vehicle arrives from the depot,
+    and it must be served early enough to get back to the depot in time
+    :param tm:
+    :param node:
+    :return: tightened first and last
+    """
+    first = np.maximum(node.first, tm[0, :])
+    last = np.minimum(node.last, END_TIME - SERVE_TIME - tm[:, 0])
+    first[0], last[0] = START_TIME, END_TIME
+    return first, last
+
+
+def get_arc_compat(
+        tm: np.ndarray,
+        node: NodeTable
+) -> np.ndarray:
+    """
+    compat[i, j] is False if node j can never directly follow node i:
+        1. i is served at its earliest and j is still missed
+        2. both loads of i and j are on the vehicle at the same time
+           (delivery and delivery, pickup and pickup, pickup then delivery)
+           and they are over the limit of vehicle type 2
+    :param tm:
+    :param node:
+    :return: bool matrix, (N, N)
+    """
+    first, last = tighten_time_window(tm, node)
+    compat = first[:, None] + SERVE_TIME + tm <= last[None, :]
+
+    is_delivery = node.type == DELIVERY
+    is_pickup = node.type == PICKUP
+    both_loaded = (is_delivery[:, None] & is_delivery[None, :]) | \
+        (is_pickup[:, None] & (is_pickup | is_delivery)[None, :])
+    over_load = (node.volume[:, None] + node.volume[None, :] > VOLUME_2) | \
+        (node.weight[:, None] + node.weight[None, :] > WEIGHT_2)
+    compat &= ~(both_loaded & over_load)
+    compat[0, :] = compat[:, 0] = True
+    np.fill_diagonal(compat, True)
+    return compat
+
+
+def check_compat(
+        seq: Tuple,
+        positions: Iterable[int],
+        param: Param
+) -> bool:
+    """
+    check the arcs (seq[p - 1], seq[p]) for p in positions,
+    arcs from or to the depot are not checked,
+    always True if param.compat is not given
+    :param seq:
+    :param positions:
+    :param param:
+    :return:
+    """
+    compat = param.compat
+    if compat is None:
+        return True
+    for p in positions:
+        if 0 < p < len(seq) and not compat.item(seq[p - 1], seq[p]):
+            return False
+    return True
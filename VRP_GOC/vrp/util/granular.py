@@ -0,0 +1,117 @@
+from vrp.common.model import Param, NodeTable
+from vrp.common.constant import *
+
+import numpy as np
+
+from typing import List, Set
+
+
+def calculate_arc_metric(
+        param: Param,
+        metric: str = "distance"
+) -> np.ndarray:
+    """
+    closeness of every arc (i, j), smaller is closer
+        distance: ds[i, j]
+        time: tm[i, j]
+        time_window: tm[i, j] plus the least wait at j after serving i,
+            M if j can not be reached before its window closes
+    :param param:
+    :param metric: distance, time or time_window
+    :return:
+    """
+    ds, tm, node, *_ = param
+    if metric == "distance":
+        return np.asarray(ds, dtype=np.float64)
+    if metric == "time":
+        return np.asarray(tm, dtype=np.float64)
+    if metric == "time_window":
+        arrive = node.first[:, None] + SERVE_TIME + np.asarray(tm)
+        wait = np.maximum(0, node.first[None, :] - arrive)
+        cost = (np.asarray(tm) + wait).astype(np.float64)
+        cost[arrive > node.last[None, :]] = M
+        return cost
+    raise ValueError("unknown metric: " + str(metric))
+
+
+def get_nearest_nodes(
+        param: Param,
+        k: int,
+        metric: str = "distance"
+) -> np.ndarray:
+    """
+    k nearest customers (delivery or pickup) of every node
+    :param param:
+    :param k:
+    :param metric: see calculate_arc_metric
+    :return: node ids sorted by closeness, shape (node_num, k)
+    """
+    _, _, node, *_ = param
+    return _get_nearest(calculate_arc_metric(param, metric), node, k)
+
+
+def _get_nearest(
+        cost: np.ndarray,
+        node: NodeTable,
+        k: int
+) -> np.ndarray:
+    is_customer = (node.type == DELIVERY) | (node.type == PICKUP)
+    cost = np.where(is_customer[None, :], cost, np.inf)
+    np.fill_diagonal(cost, np.inf)
+    k = max(0, min(k, int(is_customer.sum()) - 1))
+    if k == 0:
+        return np.empty((len(cost), 0), dtype=np.int64)
+    nearest = np.argpartition(cost, k - 1, axis=1)[:, :k]
+    order = np.argsort(
+        np.take_along_axis(cost, nearest, axis=1), axis=1, kind="stable"
+    )
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def get_granular_neighbors(
+        param: Param,
+        k: int,
+        metric: str = "distance"
+) -> List[Set[int]]:
+    """
+    neighbors[i] is the set of nodes j such that j is one of the k nearest
+    of i or i is one of the k nearest of j
+    :param param:
+    :param k:
+    :param metric: see calculate_arc_metric
+    :return:
+    """
+    nearest = get_nearest_nodes(param, k, metric).tolist()
+    neighbors = [set(x) for x in nearest]
+    for i, row in enumerate(nearest):
+        for j in row:
+            neighbors[j].add(i)
+    return neighbors
+
+
+def get_candidate_lists(
+        param: Param,
+        k: int,
+        metric: str = "distance"
+) -> List[Set[int]]:
+    """
+    candidates[i] is the set of the k nearest customers j that can directly
+    follow i, the arcs that miss the time window of j or are ruled out by
+    param.compat are never candidates
+    :param param:
+    :param k:
+    :param metric: see calculate_arc_metric
+    :return:
+    """
+    _, _, node, *_ = param
+    cost = calculate_arc_metric(param, metric)
+    available = calculate_arc_metric(param, "time_window") < M
+    if param.compat is not None:
+        available &= np.asarray(param.compat)
+    cost = np.where(available, cost, np.inf)
+    nearest = _get_nearest(cost, node, k)
+    nearest_cost = np.take_along_axis(cost, nearest, axis=1)
+    return [
+        set(row[row_cost < np.inf].tolist())
+        for row, row_cost in zip(nearest, nearest_cost)
+    ]
@@ -1,11 +1,15 @@
-from vrp.common.model import SeqInfo, Param
+from vrp.common.model import SeqInfo, Param, CacheStats
 from vrp.evaluator.cost import calculate_each_cost
 from vrp.util.schedule import schedule_time
+from vrp.util.charge import get_charge_candidates
+from vrp.io.reader import get_node_id
 from vrp.common.constant import *
 
+import numpy as np
+
 import random
-from itertools import permutations, accumulate, chain
-from functools import reduce
+from collections import OrderedDict
+from itertools import permutations
 from typing import Tuple, List
 
 
@@ -46,70 +50,182 @@ def calculate_seq_distance(
         seq: Tuple,
         param: Param
 ) -> (float, List[float]):
-    ds, *_, ntj, _ = param
-    *_, is_charge = ntj
+    ds, tm, node, *_ = param
 
-    tuple_seq = tuple(zip((0, *seq, 0)))
+    full_seq = (0, *seq, 0)
+    ds_edge = ds[full_seq[:-1], full_seq[1:]].tolist()
+    node_type = node.type[list(full_seq)].tolist()
     ci = [
-        i for i in range(len(tuple_seq))
-        if is_charge(tuple_seq[i]) or tuple_seq[i] == (0,)
+        i for i in range(len(full_seq))
+        if node_type[i] == CHARGE or full_seq[i] == 0
     ]
     if len(ci) == 2:
-        dist = sum(map(lambda x: ds[x], zip(tuple_seq[:-1], tuple_seq[1:])))
+        dist = sum(ds_edge)
         return dist, [dist]
     else:
-        sub_seq = map(lambda x, y: tuple_seq[x:y+1], ci[:-1], ci[1:])
-        dist_list = [
-            sum(map(lambda x: ds[x], zip(sub[:-1], sub[1:])))
-            for sub in sub_seq
-        ]
+        dist_list = [sum(ds_edge[x:y]) for x, y in zip(ci[:-1], ci[1:])]
         return sum(dist_list), dist_list
 
 
+# opt-in LRU cache of generate_seq_info, (seq, vehicle_type) -> SeqInfo,
+# None values are kept as well so that infeasible sequences are cached
+_seq_info_cache = None
+_seq_info_cache_max_size = 0
+_seq_info_cache_counter = [0, 0, 0]  # hits, misses, evictions
+
+
+def enable_seq_info_cache(max_size: int = 200000):
+    """
+    cache the results of generate_seq_info, the least recently used
+    entry is evicted when the cache holds more than max_size entries.
+    the cache is cleared on every call, and it is only valid for one
+    instance, so call it again after switching to another data set
+    :param max_size: max number of cached sequences
+    :return:
+    """
+    global _seq_info_cache, _seq_info_cache_max_size
+    _seq_info_cache = OrderedDict()
+    _seq_info_cache_max_size = max_size
+    _seq_info_cache_counter[:] = [0, 0, 0]
+
+
+def disable_seq_info_cache():
+    global _seq_info_cache
+    _seq_info_cache = None
+
+
+def get_seq_info_cache_stats() -> CacheStats:
+    return CacheStats(
+        *_seq_info_cache_counter,
+        len(_seq_info_cache) if _seq_info_cache is not None else 0,
+        _seq_info_cache_max_size
+    )
+
+
+# opt-in route pool, see vrp.util.route_pool
+_route_pool = None
+
+
+def enable_route_pool(pool):
+    """
+    add every feasible route from generate_seq_info to pool, and every
+    available candidate priced by evaluate_seq, evaluate_seq_batch or
+    the segments of the operators (see add_to_route_pool).
+    routes generated in worker processes are not added
+    :param pool: RoutePool
+    :return:
+    """
+    global _route_pool
+    _route_pool = pool
+
+
+def disable_route_pool():
+    global _route_pool
+    _route_pool = None
+
+
+def add_to_route_pool(
+        seq: Tuple[int],
+        param: Param,
+        new_eval: Tuple[int, float],
+        vehicle_type: int = -1
+):
+    """
+    add a priced candidate route to the pool if enable_route_pool was
+    called, its info is only generated if it is cheaper than the pool
+    route of the same customers
+    :param seq:
+    :param param:
+    :param new_eval: vehicle type and cost, None is ignored
+    :param vehicle_type: the vehicle type seq was priced with
+    :return:
+    """
+    if _route_pool is not None and new_eval is not None and \
+            _route_pool.is_cheaper(seq, new_eval[1]):
+        # generate_seq_info adds it
+        generate_seq_info(seq, param, vehicle_type=vehicle_type)
+
+
 def generate_seq_info(
         seq: Tuple[int],
         param: Param,
         vehicle_type: int = -1
 ) -> SeqInfo:
     """
-    generate a SeqInfo for a sequence
+    generate a SeqInfo for a sequence,
+    looked up in the cache first if enable_seq_info_cache was called,
+    and added to the route pool if enable_route_pool was called
     :param seq:
     :param param:
     :param vehicle_type:
     :return:
     """
-    ds, tm, volume, weight, first, last, ntj, position = param
-    is_delivery, is_pickup, is_charge = ntj
+    if _seq_info_cache is None:
+        info = _generate_seq_info(seq, param, vehicle_type)
+        if _route_pool is not None:
+            _route_pool.add(seq, info)
+        return info
 
-    is_type2 = True if vehicle_type == 2 else False
+    key = (tuple(seq), vehicle_type)
+    if key in _seq_info_cache:
+        _seq_info_cache_counter[0] += 1
+        _seq_info_cache.move_to_end(key)
+        return _seq_info_cache[key]
+
+    _seq_info_cache_counter[1] += 1
+    info = _generate_seq_info(seq, param, vehicle_type)
+    if _route_pool is not None:
+        _route_pool.add(seq, info)
+    _seq_info_cache[key] = info
+    if len(_seq_info_cache) > _seq_info_cache_max_size:
+        _seq_info_cache.popitem(last=False)
+        _seq_info_cache_counter[2] += 1
+    return info
+
+
+def _schedule_seq(
+        seq: Tuple[int],
+        param: Param,
+        vehicle_type: int = -1,
+        cost_only: bool = False
+):
+    """
+    schedule a sequence from the depot back to the depot, the feasibility
+    rules shared by generate_seq_info and evaluate_seq
+    :param seq:
+    :param param:
+    :param vehicle_type:
+    :param cost_only: only the vehicle type and cost, no list is built
+    :return: SeqInfo, or vehicle type and cost if cost_only,
+        None if seq is not available
+    """
+    ds, tm, node, *_ = param
+
+    is_type2 = vehicle_type == 2
     volume_limit = VOLUME_2 if is_type2 else VOLUME_1
     weight_limit = WEIGHT_2 if is_type2 else WEIGHT_1
     distance_limit = DISTANCE_2 if is_type2 else DISTANCE_1
 
-    charge_index = [i for i in range(len(seq)) if is_charge(seq[i])]
-
     # init volume and weight
-    delivery_node = list(filter(lambda x: is_delivery(x), seq))
-    init_volume = sum([volume[x] for x in zip(delivery_node)])
-    init_weight = sum([weight[x] for x in zip(delivery_node)])
-
-    current_volume = init_volume
-    current_weight = init_weight
+    current_volume = 0
+    current_weight = 0
+    for x in seq:
+        if node.type.item(x) == DELIVERY:
+            current_volume += node.volume.item(x)
+            current_weight += node.weight.item(x)
 
     if current_volume > volume_limit or current_weight > weight_limit:
         if is_type2 or current_volume > VOLUME_2 or current_weight > WEIGHT_2:
             return None
-        else:
-            is_type2 = True
-            volume_limit = VOLUME_2
-            weight_limit = WEIGHT_2
-            distance_limit = DISTANCE_2
+        is_type2 = True
+        volume_limit = VOLUME_2
+        weight_limit = WEIGHT_2
+        distance_limit = DISTANCE_2
 
     # first node
-    node1 = (0,)
     current_distance = 0
-    max_volume = init_volume
-    max_weight = init_weight
+    max_volume = current_volume
+    max_weight = current_weight
     serve_time = 0
     eps = 0  # earliest possible starting
     lps = 960  # latest possible starting
@@ -119,117 +235,265 @@ def generate_seq_info(
     time_len = 0
     charge_cnt = 0
 
-    # init eps_list and lps_list
+    # init eps_list and lps_list,
+    # every wait or shift moves all the previous entries by the same value,
+    # so the entries are kept relative to an offset applied at the end
+    charge_index = []
     eps_list = [0]
     lps_list = [960]
+    eps_offset = 0
+    lps_offset = 0
 
-    for node2 in ((nid,) for nid in seq):
+    node1 = 0
+    for i, node2 in enumerate(seq):
+        ds12 = ds.item(node1, node2)
+        tm12 = tm.item(node1, node2)
+        first2 = node.first.item(node2)
+        last2 = node.last.item(node2)
+        nt2 = node.type.item(node2)
 
         # distance
-        current_distance += ds[node1, node2]
+        current_distance += ds12
 
         # volume and weight
-        if is_delivery(node2[0]):
-            current_volume -= volume[node2]
-            current_weight -= weight[node2]
-        elif is_pickup(node2[0]):
-            current_volume += volume[node2]
-            current_weight += weight[node2]
+        if nt2 == DELIVERY:
+            current_volume -= node.volume.item(node2)
+            current_weight -= node.weight.item(node2)
+        elif nt2 == PICKUP:
+            current_volume += node.volume.item(node2)
+            current_weight += node.weight.item(node2)
             max_volume = max(max_volume, current_volume)
             max_weight = max(max_weight, current_weight)
 
         # time window
-        shift = max(0, lps + tm[node1, node2] + serve_time - last[node2])
+        shift = max(0, lps + tm12 + serve_time - last2)
         if shift > 0:
-            lps = last[node2]
+            lps = last2
             total_shift += shift
         else:
-            lps += tm[node1, node2] + serve_time
+            lps += tm12 + serve_time
 
         if max_volume > volume_limit or max_weight > weight_limit or \
                 current_distance > (charge_cnt + 1) * distance_limit or \
-                lps - tm[node1, node2] - serve_time < eps:
-            if is_type2:
+                lps - tm12 - serve_time < eps:
+            if is_type2 or max_volume > VOLUME_2 or max_weight > WEIGHT_2 or \
+                    current_distance > (charge_cnt + 1) * DISTANCE_2 or \
+                    lps - tm12 - serve_time < eps:
                 return None
-            else:
-                if max_volume > VOLUME_2 or max_weight > WEIGHT_2 or \
-                        current_distance > (charge_cnt + 1) * DISTANCE_2 or \
-                        lps - tm[node1, node2] - serve_time < eps:
-                    return None
-                else:
-                    is_type2 = True
-                    volume_limit = VOLUME_2
-                    weight_limit = WEIGHT_2
-                    distance_limit = DISTANCE_2
-
-        wait = max(0, first[node2] - lps)
+            is_type2 = True
+            volume_limit = VOLUME_2
+            weight_limit = WEIGHT_2
+            distance_limit = DISTANCE_2
+
+        wait = max(0, first2 - lps)
         if wait > 0:
             total_wait += wait
-            lps = first[node2]
+            lps = first2
 
-        delta = max(
-            0, first[node2] - eps - serve_time - tm[node1, node2]
-        )
+        # eps = max(eps + serve_time + tm12, first2)
+        delta = max(0, first2 - eps - serve_time - tm12)
         total_delta += delta
-
-        # eps: eps_node2
         if delta > 0:
-            eps = first[node2]
+            eps = first2
         else:
-            eps += tm[node1, node2] + serve_time
-        # eps = max(eps + serve_time + tm[node1, node2], first[node2])
-
-        # update eps_list and lps_list
-        if delta > 0 or wait > 0:
-            eps_list = [x + delta - wait for x in eps_list]
-        if shift > 0:
-            lps_list = [x - shift for x in lps_list]
-        eps_list.append(eps)
-        lps_list.append(lps)
+            eps += tm12 + serve_time
 
         # time_len += tm + serve + wait
-        time_len += tm[node1, node2] + serve_time + wait
+        time_len += tm12 + serve_time + wait
 
-        if is_charge(node2[0]):
+        if nt2 == CHARGE:
             charge_cnt += 1
 
-        serve_time = 30
+        # update eps_list and lps_list
+        if not cost_only:
+            eps_offset += delta - wait
+            lps_offset -= shift
+            eps_list.append(eps - eps_offset)
+            lps_list.append(lps - lps_offset)
+            if nt2 == CHARGE:
+                charge_index.append(i)
+
+        serve_time = SERVE_TIME
         node1 = node2
 
     # get back to depot
-    time_len += SERVE_TIME + tm[node1, (0,)]
-    current_distance += ds[node1, (0,)]
-
-    eps_list.append(0 + total_delta - total_wait + time_len)
-    lps_list.append(960 - total_shift + time_len)
-    buffer = lps_list[0] - eps_list[0]
+    time_len += SERVE_TIME + tm.item(node1, 0)
+    current_distance += ds.item(node1, 0)
+    end_lps = 960 - total_shift + time_len
 
     if current_distance > (charge_cnt + 1) * distance_limit \
-            or lps_list[-1] > 960:
+            or end_lps > 960:
         if is_type2 or current_distance > (charge_cnt + 1) * DISTANCE_2 \
-                or lps_list[-1] > 960:
+                or end_lps > 960:
             return None
-        else:
-            is_type2 = True
+        is_type2 = True
 
     # choose vehicle type
     if vehicle_type == -1:
-        if is_type2:
-            vehicle_type = 2
-        else:
-            vehicle_type = 1
+        vehicle_type = 2 if is_type2 else 1
+
+    cost = sum(calculate_each_cost(
+        current_distance, vehicle_type, total_wait, charge_cnt
+    ))
+    if cost_only:
+        return vehicle_type, cost
+
+    eps_list = [x + eps_offset for x in eps_list]
+    lps_list = [x + lps_offset for x in lps_list]
+    eps_list.append(0 + total_delta - total_wait + time_len)
+    lps_list.append(end_lps)
+    buffer = lps_list[0] - eps_list[0]
 
     return SeqInfo(
         vehicle_type, max_volume, max_weight, current_distance,
         eps_list, lps_list, time_len, total_wait, buffer,
-        charge_index, sum(calculate_each_cost(
-            current_distance, vehicle_type, total_wait, charge_cnt
-        ))
+        charge_index, cost
+    )
+
+
+def _generate_seq_info(
+        seq: Tuple[int],
+        param: Param,
+        vehicle_type: int = -1
+) -> SeqInfo:
+    """
+    generate a SeqInfo for a sequence
+    :param seq:
+    :param param:
+    :param vehicle_type:
+    :return:
+    """
+    return _schedule_seq(seq, param, vehicle_type)
+
+
+def evaluate_seq(
+        seq: Tuple[int],
+        param: Param,
+        vehicle_type: int = -1
+) -> (int, float):
+    """
+    same rules as generate_seq_info, but only the vehicle type and cost
+    are computed, no list is built, for accept or reject loops
+    :param seq:
+    :param param:
+    :param vehicle_type:
+    :return: vehicle type and cost, or None if seq is not available
+    """
+    new_eval = _schedule_seq(seq, param, vehicle_type, cost_only=True)
+    add_to_route_pool(seq, param, new_eval, vehicle_type)
+    return new_eval
+
+
+def pad_seqs(seqs: List[Tuple]) -> (np.ndarray, np.ndarray):
+    """
+    depot to depot sequences in one array, padded with the depot
+    :param seqs:
+    :return: (0, *seq, 0, 0, ...) for every seq, and the lengths of seqs
+    """
+    length = np.array([len(x) for x in seqs], dtype=np.int64)
+    full_seqs = np.zeros(
+        (len(seqs), length.max(initial=0) + 2), dtype=np.int64
     )
+    for i, seq in enumerate(seqs):
+        full_seqs[i, 1:len(seq) + 1] = seq
+    return full_seqs, length
+
+
+def evaluate_seq_batch(
+        seqs: List[Tuple],
+        param: Param,
+        vehicle_type: int = -1
+) -> (np.ndarray, np.ndarray):
+    """
+    evaluate_seq for many sequences with array operations,
+    load and distance over the whole batch, and the schedule
+    position by position for all sequences at once.
+    if param.compat is given, sequences with an incompatible arc are
+    not available
+    :param seqs:
+    :param param:
+    :param vehicle_type:
+    :return: vehicle type (0 if not available) and cost (M if not available)
+    """
+    ds, tm, node, *_ = param
+    full_seqs, length = pad_seqs(seqs)
+    rows = np.arange(len(seqs))
+    from_node, to_node = full_seqs[:, :-1], full_seqs[:, 1:]
+    ds_edge = ds[from_node, to_node]
+    tm_edge = tm[from_node, to_node]
+    node_type = node.type[full_seqs]
+    is_delivery = node_type == DELIVERY
+    is_pickup = node_type == PICKUP
+    is_charge = node_type == CHARGE
 
+    available = np.ones(len(seqs), dtype=bool)
+    if param.compat is not None:
+        available &= param.compat[from_node, to_node].all(axis=1)
 
-def _2_elem_tuple_add(x: Tuple, y: Tuple) -> Tuple:
-    return x[0] + y[0], x[1] + y[1]
+    # volume and weight: all deliveries are loaded at the depot
+    max_load = []
+    for x in (node.volume[full_seqs], node.weight[full_seqs]):
+        change = np.where(is_pickup, x, 0) - np.where(is_delivery, x, 0)
+        init = np.where(is_delivery, x, 0).sum(axis=1)
+        max_load.append(
+            init + np.maximum(0, np.cumsum(change, axis=1)).max(axis=1)
+        )
+    max_volume, max_weight = max_load
+
+    # distance: the limit grows by one range after every charge,
+    # padded arcs are from depot to depot and do not change anything
+    ds_cum = np.cumsum(ds_edge, axis=1)
+    charge_cnt = np.cumsum(is_charge[:, :-1], axis=1)
+    total_distance = ds_cum[:, -1]
+    total_charge = charge_cnt[:, -1]
+    type1_available = (max_volume <= VOLUME_1) & (max_weight <= WEIGHT_1) & \
+        (ds_cum <= (charge_cnt + 1) * DISTANCE_1).all(axis=1)
+    type2_available = (max_volume <= VOLUME_2) & (max_weight <= WEIGHT_2) & \
+        (ds_cum <= (charge_cnt + 1) * DISTANCE_2).all(axis=1)
+    if vehicle_type == 2:
+        type1_available[:] = False
+    available &= type1_available | type2_available
+
+    # time window, see generate_seq_info
+    eps = np.zeros(len(seqs))
+    lps = np.full(len(seqs), 960.)
+    total_wait = np.zeros(len(seqs))
+    total_shift = np.zeros(len(seqs))
+    time_len = np.zeros(len(seqs))
+    for i in range(1, full_seqs.shape[1] - 1):
+        active = i <= length
+        node2 = full_seqs[:, i]
+        tm12 = tm_edge[:, i - 1] + (SERVE_TIME if i > 1 else 0)
+        first2 = node.first[node2]
+        last2 = node.last[node2]
+        lps_arrive = lps + tm12
+        total_shift += np.where(active, np.maximum(0, lps_arrive - last2), 0)
+        lps_arrive = np.minimum(lps_arrive, last2)
+        available &= ~active | (lps_arrive - tm12 >= eps)
+        wait = np.where(active, np.maximum(0, first2 - lps_arrive), 0)
+        total_wait += wait
+        lps = np.where(active, np.maximum(lps_arrive, first2), lps)
+        eps = np.where(active, np.maximum(eps + tm12, first2), eps)
+        time_len += np.where(active, tm12 + wait, 0)
+    time_len += SERVE_TIME + tm_edge[rows, length]
+    available &= time_len <= total_shift  # back to depot before 960
+
+    if vehicle_type == -1:
+        vehicle_types = np.where(type1_available, 1, 2)
+    else:
+        vehicle_types = np.full(len(seqs), vehicle_type)
+    is_type_1 = vehicle_types == 1
+    cost = total_distance * np.where(is_type_1, TRANS_COST_1, TRANS_COST_2) + \
+        np.where(is_type_1, FIXED_COST_1, FIXED_COST_2) + \
+        WAIT_COST * total_wait + \
+        total_charge * CHARGE_COST
+    if _route_pool is not None:
+        for i in np.flatnonzero(available).tolist():
+            add_to_route_pool(
+                seqs[i], param, (vehicle_types.item(i), cost.item(i)),
+                vehicle_type
+            )
+    return np.where(available, vehicle_types, 0), np.where(available, cost, M)
 
 
 def generate_seq_info_refactor(
@@ -237,30 +501,28 @@ def generate_seq_info_refactor(
         param: Param,
         vehicle_type: int = -1
 ) -> SeqInfo:
-    ds, tm, volume, weight, first, last, ntj, position = param
-    is_delivery, is_pickup, is_charge = ntj
+    ds, tm, node, *_ = param
 
     is_type2 = True if vehicle_type == 2 else False
     volume_limit = VOLUME_2 if is_type2 else VOLUME_1
     weight_limit = WEIGHT_2 if is_type2 else WEIGHT_1
     distance_limit = DISTANCE_2 if is_type2 else DISTANCE_1
 
-    charge_index = [i for i in range(len(seq)) if is_charge(seq[i])]
+    full_seq = (0, *seq, 0)
+    node_type = node.type[list(full_seq)]
+    is_delivery = node_type == DELIVERY
+    is_charge = node_type == CHARGE
+    charge_index = np.flatnonzero(is_charge[1:-1]).tolist()
 
-    # use zip
-    tuple_seq = tuple(zip((0, *seq, 0)))
-
-    # volume and weight check
-    max_volume_weight = tuple(map(max, zip(*accumulate(chain((
-        reduce(
-            _2_elem_tuple_add,
-            ((volume.get(x, 0), weight.get(x, 0))
-             for x in tuple_seq[1:-1] if is_delivery(x))
-        ),),
-        ((-volume.get(x, 0), -weight.get(x, 0))
-         if is_delivery(x) else (volume.get(x, 0), weight.get(x, 0))
-         for x in tuple_seq[1:-1])), _2_elem_tuple_add)
-    )))
+    # volume and weight check:
+    #   all delivery goods are loaded at the depot,
+    #   then the load changes by -delivery or +pickup at every node
+    max_volume_weight = tuple(
+        float(np.max(x[is_delivery].sum() + np.cumsum(
+            np.where(is_delivery, -x, x)
+        )))
+        for x in (node.volume[list(full_seq)], node.weight[list(full_seq)])
+    )
 
     if max_volume_weight[0] > volume_limit or \
             max_volume_weight[1] > weight_limit:
@@ -273,26 +535,22 @@ def generate_seq_info_refactor(
             is_type2 = True
             distance_limit = DISTANCE_2
 
-    ds_edge = tuple(map(lambda x: ds[x], zip(tuple_seq[:-1], tuple_seq[1:])))
-    ds_limit = (
-        (x + 1) * distance_limit for x in
-        accumulate(1 if is_charge(x) else 0 for x in tuple_seq[:-1])
-    )
-    if any(map(lambda x, y: x > y, accumulate(ds_edge), ds_limit)):
+    # distance check: the limit grows by one range after every charge
+    ds_cum = np.cumsum(ds[full_seq[:-1], full_seq[1:]])
+    charge_cnt = np.cumsum(is_charge[:-1])
+    if np.any(ds_cum > (charge_cnt + 1) * distance_limit):
         if vehicle_type == 1 or vehicle_type == 2 or is_type2:
             return None
         else:
-            ds_limit = (
-                (x + 1) * DISTANCE_2 for x in
-                accumulate(1 if is_charge(x) else 0 for x in tuple_seq[:-1])
-            )
-            if any(map(lambda x, y: x > y, accumulate(ds_edge), ds_limit)):
+            if np.any(ds_cum > (charge_cnt + 1) * DISTANCE_2):
                 return None
             else:
                 is_type2 = True
+    total_distance = int(ds_cum[-1])
 
-    # TODO: optimize time window constraint
     eps_list, lps_list, time_len, total_wait, buffer = schedule_time(seq, param)
+    if eps_list is None or lps_list[-1] > 960:
+        return None
 
     if vehicle_type == -1:
         if is_type2:
@@ -301,14 +559,458 @@ def generate_seq_info_refactor(
             vehicle_type = 1
 
     return SeqInfo(
-        vehicle_type, *max_volume_weight, sum(ds_edge),
+        vehicle_type, *max_volume_weight, total_distance,
         eps_list, lps_list, time_len, total_wait, buffer,
         charge_index, sum(calculate_each_cost(
-            sum(ds_edge), vehicle_type, total_wait, len(charge_index)
+            total_distance, vehicle_type, total_wait, len(charge_index)
         ))
     )
 
 
+def _get_completion_distance(
+        ds_sub: np.ndarray
+) -> List[List[float]]:
+    """
+    shortest distance from a node through a set of nodes back to the
+    depot, time windows and loads left out (a TSP path relaxation):
+        g[left][j] = min(ds[j, k] + g[left - k][k] for k in left)
+    computed layer by layer over the size of left
+    :param ds_sub: depot and n nodes, (n + 1, n + 1)
+    :return: g[mask of left][j], only for j not in left
+    """
+    n = len(ds_sub) - 1
+    d = ds_sub[1:, 1:]
+    masks = np.arange(1 << n)
+    size = np.zeros(1 << n, dtype=np.int64)
+    for k in range(n):
+        size += masks >> k & 1
+    g = np.full((1 << n, n), np.inf)
+    g[0] = ds_sub[1:, 0]
+    for p in range(1, n):
+        layer = masks[size == p]
+        for k in range(n):
+            sel = layer[layer >> k & 1 == 1]
+            g[sel] = np.minimum(
+                g[sel], g[sel ^ (1 << k), k][:, None] + d[:, k][None, :]
+            )
+    return g.tolist()
+
+
+def _dp_route(
+        customers: List[int],
+        stations: List[int],
+        param: Param,
+        node_id_c,
+        limit_type: int,
+        cost_type: int,
+        upper: float = M,
+        beam_width: int = None,
+        max_labels: int = None,
+        charge_k: int = 1,
+        subset_bounds: bool = True
+) -> (float, Tuple):
+    """
+    forward labeling over (visited customers, last node) with the same
+    schedule as evaluate_seq, a label is
+        (partial cost, lps, eps, distance, charge count, wait,
+         current and max volume and weight, seq)
+    the partial cost is distance, wait and charge cost without the fixed
+    cost. a label dominates another of the same state if it is not later
+    (lps), not less flexible (eps), not more loaded, not closer to the
+    distance limit, and cheaper even after paying the wait it may still
+    have to make up for being earlier: the extra wait of all the rest of
+    a route is at most the difference of lps.
+    a label is cut if it can not beat upper with the completion distance
+    of the customers left, or if they can not be served in time anymore.
+    with beam_width, only the beam_width labels with the lowest bound are
+    kept at every layer, and it is a heuristic
+    :param customers:
+    :param stations: charging stations that can be put anywhere, the
+        charge_k nearest by detour are tried between every two nodes too
+    :param param:
+    :param node_id_c:
+    :param limit_type: volume, weight and distance limits of this type
+    :param cost_type: cost rates of this type
+    :param upper: only routes cheaper than upper are searched
+    :param beam_width:
+    :param max_labels: it gives up (M, None) after so many labels
+    :param charge_k:
+    :param subset_bounds: bounds from tables over all 2^n sets of
+        customers left, else weaker ones in O(n) per set, for a beam
+        over too many customers for the tables
+    :return: cost and seq of the best route, or M, None
+    """
+    ds, tm, node, *_ = param
+    volume_limit = VOLUME_2 if limit_type == 2 else VOLUME_1
+    weight_limit = WEIGHT_2 if limit_type == 2 else WEIGHT_1
+    distance_limit = DISTANCE_2 if limit_type == 2 else DISTANCE_1
+    trans_cost, fixed_cost, _, _ = calculate_each_cost(1, cost_type, 0, 0)
+    n = len(customers)
+
+    node_type = node.type[customers].tolist()
+    volume = node.volume[customers].tolist()
+    weight = node.weight[customers].tolist()
+    load = [
+        sum(x for x, t in zip(values, node_type) if t == nt)
+        for nt in (DELIVERY, PICKUP) for values in (volume, weight)
+    ]
+    # all the deliveries are loaded at the start, the pickups at the end
+    if max(load[0], load[2]) > volume_limit or \
+            max(load[1], load[3]) > weight_limit:
+        return M, None
+
+    # charging stations are only tried if a route can be over the limit
+    full = [0] + customers
+    station_dict = dict()  # (from, to) -> stations, depot is 0
+    if ds[np.ix_(full, full)].max(axis=1).sum() > distance_limit:
+        for a in full:
+            for b in full:
+                if a != b:
+                    station_dict[a, b] = list(dict.fromkeys(
+                        [x[0] for x in get_charge_candidates(
+                            a, b, param, node_id_c
+                        )[:charge_k]] + list(stations)
+                    ))
+
+    # bounds over the customers left: the completion distance and time
+    # (with service) through all of them back to the depot, and the
+    # latest eps from which every one can still be reached in time.
+    # a detour through a station may be shorter than the direct arc
+    ds_sub = ds[np.ix_(full, full)].astype(np.float64)
+    tm_sub = tm[np.ix_(full, full)].astype(np.float64) + SERVE_TIME
+    for (a, b), v in station_dict.items():
+        i, j = full.index(a), full.index(b)
+        for x in v:
+            ds_sub[i, j] = min(ds_sub[i, j], ds.item(a, x) + ds.item(x, b))
+            tm_sub[i, j] = min(
+                tm_sub[i, j], tm.item(a, x) + tm.item(x, b) + 2 * SERVE_TIME
+            )
+    arc_distance, arc_time = ds_sub.tolist(), tm_sub.tolist()
+    last = node.last[customers].tolist()
+    if subset_bounds:
+        completion = _get_completion_distance(ds_sub)
+        completion_time = _get_completion_distance(tm_sub)
+    np.fill_diagonal(ds_sub, np.inf)
+    np.fill_diagonal(tm_sub, np.inf)
+    min_in = ds_sub.min(axis=0)[1:].tolist()
+    min_in_time = tm_sub.min(axis=0)[1:].tolist()
+    min_out = ds_sub[1:, 0].min()
+    min_out_time = tm_sub[1:, 0].min()
+    if subset_bounds:
+        deadline = [np.inf]
+        for left in range(1, 1 << n):
+            i = (left & -left).bit_length() - 1
+            deadline.append(
+                min(deadline[left & (left - 1)], last[i] - min_in_time[i])
+            )
+
+        def get_bounds(left, i):
+            return completion[left][i], completion_time[left][i], \
+                deadline[left]
+    else:
+        # in O(n) per set instead of the 2^n tables: every customer left
+        # is entered by its shortest arc in, then the depot by the
+        # shortest arc back
+        relaxed = dict()
+
+        def get_bounds(left, i):
+            if not left:
+                return arc_distance[i + 1][0], arc_time[i + 1][0], np.inf
+            if left not in relaxed:
+                index = [j for j in range(n) if left >> j & 1]
+                relaxed[left] = (
+                    sum(min_in[j] for j in index) + min_out,
+                    sum(min_in_time[j] for j in index) + min_out_time,
+                    min(last[j] - min_in_time[j] for j in index)
+                )
+            return relaxed[left]
+    all_mask = (1 << n) - 1
+
+    # plain lists of the nodes that can be visited, for extend
+    nodes = list(dict.fromkeys(
+        full + list(stations) +
+        [x for v in station_dict.values() for x in v]
+    ))
+    position = {x: i for i, x in enumerate(nodes)}
+    sub = np.ix_(nodes, nodes)
+    ds_list, tm_list = ds[sub].tolist(), tm[sub].tolist()
+    attribute = dict(zip(nodes, zip(
+        node.type[nodes].tolist(), node.volume[nodes].tolist(),
+        node.weight[nodes].tolist(), node.first[nodes].tolist(),
+        node.last[nodes].tolist()
+    )))
+
+    def extend(label, node2):
+        cost, lps, eps, distance, charge_cnt, wait, \
+            current_volume, current_weight, max_volume, max_weight, \
+            seq = label
+        i1, i2 = position[seq[-1]] if seq else 0, position[node2]
+        t12 = tm_list[i1][i2] + (SERVE_TIME if seq else 0)
+        distance += ds_list[i1][i2]
+        nt2, volume2, weight2, first2, last2 = attribute[node2]
+        if nt2 == DELIVERY:
+            current_volume -= volume2
+            current_weight -= weight2
+        elif nt2 == PICKUP:
+            current_volume += volume2
+            current_weight += weight2
+            max_volume = max(max_volume, current_volume)
+            max_weight = max(max_weight, current_weight)
+        if eps + t12 > last2 or max_volume > volume_limit or \
+                max_weight > weight_limit or \
+                distance > (charge_cnt + 1) * distance_limit:
+            return None
+        lps = min(lps + t12, last2)
+        wait2 = max(0, first2 - lps)
+        if nt2 == CHARGE:
+            charge_cnt += 1
+        return (
+            distance * trans_cost + (wait + wait2) * WAIT_COST +
+            charge_cnt * CHARGE_COST,
+            max(lps, first2), max(eps + t12, first2), distance, charge_cnt,
+            wait + wait2, current_volume, current_weight,
+            max_volume, max_weight, seq + (node2,)
+        )
+
+    def dominates(a, b):
+        return a[1] <= b[1] and a[2] <= b[2] and \
+            a[0] + WAIT_COST * (b[1] - a[1]) <= b[0] and \
+            a[3] - distance_limit * a[4] <= b[3] - distance_limit * b[4] \
+            and a[8] <= b[8] and a[9] <= b[9]
+
+    def add(bucket, label):
+        for x in bucket:
+            if dominates(x, label):
+                return
+        bucket[:] = [x for x in bucket if not dominates(label, x)]
+        bucket.append(label)
+
+    layer = {(0, 0): [(
+        0., 960, 0, 0, 0, 0, load[0], load[1], load[0], load[1], ()
+    )]}
+    best_cost, best_seq = upper, None
+    label_number = 0
+    for size in range(n):
+        new_layer = dict()
+        for (mask, node1), bucket in layer.items():
+            i1 = position[node1]
+            for i, node2 in enumerate(customers):
+                if mask >> i & 1:
+                    continue
+                new_mask = mask | 1 << i
+                left = all_mask ^ new_mask
+                rest, rest_time, latest = get_bounds(left, i)
+                # the same bounds before extending, with the shortest
+                # arc to node2 (the time one is off from the depot)
+                min_cost = (arc_distance[i1][i + 1] + rest) * trans_cost + \
+                    fixed_cost
+                min_time = arc_time[i1][i + 1] + rest_time if node1 else 0
+                for label in bucket:
+                    if label[0] + min_cost >= best_cost or \
+                            label[2] + min_time > 960:
+                        continue
+                    labels = [extend(label, node2)]
+                    for cid in station_dict.get((node1, node2), ()):
+                        via = extend(label, cid)
+                        if via is not None:
+                            labels.append(extend(via, node2))
+                    for x in labels:
+                        if x is None or \
+                                x[0] + rest * trans_cost + fixed_cost >= \
+                                best_cost or x[2] > latest or \
+                                x[2] + rest_time > 960 or \
+                                not station_dict and \
+                                x[3] + rest > distance_limit:
+                            continue
+                        add(new_layer.setdefault((new_mask, node2), []), x)
+                        label_number += 1
+                        if max_labels is not None and \
+                                label_number > max_labels:
+                            return M, None
+        if beam_width is not None:
+            index = {x: i for i, x in enumerate(customers)}
+            labels = sorted(
+                (x[0] + get_bounds(all_mask ^ k[0], index[k[1]])[0] *
+                 trans_cost, j, k, x)
+                for j, (k, bucket) in enumerate(new_layer.items())
+                for x in bucket
+            )[:beam_width]
+            new_layer = dict()
+            for _, _, k, x in labels:
+                new_layer.setdefault(k, []).append(x)
+        layer = new_layer
+
+    for (mask, node1), bucket in layer.items():
+        for label in bucket:
+            labels = [label]
+            for cid in station_dict.get((node1, 0), ()):
+                via = extend(label, cid)
+                if via is not None:
+                    labels.append(via)
+            for x in labels:
+                node1 = x[-1][-1]
+                distance = x[3] + ds.item(node1, 0)
+                if x[1] + SERVE_TIME + tm.item(node1, 0) > 960 or \
+                        distance > (x[4] + 1) * distance_limit:
+                    continue
+                cost = x[0] + ds.item(node1, 0) * trans_cost + fixed_cost
+                if cost < best_cost:
+                    best_cost, best_seq = cost, x[-1]
+    return best_cost, best_seq
+
+
+def _insertion_seq(
+        customers: List[int],
+        param: Param,
+        vehicle_type: int = -1
+) -> Tuple:
+    """
+    cheapest insertion: the customer and position of the cheapest route
+    are taken until every customer is in, all of them priced at once by
+    evaluate_seq_batch, O(n^3) evaluations
+    :param customers:
+    :param param:
+    :param vehicle_type:
+    :return: seq, or None if a customer can not be inserted
+    """
+    seq, left = (), list(customers)
+    while left:
+        new_seqs = [
+            seq[:i] + (x,) + seq[i:]
+            for x in left for i in range(len(seq) + 1)
+        ]
+        _, costs = evaluate_seq_batch(new_seqs, param, vehicle_type)
+        k = int(costs.argmin())
+        if costs[k] >= M:
+            return None
+        left.remove(left[k // (len(seq) + 1)])
+        seq = new_seqs[k]
+    return seq
+
+
+def _descent_seq(
+        seq: Tuple,
+        param: Param,
+        vehicle_type: int = -1,
+        max_iter: int = 1000
+) -> (Tuple, float):
+    """
+    best improvement descent over 2-opt (a reversed part) and or-opt
+    (1 to 3 consecutive nodes moved), a neighborhood is priced at once
+    by evaluate_seq_batch
+    :param seq: available seq
+    :param param:
+    :param vehicle_type:
+    :param max_iter:
+    :return: seq and cost
+    """
+    cost = evaluate_seq(seq, param, vehicle_type=vehicle_type)[1]
+    n = len(seq)
+    for _ in range(max_iter):
+        new_seqs = [
+            seq[:i] + seq[i:j][::-1] + seq[j:]
+            for i in range(n - 1) for j in range(i + 2, n + 1)
+        ]
+        for length in range(1, min(3, n - 1) + 1):
+            for i in range(n - length + 1):
+                part, rest = seq[i:i + length], seq[:i] + seq[i + length:]
+                new_seqs.extend(
+                    rest[:j] + part + rest[j:]
+                    for j in range(len(rest) + 1) if j != i
+                )
+        if not new_seqs:
+            break
+        _, costs = evaluate_seq_batch(new_seqs, param, vehicle_type)
+        k = int(costs.argmin())
+        if costs[k] >= cost - 1e-6:
+            break
+        seq, cost = new_seqs[k], costs.item(k)
+    return seq, cost
+
+
+def optimize_seq(
+        nodes: List[int],
+        param: Param,
+        node_id_c=None,
+        vehicle_type: int = -1,
+        max_exact_size: int = 15,
+        max_labels: int = 50000,
+        beam_width: int = 200,
+        charge_k: int = 1
+) -> (Tuple, SeqInfo):
+    """
+    the cheapest order of nodes by dynamic programming over subsets
+    (see _dp_route). a beam search gives a first route, then the exact
+    search looks for a cheaper one if there are at most max_exact_size
+    customers, and keeps the beam route if it runs over max_labels.
+    over max_exact_size, the beam search is run with bounds in O(n) per
+    label, its route and the cheapest insertion route are improved by
+    2-opt and or-opt and the cheaper is kept, all polynomial in the
+    number of customers.
+    charging stations in nodes are not fixed visits, they can be put
+    between any two nodes with the charge_k nearest ones.
+    for vehicle_type -1 the limits and costs of type 1 and type 2 are
+    searched, for a given type the limits of type 2 are used as
+    generate_seq_info does
+    :param nodes:
+    :param param:
+    :param node_id_c: charging stations, from param.node if not given
+    :param vehicle_type:
+    :param max_exact_size:
+    :param max_labels:
+    :param beam_width:
+    :param charge_k:
+    :return: seq and info, or None, None if no order is found
+    """
+    _, _, node, *_ = param
+    if node_id_c is None:
+        node_id_c = get_node_id(node, CHARGE)
+    customers = [x for x in nodes if node.type.item(x) != CHARGE]
+    stations = [x for x in nodes if node.type.item(x) == CHARGE]
+    if not customers:
+        seq = tuple(stations)
+        info = generate_seq_info(seq, param, vehicle_type=vehicle_type)
+        return (seq, info) if info is not None else (None, None)
+
+    if vehicle_type == -1:
+        types = [(1, 1), (2, 2)]
+    else:
+        types = [(2, vehicle_type)]
+    is_exact = len(customers) <= max_exact_size
+    best_cost, best_seq = M, None
+    for limit_type, cost_type in types:
+        data = (
+            customers, stations, param, node_id_c, limit_type, cost_type
+        )
+        cost, seq = _dp_route(
+            *data, upper=best_cost, beam_width=beam_width, charge_k=charge_k,
+            subset_bounds=is_exact
+        )
+        if seq is not None:
+            best_cost, best_seq = cost, seq
+        if is_exact:
+            cost, seq = _dp_route(
+                *data, upper=best_cost, max_labels=max_labels,
+                charge_k=charge_k
+            )
+            if seq is not None:
+                best_cost, best_seq = cost, seq
+    if not is_exact:
+        # the beam is only a heuristic here, its route and the cheapest
+        # insertion route are improved by descent
+        seqs = [best_seq, _insertion_seq(customers, param, vehicle_type)]
+        best_cost, best_seq = min(
+            (_descent_seq(x, param, vehicle_type)[::-1]
+             for x in seqs if x is not None),
+            default=(M, None)
+        )
+    if best_seq is None:
+        return None, None
+    return best_seq, generate_seq_info(
+        best_seq, param, vehicle_type=vehicle_type
+    )
+
+
 def generate_seq_from_nodes(
         nodes: List[int],
         param: Param,
@@ -319,7 +1021,7 @@ def generate_seq_from_nodes(
 ) -> (Tuple, SeqInfo):
     """
     generate best of first seq from a node list
-    if best_accept=True, best accept
+    if best_accept=True, best accept by optimize_seq
     if probability=1, first accept
     otherwise, accept with probability
     :param nodes:
@@ -330,27 +1032,33 @@ def generate_seq_from_nodes(
     :param probability:
     :return:
     """
+    if best_accept:
+        return optimize_seq(list(nodes), param, vehicle_type=vehicle_type)
     better_accept = False if best_accept else better_accept
     probability = 0 if better_accept or best_accept else probability
     tmp_cost = M
     tmp_seq = None
-    tmp_info = None
     for new_seq in permutations(nodes):
-        new_info = generate_seq_info(new_seq, param, vehicle_type=vehicle_type)
-        if new_info is None:
+        new_eval = evaluate_seq(new_seq, param, vehicle_type=vehicle_type)
+        if new_eval is None:
             continue
         else:
-            if new_info.cost < tmp_cost:
+            if new_eval[1] < tmp_cost:
                 if best_accept:
                     tmp_seq = new_seq
-                    tmp_info = new_info
-                    tmp_cost = new_info.cost
+                    tmp_cost = new_eval[1]
                     continue
                 if better_accept:
-                    return new_seq, new_info
+                    return new_seq, generate_seq_info(
+                        new_seq, param, vehicle_type=vehicle_type
+                    )
             if probability and random.random() < probability:
-                return new_seq, new_info
+                return new_seq, generate_seq_info(
+                    new_seq, param, vehicle_type=vehicle_type
+                )
     if tmp_seq is None:
         return None, None
     else:
-        return tmp_seq, tmp_info
+        return tmp_seq, generate_seq_info(
+            tmp_seq, param, vehicle_type=vehicle_type
+        )
@@ -1,9 +1,15 @@
-from vrp.util.info import generate_seq_info
-from vrp.common.model import SeqInfo, Param
+from vrp.util.info import generate_seq_info, evaluate_seq, \
+    evaluate_seq_batch, add_to_route_pool
+from vrp.util.charge import get_charge_candidates
+from vrp.util.compat import check_compat
+from vrp.util.segment import single_segment, concat_segments, \
+    evaluate_segment, generate_segment, generate_prefix_segments, \
+    generate_suffix_segments, check_segment_chargeable
+from vrp.common.model import SeqInfo, Param, Segment
 from vrp.common.constant import *
 
 import random
-from typing import Tuple
+from typing import Tuple, List
 
 
 def insertion(
@@ -16,7 +22,9 @@ def insertion(
         probability: float = 0.8
 ) -> (Tuple, SeqInfo):
     """
-
+    insert node into seq, all positions are priced at once with
+    evaluate_seq_batch, and the charging station fallback with evaluate_seq,
+    generate_seq_info is only called for the returned sequence
     :param node:
     :param seq:
     :param param:
@@ -28,45 +36,54 @@ def insertion(
     """
     tmp_cost = M
     tmp_seq = None
-    tmp_info = None
-    ds, *_ = param
+    tmp_vehicle_type = None
     better_accept = False if best_accept else better_accept
     probability = 0 if better_accept or best_accept else probability
-    for i in range(len(seq)):
-        new_seq = seq[:i] + node + seq[i:]
-        new_info = generate_seq_info(
-            new_seq, param, vehicle_type=2
-        )
-        if new_info is None:
-            rank_list = [
-                (cid, ds[node, cid] + ds[cid, seq[i:]])
-                for cid in node_id_c
-            ]
-            rank_list.sort(key=lambda x: x[-1])
-            for cid, _ in rank_list:
-                new_info = generate_seq_info(
+    new_seqs = [seq[:i] + node + seq[i:] for i in range(len(seq))]
+    _, costs = evaluate_seq_batch(new_seqs, param, vehicle_type=2)
+    for i, (new_seq, cost) in enumerate(zip(new_seqs, costs.tolist())):
+        if not check_compat(new_seq, (i,), param):
+            continue
+        vehicle_type = 2
+        new_eval = (vehicle_type, cost) if cost < M else None
+        if new_eval is None:
+            vehicle_type = -1
+            for cid in get_charge_candidates(
+                    node[-1], seq[i], param, node_id_c
+            ):
+                if not check_compat(
+                        node[-1:] + cid + seq[i:i + 1], (1, 2), param
+                ):
+                    continue
+                new_eval = evaluate_seq(
                     seq[:i] + node + cid + seq[i:],
                     param
                 )
-                if new_info is not None:
+                if new_eval is not None:
                     new_seq = seq[:i] + node + cid + seq[i:]
                     break
             else:
                 continue
 
-        if new_info.cost < tmp_cost:
+        if new_eval[1] < tmp_cost:
             if best_accept:
-                tmp_seq, tmp_info = new_seq, new_info
-                tmp_cost = new_info.cost
+                tmp_seq, tmp_vehicle_type = new_seq, vehicle_type
+                tmp_cost = new_eval[1]
                 continue
             if better_accept:
-                return new_seq, new_info
+                return new_seq, generate_seq_info(
+                    new_seq, param, vehicle_type=vehicle_type
+                )
         if probability and random.random() < probability:
-            return new_seq, new_info
-    if tmp_info is None:
+            return new_seq, generate_seq_info(
+                new_seq, param, vehicle_type=vehicle_type
+            )
+    if tmp_seq is None:
         return None, None
     else:
-        return tmp_seq, tmp_info
+        return tmp_seq, generate_seq_info(
+            tmp_seq, param, vehicle_type=tmp_vehicle_type
+        )
 
 
 def efficient_insertion(
@@ -80,10 +97,12 @@ def efficient_insertion(
         probability: float = 0.8
 ) -> (Tuple, SeqInfo):
     """
-
+    same as insertion, but every position is priced by concatenating
+    the prefix and suffix segments of seq, generate_seq_info is only
+    called for the returned sequence
     :param node:
     :param seq:
-    :param info:
+    :param info: not used, the segments of seq are built once per call
     :param param:
     :param node_id_c:
     :param best_accept:
@@ -93,45 +112,87 @@ def efficient_insertion(
     """
     tmp_cost = M
     tmp_seq = None
-    tmp_info = None
-    ds, *_ = param
+    tmp_vehicle_type = None
     better_accept = False if best_accept else better_accept
     probability = 0 if better_accept or best_accept else probability
+    prefix = generate_prefix_segments(seq, param)
+    suffix = generate_suffix_segments(seq, param)
+    node_seg = generate_segment(node, param)
     for i in range(len(seq)):
-        new_seq = seq[:i] + node + seq[i:]
-
-        # new_info = generate_seq_info(
-        #     new_seq, param, vehicle_type=2
-        # )
-        # TODO: generate new_info
-
-        if new_info is None:
-            rank_list = [
-                (cid, ds[node, cid] + ds[cid, seq[i:]])
-                for cid in node_id_c
-            ]
-            rank_list.sort(key=lambda x: x[-1])
-            for cid, _ in rank_list:
-                new_info = generate_seq_info(
-                    seq[:i] + node + cid + seq[i:],
-                    param
-                )
-                if new_info is not None:
-                    new_seq = seq[:i] + node + cid + seq[i:]
-                    break
-            else:
-                continue
-
-        if new_info.cost < tmp_cost:
+        new_eval = price_insertion(
+            node, node_seg, seq, prefix, suffix, i, param, node_id_c
+        )
+        if new_eval is None:
+            continue
+        new_seq, vehicle_type, cost = new_eval
+        if cost < tmp_cost:
             if best_accept:
-                tmp_seq, tmp_info = new_seq, new_info
-                tmp_cost = new_info.cost
+                tmp_seq, tmp_vehicle_type = new_seq, vehicle_type
+                tmp_cost = cost
                 continue
             if better_accept:
-                return new_seq, new_info
+                return new_seq, generate_seq_info(
+                    new_seq, param, vehicle_type=vehicle_type
+                )
         if probability and random.random() < probability:
-            return new_seq, new_info
-    if tmp_info is None:
+            return new_seq, generate_seq_info(
+                new_seq, param, vehicle_type=vehicle_type
+            )
+    if tmp_seq is None:
         return None, None
     else:
-        return tmp_seq, tmp_info
+        return tmp_seq, generate_seq_info(
+            tmp_seq, param, vehicle_type=tmp_vehicle_type
+        )
+
+
+def price_insertion(
+        node: Tuple,
+        node_seg: Segment,
+        seq: Tuple,
+        prefix: List[Segment],
+        suffix: List[Segment],
+        i: int,
+        param: Param,
+        node_id_c: set
+) -> (Tuple, int, float):
+    """
+    insert node before seq[i] (at the end if i == len(seq)),
+    a charging station is put after node if it is not available without
+    :param node:
+    :param node_seg: segment of node
+    :param seq:
+    :param prefix: see generate_prefix_segments
+    :param suffix: see generate_suffix_segments
+    :param i:
+    :param param:
+    :param node_id_c:
+    :return: new seq, vehicle type and cost, or None if it is not available
+    """
+    new_seq = seq[:i] + node + seq[i:]
+    if not check_compat(new_seq, (i,), param):
+        return None
+    new_seg = concat_segments(prefix[i], node_seg, suffix[i], param=param)
+    if check_compat(new_seq, (i + len(node),), param):
+        new_eval = evaluate_segment(new_seg, param, vehicle_type=2)
+        if new_eval is not None:
+            add_to_route_pool(new_seq, param, new_eval, vehicle_type=2)
+            return new_seq, 2, new_eval[1]
+    if not check_segment_chargeable(new_seg, param):
+        return None
+
+    next_node = seq[i:i + 1]
+    for cid in get_charge_candidates(
+            node[-1], next_node[0] if next_node else 0, param, node_id_c
+    ):
+        if not check_compat(node[-1:] + cid + next_node, (1, 2), param):
+            continue
+        new_eval = evaluate_segment(concat_segments(
+            prefix[i], node_seg, single_segment(cid[0], param),
+            suffix[i], param=param
+        ), param)
+        if new_eval is not None:
+            new_seq = seq[:i] + node + cid + seq[i:]
+            add_to_route_pool(new_seq, param, new_eval)
+            return new_seq, -1, new_eval[1]
+    return None
@@ -1,16 +1,19 @@
-from vrp.common.model import SeqInfo
+from vrp.common.model import SeqInfo, NodeTable
 
-from functools import reduce
-from typing import Tuple, Dict, List
+import math
+from typing import Tuple, Dict, List, Iterable
 
 
 def calculate_seq_position(
-        seq: Tuple, position: Dict[Tuple, Tuple]
+        seq: Tuple, node: NodeTable
 ) -> Tuple:
-    return reduce(
-        lambda x, y: (x[0] + y[0], x[1] + y[1]),
-        [position[x] for x in seq]
-    )
+    """
+    centroid of the nodes of seq
+    :param seq:
+    :param node:
+    :return: lng, lat
+    """
+    return node.lng[list(seq)].mean().item(), node.lat[list(seq)].mean().item()
 
 
 def calculate_distance(
@@ -21,31 +24,155 @@ def calculate_distance(
     return (p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2
 
 
+class RouteNeighborhood(object):
+    """
+    k nearest routes by centroid, the centroids are kept in a uniform grid
+    so a query only looks at the cells around the route, and an accepted
+    move only updates the routes it changed:
+        neighborhood = RouteNeighborhood(route_dict, node)
+        neighborhood[seq]  # k nearest routes of seq
+        neighborhood.update((seq1, seq2), (new_seq1, new_seq2))
+    """
+
+    def __init__(
+            self,
+            route_dict: Dict[Tuple, SeqInfo],
+            node: NodeTable,
+            neighborhood_number: int = 10,
+            routes_per_cell: float = 2.
+    ):
+        """
+        :param route_dict:
+        :param node:
+        :param neighborhood_number: k
+        :param routes_per_cell: sets the cell size from the initial routes
+        """
+        self.node = node
+        self.neighborhood_number = neighborhood_number
+        self.position_dict = dict()
+        self.grid = dict()  # cell -> routes
+        positions = [calculate_seq_position(x, node) for x in route_dict if x]
+        if positions:
+            lng, lat = zip(*positions)
+            area = max(max(lng) - min(lng), 1e-9) * \
+                max(max(lat) - min(lat), 1e-9)
+            self.cell_size = math.sqrt(area * routes_per_cell / len(positions))
+        else:
+            self.cell_size = 1.
+        self.cell_range = None  # min and max of the cell indices
+        for seq in route_dict:
+            self.add(seq)
+
+    def _cell(self, position: Tuple) -> Tuple:
+        return (
+            math.floor(position[0] / self.cell_size),
+            math.floor(position[1] / self.cell_size)
+        )
+
+    def add(self, seq: Tuple):
+        if not seq or seq in self.position_dict:
+            return
+        position = calculate_seq_position(seq, self.node)
+        self.position_dict[seq] = position
+        cell = self._cell(position)
+        self.grid.setdefault(cell, set()).add(seq)
+        if self.cell_range is None:
+            self.cell_range = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            r = self.cell_range
+            r[0], r[1] = min(r[0], cell[0]), max(r[1], cell[0])
+            r[2], r[3] = min(r[2], cell[1]), max(r[3], cell[1])
+
+    def remove(self, seq: Tuple):
+        position = self.position_dict.pop(seq, None)
+        if position is None:
+            return
+        cell = self._cell(position)
+        self.grid[cell].discard(seq)
+        if not self.grid[cell]:
+            del self.grid[cell]
+
+    def update(self, old_seqs: Iterable[Tuple], new_seqs: Iterable[Tuple]):
+        """
+        replace old_seqs by new_seqs after a move
+        :param old_seqs:
+        :param new_seqs:
+        :return:
+        """
+        for seq in old_seqs:
+            self.remove(seq)
+        for seq in new_seqs:
+            self.add(seq)
+
+    def query(self, seq: Tuple, k: int = None) -> List[Tuple]:
+        """
+        k nearest routes of seq, seq itself excluded.
+        the cells are searched in rings around the cell of seq until
+        the k-th nearest is closer than any route of the next ring
+        :param seq: a route, not necessarily added
+        :param k: neighborhood_number if not given
+        :return: sorted by distance
+        """
+        k = self.neighborhood_number if k is None else k
+        if k <= 0 or self.cell_range is None:
+            return []
+        position = self.position_dict.get(seq)
+        if position is None:
+            position = calculate_seq_position(seq, self.node)
+        cx, cy = self._cell(position)
+        x_min, x_max, y_min, y_max = self.cell_range
+        max_ring = max(cx - x_min, x_max - cx, cy - y_min, y_max - cy)
+        found = []
+        for ring in range(max_ring + 1):
+            for x in range(cx - ring, cx + ring + 1):
+                step = 1 if abs(x - cx) == ring else 2 * ring
+                for y in range(cy - ring, cy + ring + 1, max(step, 1)):
+                    for comp in self.grid.get((x, y), ()):
+                        if comp != seq:
+                            p = self.position_dict[comp]
+                            found.append((
+                                (p[0] - position[0]) ** 2 +
+                                (p[1] - position[1]) ** 2,
+                                comp
+                            ))
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= (ring * self.cell_size) ** 2:
+                    break
+        found.sort()
+        return [x[1] for x in found[:k]]
+
+    def __getitem__(self, seq: Tuple) -> List[Tuple]:
+        return self.query(seq)
+
+    def __contains__(self, seq: Tuple) -> bool:
+        return seq in self.position_dict
+
+    def __len__(self) -> int:
+        return len(self.position_dict)
+
+    def pop(self, seq: Tuple) -> List[Tuple]:
+        """
+        neighbors of seq, then seq is removed
+        """
+        neighbors = self.query(seq)
+        self.remove(seq)
+        return neighbors
+
+
 def get_neighborhood_dict(
         route_dict: Dict[Tuple, SeqInfo],
-        position: Dict[Tuple, Tuple],
+        node: NodeTable,
         neighborhood_number: int = 10
 ) -> Dict[Tuple, List[Tuple]]:
     """
     get neighborhoods of each route
     :param route_dict:
-    :param position:
+    :param node:
     :param neighborhood_number:
     :return:
     """
-    seq_list = list(route_dict.keys())
-    position_dict = {
-        seq: calculate_seq_position(seq, position)
-        for seq in seq_list
-    }
-    neighborhood_dict = dict()
-    for seq in seq_list:
-        compare_list = [
-            (comp, calculate_distance(seq, comp, position_dict))
-            for comp in seq_list if comp != seq
-        ]
-        compare_list.sort(key=lambda x: x[-1])
-        neighborhood_dict[seq] = [
-            x[0] for x in compare_list[:neighborhood_number]
-        ]
-    return neighborhood_dict
+    neighborhood = RouteNeighborhood(
+        route_dict, node, neighborhood_number=neighborhood_number
+    )
+    return {seq: neighborhood[seq] for seq in route_dict}
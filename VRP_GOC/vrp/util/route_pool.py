@@ -0,0 +1,99 @@
+from vrp.common.model import SeqInfo, NodeTable
+from vrp.common.constant import *
+
+import numpy as np
+
+from typing import Tuple, Dict, Iterator
+
+
+class RoutePool(object):
+    """
+    feasible routes for the set covering recombination, deduplicated by
+    their customers: only the cheapest route of a customer set is kept.
+    when the pool holds more than max_size routes, it is cut back to
+    shrink_ratio * max_size routes by cost per customer.
+    feed it with generate_seq_info and the pricing of candidate routes
+    (evaluate_seq, evaluate_seq_batch and the segments of the operators)
+    by enable_route_pool:
+        pool = RoutePool(node)
+        enable_route_pool(pool)
+        ...  # constructions and local search
+        disable_route_pool()
+    """
+
+    def __init__(
+            self,
+            node: NodeTable,
+            max_size: int = 20000,
+            shrink_ratio: float = 0.75
+    ):
+        """
+        :param node:
+        :param max_size:
+        :param shrink_ratio:
+        """
+        self.charge_set = set(np.flatnonzero(node.type == CHARGE).tolist())
+        self.max_size = max_size
+        self.shrink_ratio = shrink_ratio
+        self.route_dict = dict()  # customers -> (seq, info)
+        self.added = 0  # routes that were new or cheaper
+
+    def get_customers(self, seq: Tuple) -> frozenset:
+        return frozenset(x for x in seq if x not in self.charge_set)
+
+    def is_cheaper(self, seq: Tuple, cost: float) -> bool:
+        """
+        whether a route of seq with cost would be added
+        :param seq:
+        :param cost:
+        :return:
+        """
+        key = self.get_customers(seq)
+        if not key:
+            return False
+        old = self.route_dict.get(key)
+        return old is None or cost < old[1].cost
+
+    def add(self, seq: Tuple, info: SeqInfo) -> bool:
+        """
+        :param seq:
+        :param info: None is ignored
+        :return: whether the route was added
+        """
+        if info is None or not seq or not self.is_cheaper(seq, info.cost):
+            return False
+        self.route_dict[self.get_customers(seq)] = (tuple(seq), info)
+        self.added += 1
+        if len(self.route_dict) > self.max_size:
+            self.shrink()
+        return True
+
+    def update(self, route_dict: Dict[Tuple, SeqInfo]):
+        for seq, info in route_dict.items():
+            self.add(seq, info)
+
+    def shrink(self, size: int = None):
+        """
+        keep the size routes with the lowest cost per customer
+        :param size: shrink_ratio * max_size if not given
+        :return:
+        """
+        if size is None:
+            size = int(self.shrink_ratio * self.max_size)
+        if len(self.route_dict) <= size:
+            return
+        kept = sorted(
+            self.route_dict.items(),
+            key=lambda x: (x[1][1].cost / len(x[0]), x[1][0])
+        )[:size]
+        self.route_dict = dict(kept)
+
+    def __iter__(self) -> Iterator[Tuple[Tuple, SeqInfo]]:
+        return iter(self.route_dict.values())
+
+    def __len__(self) -> int:
+        return len(self.route_dict)
+
+    def __contains__(self, seq: Tuple) -> bool:
+        route = self.route_dict.get(self.get_customers(seq))
+        return route is not None and route[0] == tuple(seq)
@@ -0,0 +1,233 @@
+"""
+segment concatenation for constant time move evaluation
+
+a Segment summarizes a consecutive part of a route so that the cost and
+feasibility of a route made of several segments can be computed in O(1)
+per concatenation, with exactly the same result as generate_seq_info.
+"""
+from vrp.common.model import Segment, Param
+from vrp.evaluator.cost import calculate_each_cost
+from vrp.common.constant import *
+
+from typing import Tuple, List
+
+
+def _clamp(x, lo, hi):
+    return lo if x < lo else (hi if x > hi else x)
+
+
+def single_segment(
+        node_id: int,
+        param: Param
+) -> Segment:
+    _, _, node, *_ = param
+    node_type = node.type.item(node_id)
+    first = node.first.item(node_id)
+    last = node.last.item(node_id)
+    volume = node.volume.item(node_id)
+    weight = node.weight.item(node_id)
+    if node_type == DELIVERY:
+        load = (volume, -volume, 0, weight, -weight, 0)
+    elif node_type == PICKUP:
+        load = (0, volume, volume, 0, weight, weight)
+    else:
+        load = (0, 0, 0, 0, 0, 0)
+    return Segment(
+        node_id, node_id, 0, 0,
+        first, last,
+        0, first,
+        0, last,
+        first, last,
+        *load,
+        1 if node_type == CHARGE else 0,
+        0, 0
+    )
+
+
+def concat_segment(
+        seg1: Segment,
+        seg2: Segment,
+        param: Param
+) -> Segment:
+    """
+    concatenate two segments, None stands for an empty segment
+    :param seg1:
+    :param seg2:
+    :param param:
+    :return:
+    """
+    if seg1 is None:
+        return seg2
+    if seg2 is None:
+        return seg1
+    ds, tm, *_ = param
+    d12 = ds.item(seg1.last_node, seg2.first_node)
+    t12 = tm.item(seg1.last_node, seg2.first_node) + SERVE_TIME
+
+    # latest possible start, wait and shift
+    lo1 = seg1.lps_lo + t12
+    hi1 = seg1.lps_hi + t12
+    wait_lo = max(0, seg2.wait_e - lo1)
+    wait_hi = max(0, seg2.wait_e - hi1)
+    shift_lo = max(0, lo1 - seg2.shift_e)
+    shift_hi = max(0, hi1 - seg2.shift_e)
+
+    # earliest possible start
+    if seg1.eps_b + t12 <= seg2.eps_c:
+        eps_c = min(seg1.eps_c, seg2.eps_c - t12 - seg1.duration)
+    else:
+        eps_c = -M
+
+    distance = seg1.distance + d12
+    return Segment(
+        seg1.first_node,
+        seg2.last_node,
+        distance + seg2.distance,
+        seg1.duration + t12 + seg2.duration,
+        _clamp(lo1 + seg2.duration, seg2.lps_lo, seg2.lps_hi),
+        _clamp(hi1 + seg2.duration, seg2.lps_lo, seg2.lps_hi),
+        seg1.wait_c + seg2.wait_c + wait_hi,
+        seg1.wait_e + wait_lo - wait_hi,
+        seg1.shift_c + seg2.shift_c + shift_lo,
+        seg1.shift_e + shift_lo - shift_hi,
+        max(seg1.eps_b + t12 + seg2.duration, seg2.eps_b),
+        eps_c,
+        seg1.volume_d + seg2.volume_d,
+        seg1.volume_n + seg2.volume_n,
+        max(seg1.volume_m, seg1.volume_n + seg2.volume_m),
+        seg1.weight_d + seg2.weight_d,
+        seg1.weight_n + seg2.weight_n,
+        max(seg1.weight_m, seg1.weight_n + seg2.weight_m),
+        seg1.charge_cnt + seg2.charge_cnt,
+        max(
+            seg1.distance_excess_1,
+            distance - DISTANCE_1 * seg1.charge_cnt + seg2.distance_excess_1
+        ),
+        max(
+            seg1.distance_excess_2,
+            distance - DISTANCE_2 * seg1.charge_cnt + seg2.distance_excess_2
+        )
+    )
+
+
+def concat_segments(*segs: Segment, param: Param) -> Segment:
+    seg = None
+    for x in segs:
+        seg = concat_segment(seg, x, param)
+    return seg
+
+
+def generate_segment(
+        seq: Tuple,
+        param: Param
+) -> Segment:
+    seg = None
+    for x in seq:
+        seg = concat_segment(seg, single_segment(x, param), param)
+    return seg
+
+
+def generate_prefix_segments(
+        seq: Tuple,
+        param: Param
+) -> List[Segment]:
+    """
+    prefix[i] is the segment of seq[:i], prefix[0] is None
+    :param seq:
+    :param param:
+    :return:
+    """
+    prefix = [None]
+    for x in seq:
+        prefix.append(
+            concat_segment(prefix[-1], single_segment(x, param), param)
+        )
+    return prefix
+
+
+def generate_suffix_segments(
+        seq: Tuple,
+        param: Param
+) -> List[Segment]:
+    """
+    suffix[i] is the segment of seq[i:], suffix[len(seq)] is None
+    :param seq:
+    :param param:
+    :return:
+    """
+    suffix = [None]
+    for x in reversed(seq):
+        suffix.append(
+            concat_segment(single_segment(x, param), suffix[-1], param)
+        )
+    return suffix[::-1]
+
+
+def evaluate_segment(
+        seg: Segment,
+        param: Param,
+        vehicle_type: int = -1
+) -> (int, float):
+    """
+    evaluate a route made of seg, starting and ending at the depot,
+    the same rules as generate_seq_info are applied
+    :param seg:
+    :param param:
+    :param vehicle_type:
+    :return: vehicle type and cost, or None if it is not available
+    """
+    if seg is None:
+        return None
+    ds, tm, *_ = param
+
+    # time window
+    tm0 = tm.item(0, seg.first_node)
+    if tm0 > seg.eps_c:
+        return None
+    x = END_TIME + tm0
+    wait = seg.wait_c + max(0, seg.wait_e - x)
+    shift = seg.shift_c + max(0, x - seg.shift_e)
+    time_len = tm0 + seg.duration + SERVE_TIME + \
+        tm.item(seg.last_node, 0) + wait
+    if time_len > shift:  # back to depot after END_TIME
+        return None
+
+    # volume, weight and distance
+    ds0 = ds.item(0, seg.first_node)
+    distance = ds0 + seg.distance + ds.item(seg.last_node, 0)
+    max_volume = seg.volume_d + seg.volume_m
+    max_weight = seg.weight_d + seg.weight_m
+    type1_available = vehicle_type != 2 and \
+        max_volume <= VOLUME_1 and max_weight <= WEIGHT_1 and \
+        ds0 + seg.distance_excess_1 <= DISTANCE_1 and \
+        distance - DISTANCE_1 * seg.charge_cnt <= DISTANCE_1
+    if not type1_available:
+        if max_volume > VOLUME_2 or max_weight > WEIGHT_2 or \
+                ds0 + seg.distance_excess_2 > DISTANCE_2 or \
+                distance - DISTANCE_2 * seg.charge_cnt > DISTANCE_2:
+            return None
+
+    if vehicle_type == -1:
+        vehicle_type = 1 if type1_available else 2
+
+    return vehicle_type, sum(calculate_each_cost(
+        distance, vehicle_type, wait, seg.charge_cnt
+    ))
+
+
+def check_segment_chargeable(
+        seg: Segment,
+        param: Param
+) -> bool:
+    """
+    False if a route made of seg is over the load of vehicle type 2 or
+    misses a time window, a charging station put into it can not make it
+    available then, since it only adds distance and time
+    :param seg:
+    :param param:
+    :return:
+    """
+    _, tm, *_ = param
+    return seg.volume_d + seg.volume_m <= VOLUME_2 and \
+        seg.weight_d + seg.weight_m <= WEIGHT_2 and \
+        tm.item(0, seg.first_node) <= seg.eps_c